@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: limits apply per process only
+    fcntl = None
+
+
+class Overloaded(Exception):
+    """
+    No analysis slot is free: the wait queue is full (reason 'queue_full')
+    or the wait took too long (reason 'queue_timeout')
+    """
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Too many analyses running ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Slots:
+    """
+    N lock files in a shared directory, each held by one request at a
+    time with a non-blocking flock. Locks are released by the OS when a
+    worker dies, so a crashed analysis never leaks its slot.
+    """
+    def __init__(self, directory, name, count):
+        self.paths = [os.path.join(directory, f"{name}-{i}.lock") for i in range(count)]
+        self._local = threading.Lock()
+        self._held = set()
+
+    def try_acquire(self):
+        """
+        Returns a handle for a free slot, or None
+        """
+        for i, path in enumerate(self.paths):
+            if fcntl is None:
+                with self._local:
+                    if i in self._held:
+                        continue
+                    self._held.add(i)
+                return i
+            f = open(path, 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except OSError:
+                f.close()
+        return None
+
+    def release(self, handle):
+        if fcntl is None:
+            with self._local:
+                self._held.discard(handle)
+            return
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+
+class AdmissionControl:
+    """
+    Limits how many expensive analyses run at once on this host (across
+    all worker processes). Requests beyond the limit wait in a bounded
+    queue; once the queue is full they are turned away immediately.
+    """
+    POLL_MIN_SECONDS = 0.05
+    POLL_MAX_SECONDS = 0.5
+
+    def __init__(self, directory, max_running=2, max_queued=4, max_wait=10):
+        os.makedirs(directory, exist_ok=True)
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self._running_slots = _Slots(directory, 'running', max_running)
+        self._queue_slots = _Slots(directory, 'queued', max_queued)
+        self._lock = threading.Lock()
+
+        # Counters for this worker process
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_queue_timeout = 0
+        self.average_seconds = None
+
+    def retry_after(self):
+        """
+        Seconds until a slot is likely to be free (about one analysis)
+        """
+        return max(1, int(self.average_seconds or self.max_wait))
+
+    @contextmanager
+    def admit(self, max_wait=None, cancel_token=None):
+        """
+        Hold an analysis slot for the duration of the with-block.
+        Raises Overloaded when no slot frees up within max_wait seconds.
+        """
+        slot = self._running_slots.try_acquire()
+        if slot is None:
+            slot = self._wait_for_slot(self.max_wait if max_wait is None else max_wait, cancel_token)
+
+        started = time.monotonic()
+        with self._lock:
+            self.running += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            self._running_slots.release(slot)
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.running -= 1
+                self.average_seconds = elapsed if self.average_seconds is None else 0.8 * self.average_seconds + 0.2 * elapsed
+
+    def _wait_for_slot(self, max_wait, cancel_token):
+        ticket = self._queue_slots.try_acquire()
+        if ticket is None:
+            with self._lock:
+                self.shed_queue_full += 1
+            raise Overloaded('queue_full', self.retry_after())
+
+        with self._lock:
+            self.queued += 1
+        try:
+            waited_until = time.monotonic() + max_wait
+            delay = self.POLL_MIN_SECONDS
+            while time.monotonic() < waited_until:
+                if cancel_token is not None:
+                    cancel_token.check()
+                time.sleep(min(delay, max(0, waited_until - time.monotonic())))
+                delay = min(delay * 2, self.POLL_MAX_SECONDS)
+                slot = self._running_slots.try_acquire()
+                if slot is not None:
+                    return slot
+        finally:
+            self._queue_slots.release(ticket)
+            with self._lock:
+                self.queued -= 1
+
+        with self._lock:
+            self.shed_queue_timeout += 1
+        raise Overloaded('queue_timeout', self.retry_after())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_running': self.max_running,
+                'max_queued': self.max_queued,
+                'max_wait_seconds': self.max_wait,
+                'running': self.running,
+                'queue_depth': self.queued,
+                'admitted': self.admitted,
+                'shed_queue_full': self.shed_queue_full,
+                'shed_queue_timeout': self.shed_queue_timeout,
+                'average_analysis_seconds': round(self.average_seconds, 2) if self.average_seconds is not None else None
+            }
@@ -0,0 +1,76 @@
+import hashlib
+
+from serializers import dumps
+
+# Product fields analyze_product() reads
+_PRODUCT_INPUTS = ('id', 'name', 'image', 'tcggo_url', 'episode')
+
+
+def analysis_fingerprint(calculator, products_data, top_cards):
+    """
+    Content hash of everything a set's analysis depends on: the products
+    with their prices, the card price vector and the calculator's model
+    (pull multipliers, model version). Equal hashes give equal results.
+    """
+    products = [
+        [list_key] + [product.get(field) for field in _PRODUCT_INPUTS]
+        + [product.get('prices', {}).get('cardmarket', {}).get('lowest')]
+        for list_key in ('etb', 'booster_boxes')
+        for product in products_data.get(list_key, [])
+    ]
+    inputs = {
+        'model': calculator.model_fingerprint(),
+        'products': products,
+        'card_prices': sorted(calculator.extract_card_price(card) for card in top_cards)
+    }
+    return hashlib.blake2b(dumps(inputs, sort_keys=True, default=str), digest_size=16).hexdigest()
+
+
+def analyze_set(collector, calculator, set_name, card_limit=50, graph=None):
+    """
+    ROI analysis of the ETBs and booster boxes of one set
+    Returns the analyzed products (unsorted)
+    
+    With an ROIGraph only the products whose price or set valuation
+    changed since the last run are rescored (see incremental.py)
+    
+    Results are memoized in the shared cache under the hash of their
+    inputs, a set whose prices have not changed is not rescored at all
+    (unless the graph tracks the set, then the graph is kept current)
+    """
+    products_data = collector.get_specific_products(set_name)
+    
+    # Get full card data for accurate ROI calculations
+    top_cards = collector.get_cards_by_set_name(set_name, limit=card_limit)
+    
+    memo_key = f"analysis-memo:{analysis_fingerprint(calculator, products_data, top_cards)}"
+    memoized = collector.cache.get(memo_key)
+    if memoized is not None and (graph is None or not graph.has_set(set_name)):
+        print(f"   ♻️ Inputs unchanged, reusing the analysis of {len(memoized)} products")
+        return memoized
+    
+    results = score_set(calculator, set_name, products_data, top_cards, graph)
+    collector.cache.set(memo_key, results, collector.config.ANALYSIS_MEMO_TTL)
+    return results
+
+
+def score_set(calculator, set_name, products_data, top_cards, graph=None):
+    """
+    Score a set's products from already fetched products and cards
+    """
+    if graph is not None:
+        graph.update_set(set_name, products_data, top_cards)
+        events = graph.recompute()
+        if events:
+            print(f"   🔁 {len(events)} products changed ROI or rank")
+        return graph.set_results(set_name)
+    
+    results = []
+    for category, products in (('Elite Trainer Box', products_data['etb']),
+                               ('Booster Box', products_data['booster_boxes'])):
+        for product in products:
+            analysis = calculator.analyze_product(product, top_cards)
+            if analysis:
+                analysis['category'] = category
+                results.append(analysis)
+    return results
@@ -1,6 +1,27 @@
+import time
+
+# Taken before the heavy imports, time-to-ready is measured from here
+BOOT_STARTED_AT = time.time()
+
 from flask import Flask, render_template, jsonify, request, redirect, url_for
-from data_collector import PokemonDataCollector
+from data_collector import PokemonDataCollector, ABORT_ERRORS
 from roi_calculator import ROICalculator
+from analysis import analyze_set
+from incremental import ROIGraph
+from price_history import PriceHistory
+from quota import CallBudget, BudgetExceeded
+from upstream_health import CircuitOpenError
+from deadline import Deadline, DeadlineExceeded
+from cancellation import AnalysisCancelled, JobRegistry, client_disconnected
+from admission import AdmissionControl, Overloaded
+from shared_cache import RefreshInProgress
+from http_cache import cached_json_response, precomputed_response, parse_fields, project
+from serializers import load_snapshot, loads
+from snapshot_store import AnalysisSnapshot, SnapshotStore, TABLE_FIELDS
+from result_query import QueryError, parse_query, run_query, wants_query
+from startup import Startup
+from refresh_scheduler import make_scheduler
+from snapshot_diff import DiffError, RUN_PATTERN, diff_runs, list_runs
 import json
 import os
 from datetime import datetime
@@ -11,14 +32,38 @@ app.config['SECRET_KEY'] = 'your-secret-key-here'
 # Global variables to store our components
 collector = PokemonDataCollector()
 calculator = ROICalculator()
+roi_graph = ROIGraph(calculator)
+jobs = JobRegistry(collector.config.JOBS_DIR)
+snapshots = SnapshotStore(collector.config.SNAPSHOT_DIR)
+admission = AdmissionControl(
+    collector.config.ADMISSION_DIR,
+    max_running=collector.config.MAX_CONCURRENT_ANALYSES,
+    max_queued=collector.config.ANALYSIS_QUEUE_SIZE,
+    max_wait=collector.config.ANALYSIS_QUEUE_MAX_WAIT_SECONDS
+)
+
+price_history = PriceHistory(collector.config.PRICE_HISTORY_DIR, collector.config.PRICE_HISTORY_COMPACT_AFTER_DAYS)
+
+refresh_scheduler = make_scheduler(collector.config)
+
+startup = Startup(BOOT_STARTED_AT)
+
+# Parsed episode catalog, reloaded only when the file changes
+_catalog = {'mtime': None, 'sets': None}
 
 def load_available_episodes():
     """
     Load all available Pokemon episodes/sets from our saved data
     """
     try:
-        with open("pokemon_episode_ids.json", 'r', encoding='utf-8') as f:
-            episodes = json.load(f)
+        mtime = os.path.getmtime("pokemon_episode_ids.json")
+    except OSError:
+        mtime = None
+    if _catalog['sets'] is not None and _catalog['mtime'] == mtime:
+        return _catalog['sets']
+    
+    try:
+        episodes = load_snapshot("pokemon_episode_ids.json")
         
         # Convert to the format we need and filter for sets with cards
         available_sets = []
@@ -37,6 +82,7 @@ def load_available_episodes():
         available_sets.sort(key=lambda x: x['released_at'] or '0000', reverse=True)
         
         print(f"✅ Loaded {len(available_sets)} available Pokemon sets")
+        _catalog.update(mtime=mtime, sets=available_sets)
         return available_sets
         
     except FileNotFoundError:
@@ -102,12 +148,6 @@ def api_analyze():
     API endpoint optimized for 2GB RAM hosting
     """
     try:
-        # Test API connection first
-        if not collector.test_api_connection():
-            return jsonify({
-                'error': 'Cannot connect to Pokemon TCG API. Please check your API key.'
-            }), 500
-        
         # Load available sets dynamically
         available_sets = load_available_episodes()
         
@@ -133,44 +173,307 @@ def api_analyze():
             # Use top N most recent sets
             sets_to_analyze = available_sets[:limit]
         
+        cache_key = 'analysis:' + '|'.join(sorted(set_display_name(s).lower() for s in sets_to_analyze))
+        fields = parse_fields(request.args.get('fields'))
+        fresh = request.args.get('fresh', '').lower() in ('1', 'true')
+        
+        # Filtering, sorting and paging (category=..., sort=..., cursor=...)
+        try:
+            query = parse_query(request.args) if wants_query(request.args) else None
+        except QueryError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # A cursor pages through the snapshot it was made for, whatever its
+        # age: asking for the next page never starts an analysis
+        if query is not None and query['cursor']:
+            snapshot = snapshots.get(cache_key)
+            if snapshot is None:
+                return jsonify({
+                    'error': 'This analysis is no longer available, start again without cursor'
+                }), 410
+            return query_response(snapshot, query, fields)
+        
+        record_demand(sets_to_analyze)
+        
+        # Serve a recent snapshot straight from the memory-mapped file
+        if not fresh:
+            snapshot = snapshots.get(cache_key, max_age=collector.config.ANALYSIS_CACHE_TTL)
+            if snapshot is not None:
+                if query is not None:
+                    return query_response(snapshot, query, fields)
+                return snapshot_response(snapshot, fields)
+        
+        # Check API connection first (cached, no request when recently healthy)
+        if not collector.test_api_connection():
+            if collector.health.is_open():
+                retry_after = int(collector.health.retry_after()) + 1
+                return jsonify({
+                    'error': 'Pokemon TCG API is currently unavailable. Please try again shortly.',
+                    'retry_after': retry_after
+                }), 503, {'Retry-After': str(retry_after)}
+            return jsonify({
+                'error': 'Cannot connect to Pokemon TCG API. Please check your API key.'
+            }), 500
+        
+        # Upstream call budget for this analysis (0 = unlimited)
+        budget = CallBudget(int(request.args.get('budget', collector.config.DEFAULT_CALL_BUDGET)))
+        
+        # Time budget in seconds - whatever is finished by then gets returned
+        time_budget = float(request.args.get('time_budget', collector.config.DEFAULT_TIME_BUDGET_SECONDS))
+        max_time_budget = collector.config.DEFAULT_TIME_BUDGET_SECONDS
+        deadline = Deadline(min(time_budget, max_time_budget) if time_budget > 0 else max_time_budget)
+        hedge = request.args.get('hedge', str(collector.config.HEDGE_REQUESTS)).lower() in ('1', 'true', 'yes')
+        
         print(f"🚀 Analyzing {len(sets_to_analyze)} sets (2GB RAM optimized)")
         
-        # Analyze with full features
-        results = analyze_sets_optimized(sets_to_analyze)
+        # Stop working for clients that went away (closed tab, cancelled job)
+        job_id = request.args.get('job')
+        cancel_token = jobs.register(job_id)
+        environ = request.environ
+        cancel_token.add_probe(lambda: client_disconnected(environ), 'client disconnected')
         
-        # Calculate summary stats
-        summary = {
-            'total_products': len(results),
-            'positive_roi_count': len([r for r in results if r['roi_percentage'] > 0]),
-            'average_roi': round(sum(r['roi_percentage'] for r in results) / len(results), 1) if results else 0,
-            'average_risk': round(sum(r['risk_score'] for r in results) / len(results), 1) if results else 0,
-            'best_opportunity': results[0] if results else None,
-            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'sets_analyzed': len(sets_to_analyze),
-            'available_sets_total': len(available_sets),
-            'hosting_note': 'Analyzing up to 30 sets with 2GB RAM hosting'
-        }
+        # Analyze with full features. Complete results are shared between
+        # workers; only one worker runs an analysis for the same sets at a time
+        ran_analysis = []
         
-        return jsonify({
-            'success': True,
-            'data': results,
-            'summary': summary
+        def run_analysis():
+            # Only a limited number of analyses crawl the upstream at once,
+            # time spent waiting for a slot counts against the time budget
+            remaining = deadline.remaining()
+            max_wait = admission.max_wait if remaining is None else min(admission.max_wait, remaining)
+            with admission.admit(max_wait, cancel_token):
+                ran_analysis.append(True)
+                results, skipped_sets, stop_reason = analyze_sets_optimized(
+                    sets_to_analyze, budget, deadline, hedge, cancel_token
+                )
+            record_price_history(results)
+            if not skipped_sets:
+                summary = build_summary(results, sets_to_analyze, skipped_sets, stop_reason, available_sets)
+                snapshots.write(cache_key, results, summary)
+            return {'results': results, 'sets_skipped': skipped_sets, 'stop_reason': stop_reason}
+        
+        if fresh:
+            collector.cache.delete(cache_key)
+        
+        try:
+            outcome = collector.cache.get_or_refresh(
+                cache_key,
+                collector.config.ANALYSIS_CACHE_TTL,
+                run_analysis,
+                lease_ttl=(deadline.seconds or max_time_budget) + 5,
+                wait_timeout=deadline.remaining() or max_time_budget,
+                cacheable=lambda outcome: not outcome['sets_skipped']
+            )
+        except (Overloaded, RefreshInProgress) as e:
+            # Shed load: an older snapshot beats no answer at all
+            print(f"🚦 {e}")
+            snapshot = snapshots.get(cache_key)
+            if snapshot is not None:
+                response = app.make_response(
+                    query_response(snapshot, query, fields) if query is not None else snapshot_response(snapshot, fields)
+                )
+                response.headers['X-Analysis-Stale'] = 'true'
+                response.headers['Age'] = str(int(snapshot.age()))
+                return response
+            if isinstance(e, RefreshInProgress):
+                message = 'This analysis is still running for another request. Please try again shortly.'
+            else:
+                message = 'Too many analyses are running right now. Please try again shortly.'
+            return jsonify({
+                'error': message,
+                'retry_after': e.retry_after
+            }), 503, {'Retry-After': str(e.retry_after)}
+        finally:
+            jobs.finish(job_id, cancel_token)
+            collector.quota.flush()
+        
+        results = outcome['results']
+        skipped_sets = outcome['sets_skipped']
+        stop_reason = outcome['stop_reason']
+        
+        # Another worker ran this analysis, its snapshot has the response ready
+        if not ran_analysis and not skipped_sets and query is None:
+            snapshot = snapshots.get(cache_key)
+            if snapshot is not None:
+                return snapshot_response(snapshot, fields)
+        
+        # Calculate summary stats
+        summary = build_summary(results, sets_to_analyze, skipped_sets, stop_reason, available_sets)
+        summary.update({
+            'api_usage': budget.to_dict(),
+            'from_cache': not ran_analysis,
+            'time_budget_seconds': deadline.seconds,
+            'elapsed_seconds': round(deadline.elapsed(), 2)
         })
         
+        if query is not None:
+            snapshot = None if skipped_sets else snapshots.get(cache_key)
+            if snapshot is None:
+                snapshot = AnalysisSnapshot.from_results(results, summary)
+                # Partial results are not stored, so there is no later page to fetch: send every row
+                query = dict(query, page_size=max(1, snapshot.count))
+            return query_response(snapshot, query, fields, summary=summary, partial=bool(skipped_sets))
+        
+        # Only send the columns the frontend asks for (fields=a,b,c)
+        data = project(results, fields)
+        
+        # The ETag covers the results only, so a re-run that finds the same
+        # numbers is answered with 304 Not Modified
+        return cached_json_response(
+            {
+                'success': True,
+                'partial': bool(skipped_sets),
+                'data': data,
+                'summary': summary
+            },
+            max_age=collector.config.ANALYZE_CACHE_MAX_AGE,
+            private=True,
+            etag_source={'data': data, 'sets_skipped': skipped_sets}
+        )
+        
     except Exception as e:
         print(f"Error in API analysis: {e}")
         return jsonify({
             'error': f'Analysis failed: {str(e)}'
         }), 500
 
-def analyze_sets_optimized(sets_list):
+def record_demand(sets_to_analyze):
+    """
+    Count the request for each set, busy sets get refreshed more often
+    (counted in memory, written to the scheduler database in batches)
+    """
+    if refresh_scheduler is None:
+        return
+    try:
+        refresh_scheduler.record_demand(set_display_name(s).lower() for s in sets_to_analyze)
+    except Exception as e:
+        print(f"⚠️ Could not record set demand: {e}")
+
+def record_price_history(results):
+    """
+    Add the prices of an analysis to the price history (never fails the analysis)
+    """
+    try:
+        price_history.record_products(results)
+    except Exception as e:
+        print(f"⚠️ Could not record price history: {e}")
+
+def build_summary(results, sets_to_analyze, skipped_sets, stop_reason, available_sets):
+    """
+    Summary stats for an analysis (results sorted by ROI)
+    """
+    return {
+        'total_products': len(results),
+        'positive_roi_count': len([r for r in results if r['roi_percentage'] > 0]),
+        'average_roi': round(sum(r['roi_percentage'] for r in results) / len(results), 1) if results else 0,
+        'average_risk': round(sum(r['risk_score'] for r in results) / len(results), 1) if results else 0,
+        'best_opportunity': results[0] if results else None,
+        'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'sets_analyzed': len(sets_to_analyze) - len(skipped_sets),
+        'sets_skipped': skipped_sets,
+        'stop_reason': stop_reason,
+        'available_sets_total': len(available_sets),
+        'hosting_note': 'Analyzing up to 30 sets with 2GB RAM hosting'
+    }
+
+def snapshot_response(snapshot, fields=None):
+    """
+    Response for an analysis snapshot. The full and table-column responses
+    are served as bytes straight from the mapped file; other field
+    selections are built from the snapshot rows.
+    """
+    max_age = collector.config.ANALYZE_CACHE_MAX_AGE
+    
+    variant = None
+    if not fields:
+        variant = 'full'
+    elif set(fields) == set(TABLE_FIELDS):
+        variant = 'table'
+    
+    if variant is not None:
+        return precomputed_response(
+            lambda encoding: snapshot.body(variant, encoding),
+            snapshot.etags[variant],
+            max_age=max_age,
+            private=True,
+            last_modified=snapshot.created_at
+        )
+    
+    data = project([loads(snapshot.row(i)) for i in range(snapshot.count)], fields)
+    return cached_json_response(
+        {'success': True, 'partial': False, 'data': data, 'summary': snapshot.summary},
+        max_age=max_age,
+        private=True,
+        last_modified=snapshot.created_at
+    )
+
+def query_response(snapshot, query, fields=None, summary=None, partial=False):
+    """
+    One page of filtered/sorted snapshot rows, with paging info
+    (total matches and the cursor for the next page)
+    """
+    try:
+        page = run_query(snapshot, query)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    data = project([loads(snapshot.row(i)) for i in page['rows']], fields)
+    paging = {
+        'total': page['total'],
+        'page_size': query['page_size'],
+        'next_cursor': page['next_cursor']
+    }
+    return cached_json_response(
+        {
+            'success': True,
+            'partial': partial,
+            'data': data,
+            'summary': summary or snapshot.summary,
+            'paging': paging
+        },
+        max_age=collector.config.ANALYZE_CACHE_MAX_AGE,
+        private=True,
+        etag_source={'data': data, 'paging': paging, 'partial': partial}
+    )
+
+def set_display_name(set_info):
+    """
+    Readable name for a set given as a string or an episode object
+    """
+    if isinstance(set_info, str):
+        return set_info
+    return set_info.get('name') or set_info.get('search_term', 'Unknown')
+
+# Why an analysis stopped before finishing all sets
+STOP_REASONS = {
+    BudgetExceeded: 'budget_exhausted',
+    CircuitOpenError: 'upstream_unavailable',
+    DeadlineExceeded: 'deadline_exceeded',
+    AnalysisCancelled: 'cancelled'
+}
+
+def analyze_sets_optimized(sets_list, budget=None, deadline=None, hedge=False, cancel_token=None):
     """
     Full-featured analysis for 2GB RAM hosting
+    Stops early when the call budget or time budget runs out, the upstream
+    goes down or the analysis is cancelled; sets finished up to that point are kept.
+    Returns (results, names of the sets that were skipped, stop reason or None)
     """
+    with collector.analysis_scope(budget=budget, deadline=deadline, hedge=hedge, cancel_token=cancel_token):
+        return _analyze_sets(sets_list, deadline, cancel_token)
+
+def _analyze_sets(sets_list, deadline=None, cancel_token=None):
     all_results = []
+    skipped_sets = []
+    stop_reason = None
     
     for i, set_info in enumerate(sets_list):
         try:
+            if cancel_token is not None:
+                cancel_token.check()
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded(f"Time budget of {deadline.seconds}s used up")
+            
             # Handle both old format (strings) and new format (objects)
             if isinstance(set_info, str):
                 set_name = set_info
@@ -180,29 +483,16 @@ def analyze_sets_optimized(sets_list):
                 print(f"📊 [{i+1}/{len(sets_list)}] Analyzing '{set_info.get('name')}'...")
             
             # FULL analysis - no more limits with 2GB RAM!
-            products_data = collector.get_specific_products(set_name)
-            etbs = products_data['etb']  # All ETBs
-            booster_boxes = products_data['booster_boxes']  # All boxes
+            set_results = analyze_set(collector, calculator, set_name, card_limit=50, graph=roi_graph)
+            all_results.extend(set_results)
             
-            # Get full card data for accurate ROI calculations
-            top_cards = collector.get_cards_by_set_name(set_name, limit=50)
-            
-            # Analyze all ETBs
-            for etb in etbs:
-                analysis = calculator.analyze_product(etb, top_cards)
-                if analysis:
-                    analysis['category'] = 'Elite Trainer Box'
-                    all_results.append(analysis)
-            
-            # Analyze all Booster Boxes
-            for box in booster_boxes:
-                analysis = calculator.analyze_product(box, top_cards)
-                if analysis:
-                    analysis['category'] = 'Booster Box'
-                    all_results.append(analysis)
-            
-            print(f"✅ Completed {set_name}: Found {len(etbs)} ETBs and {len(booster_boxes)} boxes")
+            print(f"✅ Completed {set_name}: {len(set_results)} products analyzed")
             
+        except ABORT_ERRORS as e:
+            print(f"🛑 {e} - stopping after {i} of {len(sets_list)} sets")
+            skipped_sets = [set_display_name(s) for s in sets_list[i:]]
+            stop_reason = STOP_REASONS[type(e)]
+            break
         except Exception as e:
             print(f"❌ Error analyzing set {i+1}: {e}")
             continue  # Skip this set and continue with others
@@ -210,7 +500,7 @@ def analyze_sets_optimized(sets_list):
     # Sort by ROI descending
     all_results.sort(key=lambda x: x['roi_percentage'], reverse=True)
     print(f"🎯 Analysis complete: {len(all_results)} total products analyzed")
-    return all_results
+    return all_results, skipped_sets, stop_reason
 
 @app.route('/api/sets')
 def api_sets():
@@ -220,6 +510,11 @@ def api_sets():
     try:
         available_sets = load_available_episodes()
         
+        try:
+            last_modified = os.path.getmtime("pokemon_episode_ids.json")
+        except OSError:
+            last_modified = None
+        
         # Format for frontend
         formatted_sets = []
         for episode in available_sets:
@@ -232,11 +527,15 @@ def api_sets():
                 "slug": episode.get('slug', '')
             })
         
-        return jsonify({
-            'success': True,
-            'total_sets': len(formatted_sets),
-            'sets': formatted_sets
-        })
+        return cached_json_response(
+            {
+                'success': True,
+                'total_sets': len(formatted_sets),
+                'sets': project(formatted_sets, parse_fields(request.args.get('fields')))
+            },
+            max_age=collector.config.SETS_CACHE_MAX_AGE,
+            last_modified=last_modified
+        )
         
     except Exception as e:
         print(f"Error loading sets: {e}")
@@ -273,12 +572,88 @@ def test_simple():
     """Simple test endpoint"""
     try:
         if collector.test_api_connection():
-            return jsonify({'success': True, 'message': 'API connection works'})
+            return jsonify({'success': True, 'message': 'API connection works', 'upstream': collector.health.snapshot()})
         else:
-            return jsonify({'success': False, 'message': 'API connection failed'})
+            return jsonify({'success': False, 'message': 'API connection failed', 'upstream': collector.health.snapshot()})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a running analysis (sent by the page when it is closed)"""
+    if not jobs.cancel(job_id):
+        return jsonify({'success': False, 'error': 'Invalid job id'}), 400
+    return jsonify({'success': True, 'job': job_id})
+
+@app.route('/api/diff')
+def api_diff():
+    """
+    Added, removed and changed products between two analysis runs,
+    ?from=20250625_153918&to=20250625_165204 (timestamps of the saved dumps)
+    """
+    old_run = request.args.get('from', '')
+    new_run = request.args.get('to', '')
+    # Only saved runs, never arbitrary paths
+    if not (RUN_PATTERN.match(old_run) and RUN_PATTERN.match(new_run)):
+        return jsonify({
+            'success': False,
+            'error': 'from and to must be run timestamps (YYYYmmdd_HHMMSS)',
+            'runs': list_runs()
+        }), 400
+    try:
+        changes, summary = diff_runs(old_run, new_run)
+    except DiffError as e:
+        return jsonify({'success': False, 'error': str(e), 'runs': list_runs()}), 404
+    
+    # Saved runs never change, so the diff can be cached for a long time
+    return cached_json_response(
+        {'success': True, 'from': old_run, 'to': new_run, 'summary': summary, 'changes': changes},
+        max_age=86400
+    )
+
+@app.route('/api/changes')
+def api_changes():
+    """
+    Products whose ROI or rank changed since event ?since=<sequence>,
+    poll with the last sequence seen to follow price refreshes
+    """
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since must be an event sequence number'}), 400
+    events, complete = roi_graph.events_since(since)
+    return jsonify({
+        'success': True,
+        'events': events,
+        'complete': complete,
+        'last_sequence': roi_graph.last_sequence
+    })
+
+@app.route('/api/metrics')
+def metrics():
+    """Upstream API usage counters and health"""
+    try:
+        return jsonify({
+            'api_usage': collector.quota.snapshot(),
+            'upstream_health': collector.health.snapshot(),
+            'upstream_latency_p50_ms': _ms(collector.latency.percentile(50)),
+            'upstream_latency_p95_ms': _ms(collector.latency.percentile(95)),
+            'hedged_requests_sent': collector.hedges_sent,
+            'negative_cache_hits': collector.negative_hits,
+            'product_catalog': collector.catalog.stats() if collector.catalog is not None else None,
+            'api_keys': collector.keys.snapshot(),
+            'cache': collector.cache.stats(),
+            'analyses_running': jobs.running(),
+            'analyses_cancelled': jobs.cancelled_total,
+            'admission': admission.stats(),
+            'roi_graph': roi_graph.stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/health')
 def health_check():
     """Simple health check"""
@@ -286,7 +661,8 @@ def health_check():
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
-            'message': 'Server is running with 2GB RAM'
+            'message': 'Server is running with 2GB RAM',
+            'startup': startup.snapshot()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -303,6 +679,21 @@ def init_data():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def warm_start():
+    """
+    Load what the first requests need before serving them: the episode
+    catalog, the persisted analysis snapshots and the upstream card cache
+    """
+    startup.step('episode_catalog', lambda: {'sets': len(load_available_episodes())})
+    startup.step('analysis_snapshots', lambda: {'mapped': snapshots.preload()})
+    startup.step('card_price_cache', lambda: {'fresh_pages': collector.cache.count_fresh('upstream:cards')})
+    startup.mark_ready()
+
+if collector.config.WARM_START:
+    warm_start()
+else:
+    startup.mark_ready()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     
@@ -0,0 +1,187 @@
+import os
+import re
+import select
+import socket
+import threading
+import time
+
+
+class AnalysisCancelled(Exception):
+    """
+    Raised when the client that asked for an analysis is gone
+    """
+    pass
+
+
+class CancellationToken:
+    """
+    Cancellation flag for one analysis run. Cancelled either directly
+    (cancel()), through a marker file written by any worker process,
+    or by a probe such as a client disconnect check.
+    """
+    def __init__(self, marker_file=None, probe_interval=0.5):
+        self.marker_file = marker_file
+        self.probe_interval = probe_interval
+        self.reason = None
+        self._probes = []
+        self._last_probe = 0
+        self._event = threading.Event()
+
+    def add_probe(self, probe, reason):
+        """
+        probe() returning True cancels the token
+        """
+        self._probes.append((probe, reason))
+
+    def cancel(self, reason='cancelled'):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def is_cancelled(self):
+        if self._event.is_set():
+            return True
+
+        # Probes and the marker file are rate limited, they are polled often
+        now = time.monotonic()
+        if now - self._last_probe < self.probe_interval:
+            return False
+        self._last_probe = now
+
+        if self.marker_file and os.path.exists(self.marker_file):
+            self.cancel('job cancelled')
+            return True
+
+        for probe, reason in self._probes:
+            try:
+                if probe():
+                    self.cancel(reason)
+                    return True
+            except Exception:
+                continue
+
+        return False
+
+    def check(self):
+        """
+        Raise AnalysisCancelled if the token has been cancelled
+        """
+        if self.is_cancelled():
+            raise AnalysisCancelled(f"Analysis cancelled ({self.reason})")
+
+
+class JobRegistry:
+    """
+    Tracks running analysis jobs by client-supplied id so they can be
+    cancelled from any worker process (marker files in a shared directory)
+    """
+    JOB_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+    STALE_MARKER_SECONDS = 3600
+
+    def __init__(self, jobs_dir):
+        self.jobs_dir = jobs_dir
+        self.cancelled_total = 0
+        self._last_purge = 0
+        self._tokens = {}
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _marker_file(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.cancel")
+
+    def is_valid_id(self, job_id):
+        return bool(job_id and self.JOB_ID_PATTERN.match(job_id))
+
+    def register(self, job_id=None):
+        """
+        Create the token for a new job
+        """
+        if not self.is_valid_id(job_id):
+            return CancellationToken()
+
+        self._purge_stale_markers()
+
+        # A reused id must not inherit an old cancellation
+        try:
+            os.remove(self._marker_file(job_id))
+        except OSError:
+            pass
+
+        token = CancellationToken(self._marker_file(job_id))
+        with self._lock:
+            self._tokens[job_id] = token
+        return token
+
+    def _purge_stale_markers(self):
+        """
+        Remove markers for jobs that were cancelled after they had finished
+        """
+        now = time.time()
+        if now - self._last_purge < 600:
+            return
+        self._last_purge = now
+        try:
+            for name in os.listdir(self.jobs_dir):
+                path = os.path.join(self.jobs_dir, name)
+                if name.endswith('.cancel') and now - os.path.getmtime(path) > self.STALE_MARKER_SECONDS:
+                    os.remove(path)
+        except OSError:
+            pass
+
+    def finish(self, job_id, token):
+        """
+        Forget a finished job
+        """
+        if token.is_cancelled():
+            self.cancelled_total += 1
+        if not self.is_valid_id(job_id):
+            return
+        with self._lock:
+            if self._tokens.get(job_id) is token:
+                del self._tokens[job_id]
+        try:
+            os.remove(self._marker_file(job_id))
+        except OSError:
+            pass
+
+    def cancel(self, job_id):
+        """
+        Cancel a job, wherever it is running
+        Returns False for an invalid job id
+        """
+        if not self.is_valid_id(job_id):
+            return False
+
+        with self._lock:
+            token = self._tokens.get(job_id)
+        if token is not None:
+            token.cancel('job cancelled')
+        else:
+            # Running in another worker process (or not started yet)
+            with open(self._marker_file(job_id), 'w') as f:
+                f.write(str(time.time()))
+        return True
+
+    def running(self):
+        with self._lock:
+            return len(self._tokens)
+
+
+def client_disconnected(environ):
+    """
+    Best-effort check whether the HTTP client behind a WSGI request has
+    closed its connection. Works with gunicorn and the Werkzeug dev server,
+    returns False when the socket is not available.
+    """
+    sock = environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+    if sock is None:
+        return False
+
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        # Readable with no data means the peer closed the connection
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
@@ -0,0 +1,292 @@
+import argparse
+import sys
+
+from data_collector import PokemonDataCollector
+from price_history import PriceHistory
+from serializers import write_snapshot, load_snapshot
+from shared_cache import MemoryCache, NullCache
+from topk import top_cards
+
+# Local store
+EPISODES_FILE = "pokemon_episode_ids.json"
+EPISODE_IDS_FILE = "episode_ids_simple.json"
+TOP_CARDS_FILE = "top_expensive_cards_fixed.json"
+PRODUCTS_FILE = "pokemon_products.json"
+DISCOVERED_SETS_FILE = "discovered_sets.json"
+LEADERBOARD_FILE = "card_leaderboard.json"
+
+EPISODE_KEYS = ('id', 'name', 'slug', 'released_at', 'cards_total', 'cards_printed_total')
+
+
+class Catalog:
+    """
+    Catalog data (episodes, cards, products) for all the catalog commands.
+    Everything goes through one collector - pooled session, API key pool
+    and response cache - so within a run every upstream page is fetched
+    at most once, and results are kept in the local JSON store.
+    """
+    def __init__(self, collector=None):
+        self.collector = collector or PokemonDataCollector()
+        # Without a shared cache, still never fetch the same page twice in this run
+        if isinstance(self.collector.cache, NullCache):
+            self.collector.cache = MemoryCache()
+        self._episodes = None
+        self._cards = {}
+        config = self.collector.config
+        self.history = PriceHistory(config.PRICE_HISTORY_DIR, config.PRICE_HISTORY_COMPACT_AFTER_DAYS)
+
+    def episodes(self, refresh=False):
+        """
+        All episodes, from the local store unless it is missing or refresh=True
+        """
+        if self._episodes is None and not refresh:
+            try:
+                self._episodes = load_snapshot(EPISODES_FILE)
+            except FileNotFoundError:
+                pass
+
+        if self._episodes is None or refresh:
+            fetched = self.collector.get_all_episodes()
+            self._episodes = [{key: episode.get(key) for key in EPISODE_KEYS} for episode in fetched]
+            for episode in self._episodes:
+                episode['cards_total'] = episode['cards_total'] or 0
+                episode['cards_printed_total'] = episode['cards_printed_total'] or 0
+            write_snapshot(self._episodes, EPISODES_FILE, fmt='compact')
+            write_snapshot({episode['name']: episode['id'] for episode in self._episodes},
+                           EPISODE_IDS_FILE, fmt='compact')
+            print(f"💾 Saved {len(self._episodes)} episodes to {EPISODES_FILE}")
+
+        return self._episodes
+
+    def episode(self, episode_id):
+        for episode in self.episodes():
+            if str(episode['id']) == str(episode_id):
+                return episode
+        return None
+
+    def cards(self, episode_id):
+        """
+        Every card of an episode (all pages)
+        """
+        if episode_id not in self._cards:
+            self._cards[episode_id] = self.collector.get_all_cards_from_episode(episode_id)
+        return self._cards[episode_id]
+
+    def top_cards(self, episode_ids, top_count=50):
+        """
+        The most expensive cards of each episode, saved to the local store.
+        Pages are read most expensive first and only until they can't
+        make the top anymore.
+        """
+        results = {}
+        for episode_id in episode_ids:
+            episode = self.episode(episode_id) or {'id': episode_id, 'name': f"Episode {episode_id}"}
+            priced, pages_read = top_cards(self.collector, [episode['id']], k=top_count)
+            top = [card for price, card in priced]
+            self.history.record_cards(priced)
+
+            if top:
+                results[episode['name']] = {
+                    'episode_id': episode['id'],
+                    'top_cards_count': len(top),
+                    'top_cards': top
+                }
+                print(f"✅ {episode['name']}: top {len(top)} cards, most expensive €{priced[0][0]:.2f}")
+            else:
+                print(f"❌ {episode['name']}: no cards with prices")
+
+        if results:
+            # Compact, and every episode object is stored once instead of once per card
+            write_snapshot(results, TOP_CARDS_FILE, fmt='compact', dedupe=True, default=str)
+            print(f"💾 Saved top cards of {len(results)} episodes to {TOP_CARDS_FILE}")
+        return results
+
+    def leaderboard(self, episode_ids, top_count=100, workers=4):
+        """
+        The most expensive cards across all given episodes, saved to the local store
+        """
+        priced, pages_read = top_cards(self.collector, episode_ids, k=top_count, workers=workers)
+        self.history.record_cards(priced)
+        leaderboard = [{
+            'rank': rank,
+            'price': price,
+            'name': card.get('name'),
+            'episode': (card.get('episode') or {}).get('name'),
+            'card': card
+        } for rank, (price, card) in enumerate(priced, 1)]
+        
+        write_snapshot(leaderboard, LEADERBOARD_FILE, fmt='compact', dedupe=True, default=str)
+        print(f"💾 Saved top {len(leaderboard)} cards of {len(episode_ids)} episodes to {LEADERBOARD_FILE} "
+              f"({sum(pages_read.values())} pages read)")
+        for entry in leaderboard[:20]:
+            print(f"{entry['rank']:>4}. {(entry['name'] or '')[:38]:<40} {(entry['episode'] or '')[:25]:<27} €{entry['price']:.2f}")
+        return leaderboard
+
+    def products(self, search=None):
+        """
+        Products matching a search, or the whole product list
+        """
+        if search:
+            return self.collector.get_products_by_set_name(search)
+        print("Fetching all products from all pages...")
+        products, complete = self.collector.get_product_pages({}, self.collector.config.PRODUCT_CATALOG_MAX_PAGES)
+        write_snapshot(products, PRODUCTS_FILE, fmt='compact', dedupe=True, default=str)
+        print(f"💾 Saved {len(products)} products to {PRODUCTS_FILE}")
+        if self.collector.catalog is not None and products:
+            count = self.collector.catalog.sync(products, complete)
+            if complete:
+                print(f"📚 Synced {count} products into the product catalog")
+            else:
+                print(f"⚠️ Product list incomplete, merged {count} products into the catalog without marking it synced")
+        return products
+
+    def discover(self):
+        """
+        Sets that have products on the market (searches for popular set names)
+        """
+        found_sets = self.collector.discover_available_sets()
+        write_snapshot(found_sets, DISCOVERED_SETS_FILE, fmt='compact')
+        print(f"💾 Saved {len(found_sets)} discovered sets to {DISCOVERED_SETS_FILE}")
+        return found_sets
+
+
+def sets_from_products(products):
+    """
+    Unique episodes of a product list, newest first, with product counts
+    """
+    unique_sets = {}
+    for product in products:
+        episode = product.get('episode') or {}
+        slug = episode.get('slug')
+        if not slug:
+            continue
+        info = unique_sets.setdefault(slug, {
+            'name': episode.get('name', ''),
+            'slug': slug,
+            'released_at': episode.get('released_at') or '',
+            'product_count': 0
+        })
+        info['product_count'] += 1
+    return sorted(unique_sets.values(), key=lambda info: info['released_at'] or '0000', reverse=True)
+
+
+def print_episodes(episodes):
+    print(f"\n{'ID':<4} {'NAME':<30} {'SLUG':<25} {'RELEASED':<12} {'CARDS'}")
+    print("-" * 80)
+    for episode in episodes:
+        print(f"{episode['id']:<4} {(episode['name'] or '')[:28]:<30} {(episode['slug'] or '')[:23]:<25} "
+              f"{(episode['released_at'] or 'Unknown')[:10]:<12} {episode['cards_total']}")
+
+
+def print_products(products, search=None):
+    if search:
+        for product in products:
+            price = product.get('prices', {}).get('cardmarket', {}).get('lowest', 'N/A')
+            print(f"   • {product.get('name', 'Unknown')} - €{price}")
+        return
+
+    print(f"\n{'SET NAME':<40} {'SLUG':<25} {'RELEASED':<12} {'PRODUCTS'}")
+    print("-" * 85)
+    for info in sets_from_products(products):
+        print(f"{info['name'][:38]:<40} {info['slug'][:23]:<25} {info['released_at'][:10]:<12} {info['product_count']}")
+
+
+def print_discovered(found_sets):
+    print(f"\n{'SEARCH TERM':<20} {'SET NAME':<25} {'SLUG':<30} {'PRODUCTS'}")
+    print("-" * 80)
+    for set_info in found_sets:
+        print(f"{set_info['search_term'][:18]:<20} {set_info['name'][:23]:<25} "
+              f"{set_info['slug'][:28]:<30} {set_info['products_found']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pokemon TCG catalog tool (episodes, cards, products)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    episodes = commands.add_parser('episodes', help="list episodes (fetches them when the local store is empty)")
+    episodes.add_argument('--refresh', action='store_true', help="fetch from the API even if stored locally")
+
+    cards = commands.add_parser('cards', help="all cards of episodes")
+    cards.add_argument('episode_ids', nargs='+', type=int)
+
+    products = commands.add_parser('products', help="search products, or sync the product catalog and list its sets")
+    products.add_argument('--search', help="set name to search products for")
+
+    top_cards = commands.add_parser('top-cards', help="most expensive cards per episode")
+    top_cards.add_argument('episode_ids', nargs='*', type=int)
+    top_cards.add_argument('--all', action='store_true', help="every episode that has cards")
+    top_cards.add_argument('--top', type=int, default=50, help="cards per episode (default 50)")
+
+    leaderboard = commands.add_parser('leaderboard', help="most expensive cards across episodes")
+    leaderboard.add_argument('episode_ids', nargs='*', type=int)
+    leaderboard.add_argument('--all', action='store_true', help="every episode that has cards")
+    leaderboard.add_argument('--top', type=int, default=100, help="size of the leaderboard (default 100)")
+    leaderboard.add_argument('--workers', type=int, default=4, help="episodes read at the same time (default 4)")
+
+    commands.add_parser('discover', help="find sets with products by searching popular set names")
+
+    commands.add_parser('refresh', help="episodes, top cards of every episode, products and discovered sets in one run")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    catalog = Catalog()
+    collector = catalog.collector
+
+    # Listing the stored episodes needs no API
+    needs_api = not (args.command == 'episodes' and not args.refresh)
+    if needs_api and not collector.test_api_connection():
+        print("❌ Cannot connect to API. Check your .env file.")
+        return 1
+
+    try:
+        if args.command == 'episodes':
+            print_episodes(catalog.episodes(refresh=args.refresh))
+
+        elif args.command == 'cards':
+            for episode_id in args.episode_ids:
+                cards = catalog.cards(episode_id)
+                print(f"Episode {episode_id}: {len(cards)} cards")
+
+        elif args.command == 'products':
+            print_products(catalog.products(args.search), args.search)
+
+        elif args.command == 'top-cards':
+            episode_ids = args.episode_ids
+            if args.all:
+                episode_ids = [episode['id'] for episode in catalog.episodes() if episode['cards_total'] > 0]
+            if not episode_ids:
+                print("❌ Give episode ids or --all")
+                return 1
+            catalog.top_cards(episode_ids, top_count=args.top)
+
+        elif args.command == 'leaderboard':
+            episode_ids = args.episode_ids
+            if args.all:
+                episode_ids = [episode['id'] for episode in catalog.episodes() if episode['cards_total'] > 0]
+            if not episode_ids:
+                print("❌ Give episode ids or --all")
+                return 1
+            catalog.leaderboard(episode_ids, top_count=args.top, workers=args.workers)
+
+        elif args.command == 'discover':
+            print_discovered(catalog.discover())
+
+        elif args.command == 'refresh':
+            episodes = catalog.episodes(refresh=True)
+            catalog.top_cards([episode['id'] for episode in episodes if episode['cards_total'] > 0])
+            catalog.products()
+            catalog.discover()
+
+        stats = collector.cache.stats()
+        print(f"\n📡 API calls: {collector.quota.snapshot()['process_calls_total']} "
+              f"(cache hits: {stats['hits']}, misses: {stats['misses']})")
+    finally:
+        collector.quota.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
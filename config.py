@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -8,14 +9,97 @@ class Config:
     # API Keys
     RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY')
     
+    # Several keys (comma-separated) are used together, each call goes
+    # to the key with the most quota left
+    RAPIDAPI_KEYS = [key.strip() for key in os.getenv('RAPIDAPI_KEYS', RAPIDAPI_KEY or '').split(',') if key.strip()]
+    RAPIDAPI_KEY_DAILY_LIMIT = int(os.getenv('RAPIDAPI_KEY_DAILY_LIMIT', '0'))  # 0 = unknown
+    KEY_RATE_LIMIT_COOLDOWN_SECONDS = float(os.getenv('KEY_RATE_LIMIT_COOLDOWN_SECONDS', '60'))
+    KEY_REJECTED_COOLDOWN_SECONDS = float(os.getenv('KEY_REJECTED_COOLDOWN_SECONDS', '3600'))
+    
     # API URLs
     POKEMON_API_BASE_URL = "https://pokemon-tcg-api.p.rapidapi.com"
+    RAPIDAPI_HOST = "pokemon-tcg-api.p.rapidapi.com"
     
     # API Headers
     RAPIDAPI_HEADERS = {
-        "X-RapidAPI-Key": RAPIDAPI_KEY,
-        "X-RapidAPI-Host": "pokemon-tcg-api.p.rapidapi.com"
+        "X-RapidAPI-Key": RAPIDAPI_KEY or (RAPIDAPI_KEYS[0] if RAPIDAPI_KEYS else None),
+        "X-RapidAPI-Host": RAPIDAPI_HOST
     }
     
+    # API usage accounting
+    API_USAGE_FILE = os.getenv('API_USAGE_FILE', 'api_usage.json')
+    DEFAULT_CALL_BUDGET = int(os.getenv('DEFAULT_CALL_BUDGET', '0'))  # 0 = unlimited
+    
+    # Upstream health / circuit breaker
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_COOLDOWN_SECONDS = float(os.getenv('CIRCUIT_COOLDOWN_SECONDS', '30'))
+    HEALTH_TTL_SECONDS = float(os.getenv('HEALTH_TTL_SECONDS', '300'))  # trust a successful call this long
+    
+    # Timeouts and hedged requests
+    REQUEST_TIMEOUT_SECONDS = float(os.getenv('REQUEST_TIMEOUT_SECONDS', '15'))
+    DEFAULT_TIME_BUDGET_SECONDS = float(os.getenv('DEFAULT_TIME_BUDGET_SECONDS', '25'))  # gunicorn kills workers at 30s
+    HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', 'false').lower() == 'true'
+    HEDGE_MIN_DELAY_SECONDS = float(os.getenv('HEDGE_MIN_DELAY_SECONDS', '2'))
+    HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', '8'))
+    
+    # Keep-alive connections to the API shared by all threads
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '16'))
+    
+    # Shared directory for cancelling analysis jobs across worker processes
+    JOBS_DIR = os.getenv('JOBS_DIR', os.path.join(tempfile.gettempdir(), 'pokemon_tcg_jobs'))
+    
+    # Admission control: analyses running at once on this host, how many
+    # may wait for a slot and for how long before they are turned away
+    MAX_CONCURRENT_ANALYSES = int(os.getenv('MAX_CONCURRENT_ANALYSES', '2'))
+    ANALYSIS_QUEUE_SIZE = int(os.getenv('ANALYSIS_QUEUE_SIZE', '4'))
+    ANALYSIS_QUEUE_MAX_WAIT_SECONDS = float(os.getenv('ANALYSIS_QUEUE_MAX_WAIT_SECONDS', '10'))
+    ADMISSION_DIR = os.getenv('ADMISSION_DIR', os.path.join(tempfile.gettempdir(), 'pokemon_tcg_admission'))
+    
+    # HTTP caching (seconds, 0 = always revalidate with the ETag)
+    SETS_CACHE_MAX_AGE = int(os.getenv('SETS_CACHE_MAX_AGE', '3600'))
+    ANALYZE_CACHE_MAX_AGE = int(os.getenv('ANALYZE_CACHE_MAX_AGE', '0'))
+    
+    # Snapshot files: 'json' (indented), 'compact' or 'msgpack'
+    SNAPSHOT_FORMAT = os.getenv('SNAPSHOT_FORMAT', 'json')
+    SNAPSHOT_COMPRESS = os.getenv('SNAPSHOT_COMPRESS', 'false').lower() == 'true'
+    
+    # Cache shared by all gunicorn workers: 'sqlite', 'memory' (per process) or 'none'
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')
+    CACHE_DB = os.getenv('CACHE_DB', 'pokemon_cache.sqlite3')
+    UPSTREAM_CACHE_TTL = int(os.getenv('UPSTREAM_CACHE_TTL', '3600'))
+    ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', '900'))
+    # Searches and episodes without results, forgotten earlier when the episode catalog changes
+    NEGATIVE_CACHE_TTL = int(os.getenv('NEGATIVE_CACHE_TTL', str(24 * 3600)))
+    # Per-set results keyed by the hash of their inputs, never stale, only expired to free space
+    ANALYSIS_MEMO_TTL = int(os.getenv('ANALYSIS_MEMO_TTL', str(7 * 24 * 3600)))
+    
+    # Memory-mapped analysis snapshots served by all workers
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+    
+    # Append-only card and product price history, days are compacted once they are this old
+    PRICE_HISTORY_DIR = os.getenv('PRICE_HISTORY_DIR', 'price_history')
+    PRICE_HISTORY_COMPACT_AFTER_DAYS = int(os.getenv('PRICE_HISTORY_COMPACT_AFTER_DAYS', '1'))
+    
+    # Watch mode: each set is polled between these intervals, faster while its prices move
+    WATCH_MIN_INTERVAL_SECONDS = float(os.getenv('WATCH_MIN_INTERVAL_SECONDS', '300'))
+    WATCH_MAX_INTERVAL_SECONDS = float(os.getenv('WATCH_MAX_INTERVAL_SECONDS', '21600'))
+    
+    # Local product catalog (synced by `catalog.py products`, episodes also by every refresh),
+    # an episode's products are read from it while they are this fresh
+    PRODUCT_CATALOG_DB = os.getenv('PRODUCT_CATALOG_DB', 'product_catalog.sqlite3')
+    PRODUCT_CATALOG_MAX_AGE_SECONDS = int(os.getenv('PRODUCT_CATALOG_MAX_AGE_SECONDS', str(24 * 3600)))
+    PRODUCT_CATALOG_MAX_PAGES = int(os.getenv('PRODUCT_CATALOG_MAX_PAGES', '1000'))
+    
+    # Refresh scheduler: per-set refresh intervals (scaled by age, volatility
+    # and demand) and the API calls it may spend per hour
+    SCHEDULER_DB = os.getenv('SCHEDULER_DB', 'refresh_schedule.sqlite3')
+    REFRESH_BASE_INTERVAL_SECONDS = float(os.getenv('REFRESH_BASE_INTERVAL_SECONDS', '3600'))
+    REFRESH_MIN_INTERVAL_SECONDS = float(os.getenv('REFRESH_MIN_INTERVAL_SECONDS', '900'))
+    REFRESH_MAX_INTERVAL_SECONDS = float(os.getenv('REFRESH_MAX_INTERVAL_SECONDS', str(7 * 86400)))
+    REFRESH_CALL_BUDGET = int(os.getenv('REFRESH_CALL_BUDGET', '200'))
+    
+    # Load the catalog, snapshots and caches when a worker boots
+    WARM_START = os.getenv('WARM_START', 'true').lower() == 'true'
+    
     # Application settings
     DEBUG = True
\ No newline at end of file
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+
+import pytest
+
+from data_collector import PokemonDataCollector
+from shared_cache import MemoryCache
+
+
+def _card(card_id, price):
+    return {'id': card_id, 'name': f"Card {card_id}", 'prices': {'cardmarket': {'lowest_near_mint': price}}}
+
+
+def _product(product_id, name, price, set_name):
+    return {'id': product_id, 'name': name, 'prices': {'cardmarket': {'lowest': price}},
+            'episode': {'name': set_name, 'released_at': '2024-01-01'}}
+
+
+@pytest.fixture
+def make_card():
+    return _card
+
+
+@pytest.fixture
+def make_products():
+    """
+    get_specific_products() result of a set with one ETB and one booster box
+    """
+    def make_products(etb_price=50, box_price=150, set_name='Test Set', base_id=1):
+        return {
+            'etb': [_product(base_id, f"{set_name} Elite Trainer Box", etb_price, set_name)],
+            'booster_boxes': [_product(base_id + 1, f"{set_name} Booster Box", box_price, set_name)]
+        }
+    return make_products
+
+
+@pytest.fixture
+def cards():
+    return [_card(1, 40), _card(2, 20)]
+
+
+class FakeCollector:
+    """
+    Collector serving fixed products (per set name) and cards, without upstream
+    """
+    class config:
+        ANALYSIS_MEMO_TTL = 3600
+
+    def __init__(self, products, cards):
+        self.cache = MemoryCache()
+        self.products = products
+        self.cards = cards
+        self.scopes = []
+
+    @contextmanager
+    def analysis_scope(self, **scope):
+        self.scopes.append(scope)
+        yield
+
+    def get_specific_products(self, set_name):
+        return self.products[set_name]
+
+    def get_cards_by_set_name(self, set_name, limit=50):
+        return self.cards
+
+
+@pytest.fixture
+def fake_collector(make_products, cards):
+    return FakeCollector({'test set': make_products()}, cards)
+
+
+@pytest.fixture
+def collector(tmp_path, monkeypatch):
+    """
+    Real collector over an in-memory cache, writing its files under tmp_path
+    """
+    monkeypatch.chdir(tmp_path)
+    collector = PokemonDataCollector()
+    collector.cache = MemoryCache()
+    return collector
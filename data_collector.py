@@ -1,14 +1,271 @@
-import requests
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from config import Config
+from quota import QuotaTracker, BudgetExceeded
+from upstream_health import UpstreamHealth, CircuitOpenError
+from deadline import DeadlineExceeded, LatencyTracker, hedged_call
+from cancellation import AnalysisCancelled
+from serializers import write_snapshot, snapshot_filename
+from streaming_json import CARD_FIELDS, PRODUCT_FIELDS, EPISODE_FIELDS, parse_response
+from shared_cache import make_cache
+from negative_cache import negative_key
+from product_catalog import BOOSTER_BOX, ETB, classify_product, episode_id_from_file, make_product_catalog
+from key_pool import ApiKeyPool, RATE_LIMITED, KEY_REJECTED
+from urllib.parse import urlencode
+from lazy_import import lazy_module
+
+# Imported on first use, a worker that serves cached results never needs it
+requests = lazy_module('requests')
+
+# Errors that must stop the whole analysis instead of being treated as "no data"
+ABORT_ERRORS = (BudgetExceeded, CircuitOpenError, DeadlineExceeded, AnalysisCancelled)
 
 class PokemonDataCollector:
     def __init__(self):
         self.config = Config()
         self.base_url = self.config.POKEMON_API_BASE_URL
         self.headers = self.config.RAPIDAPI_HEADERS
+        self.keys = ApiKeyPool(
+            self.config.RAPIDAPI_KEYS,
+            self.config.RAPIDAPI_HOST,
+            daily_limit=self.config.RAPIDAPI_KEY_DAILY_LIMIT,
+            rate_limit_cooldown=self.config.KEY_RATE_LIMIT_COOLDOWN_SECONDS,
+            rejected_cooldown=self.config.KEY_REJECTED_COOLDOWN_SECONDS
+        )
+        self.quota = QuotaTracker(self.config.API_USAGE_FILE)
+        self.health = UpstreamHealth(
+            failure_threshold=self.config.CIRCUIT_FAILURE_THRESHOLD,
+            cooldown=self.config.CIRCUIT_COOLDOWN_SECONDS,
+            healthy_ttl=self.config.HEALTH_TTL_SECONDS
+        )
+        self.cache = make_cache(self.config)
+        self.catalog = make_product_catalog(self.config)
+        self.latency = LatencyTracker()
+        self.hedges_sent = 0
+        # Set once /products is seen ignoring episode_id, products are searched by set name from then on
+        self.episode_filter_ignored = False
+        self.negative_hits = 0
+        # Hedged calls run here so the request thread can stop waiting for the slower one
+        self._call_pool = ThreadPoolExecutor(
+            max_workers=self.config.HEDGE_MAX_WORKERS,
+            thread_name_prefix='upstream-call'
+        )
+        self._session = None
+        self._session_lock = threading.Lock()
+        # hedges_sent and negative_hits are counted by every request thread
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+    
+    @contextmanager
+    def analysis_scope(self, budget=None, deadline=None, hedge=False, cancel_token=None, refresh=False):
+        """
+        Apply a CallBudget, a Deadline, the hedging setting and a
+        CancellationToken to every upstream call made by this thread.
+        refresh=True fetches every page from the API even if it is cached
+        (and puts the new page in the cache).
+        """
+        previous = getattr(self._local, 'scope', None)
+        self._local.scope = {'budget': budget, 'deadline': deadline, 'hedge': hedge, 'cancel_token': cancel_token,
+                             'refresh': refresh}
+        try:
+            yield
+        finally:
+            self._local.scope = previous
+    
+    def _charge(self, endpoint, budget):
+        """
+        Count one call against the budget (if any) and the quota
+        """
+        if budget is not None:
+            budget.charge(endpoint)
+        self.quota.record(endpoint)
+    
+    def _get(self, endpoint, params, stream=False):
+        """
+        Send a GET request to the API, counting it against the quota
+        and the budget of the current analysis (if any).
+        Fails fast with CircuitOpenError while the upstream is known to be down
+        and with DeadlineExceeded when the analysis is out of time.
+        Raises AnalysisCancelled instead of calling when nobody wants the result.
+        """
+        scope = getattr(self._local, 'scope', None) or {}
+        budget = scope.get('budget')
+        deadline = scope.get('deadline')
+        cancel_token = scope.get('cancel_token')
+        
+        if cancel_token is not None:
+            cancel_token.check()
+        
+        default_timeout = self.config.REQUEST_TIMEOUT_SECONDS
+        timeout = deadline.call_timeout(default_timeout) if deadline else default_timeout
+        
+        self.health.before_call()
+        try:
+            self._charge(endpoint, budget)
+        except BudgetExceeded:
+            self.health.release_trial()
+            raise
+        
+        url = f"{self.base_url}/{endpoint}"
+        retries = 0
+        while True:
+            started = time.time()
+            try:
+                if scope.get('hedge'):
+                    response = self._pooled_get(url, params, timeout, endpoint, budget,
+                                                scope.get('hedge'), cancel_token, stream)
+                else:
+                    response = self._send(url, params, timeout, stream)
+            except requests.exceptions.Timeout as e:
+                if timeout < default_timeout:
+                    # Our own deadline cut the call short, that says nothing about the upstream
+                    self.health.release_trial()
+                    raise DeadlineExceeded(f"Time budget ran out during {endpoint} call") from e
+                self.health.record_failure(e)
+                raise
+            except requests.exceptions.RequestException as e:
+                self.health.record_failure(e)
+                raise
+            except Exception:
+                # Cancelled, no API key left in rotation (CircuitOpenError) or
+                # anything else that says nothing about the upstream
+                self.health.release_trial()
+                raise
+            
+            latency = time.time() - started
+            self.latency.add(latency)
+            
+            # The pool took that key out of rotation, try the next one
+            if (response.status_code in (RATE_LIMITED, KEY_REJECTED)
+                    and retries < len(self.keys) - 1 and self.keys.available()):
+                retries += 1
+                response.close()
+                try:
+                    self._charge(endpoint, budget)
+                except BudgetExceeded:
+                    self.health.release_trial()
+                    raise
+                continue
+            
+            self.health.record_response(response.status_code, latency)
+            return response
+    
+    def _http(self):
+        """
+        Session with a connection pool, shared by all threads
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.config.HTTP_POOL_SIZE)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+    
+    def _send(self, url, params, timeout, stream=False):
+        """
+        One GET with the API key that has the most headroom
+        """
+        key = self.keys.acquire()
+        try:
+            response = self._http().get(url, headers=self.keys.headers(key), params=params, timeout=timeout, stream=stream)
+        except Exception:
+            self.keys.release(key)
+            raise
+        self.keys.release(key, response)
+        return response
+    
+    def _pooled_get(self, url, params, timeout, endpoint, budget, hedge, cancel_token, stream=False):
+        """
+        GET run on the call pool: a duplicate request is sent when the first
+        one is slower than our usual p95 latency, and whichever answers
+        first wins. Waiting stops right away when the analysis is cancelled.
+        """
+        hedge_delay = max(self.config.HEDGE_MIN_DELAY_SECONDS, self.latency.percentile(95) or 0) if hedge else None
+        
+        def send():
+            return self._send(url, params, timeout, stream)
+        
+        def before_hedge():
+            try:
+                self._charge(endpoint, budget)
+            except BudgetExceeded:
+                return False
+            with self._stats_lock:
+                self.hedges_sent += 1
+            return True
+        
+        try:
+            return hedged_call(self._call_pool, send, hedge_delay, timeout, before_hedge, cancel_token)
+        except TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+    
+    def _get_page(self, endpoint, params, fields, first_page=False):
+        """
+        One page from the API, served from the shared cache when another
+        request (in any worker) fetched it recently. Only one worker
+        refreshes a page at a time. Lookups whose first page (first_page=True)
+        came back empty are remembered for NEGATIVE_CACHE_TTL (until the
+        episode catalog changes).
+        Returns {'data': [...], 'paging': {...}, ...}
+        """
+        key = f"upstream:{endpoint}?{urlencode(sorted(params.items()))}#{','.join(fields)}"
+        
+        # Checked between pages, cancelling stops the paging loops even on cached pages
+        scope = getattr(self._local, 'scope', None) or {}
+        if scope.get('cancel_token') is not None:
+            scope['cancel_token'].check()
+        
+        # Don't wait for another worker longer than this analysis has left
+        deadline = scope.get('deadline')
+        remaining = deadline.remaining() if deadline else None
+        wait_timeout = self.config.REQUEST_TIMEOUT_SECONDS if remaining is None else min(remaining, self.config.REQUEST_TIMEOUT_SECONDS)
+        
+        # Searches and episodes known to have no results are not asked again
+        negative = negative_key(endpoint, params) if first_page else None
+        if negative is not None and not scope.get('refresh'):
+            entry = self.cache.get_entry(negative)
+            if entry is not None and entry[1] > time.time():
+                with self._stats_lock:
+                    self.negative_hits += 1
+                return {'data': []}
+        
+        if scope.get('refresh'):
+            self.cache.delete(key)
+        
+        page = self.cache.get_or_refresh(
+            key,
+            self.config.UPSTREAM_CACHE_TTL,
+            lambda: self._fetch_page(endpoint, params, fields),
+            lease_ttl=self.config.REQUEST_TIMEOUT_SECONDS * 2,
+            wait_timeout=wait_timeout
+        )
+        if negative is not None and not page.get('data'):
+            self.cache.set(negative, True, self.config.NEGATIVE_CACHE_TTL)
+        return page
+    
+    def _fetch_page(self, endpoint, params, fields):
+        """
+        GET one page from the API and parse it as a stream, keeping only the
+        given fields of each item (see streaming_json)
+        """
+        response = self._get(endpoint, params, stream=True)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        
+        try:
+            return parse_response(response, fields)
+        except ValueError as e:
+            raise requests.exceptions.InvalidJSONError(f"Invalid JSON from /{endpoint}: {e}") from e
     
     def get_products_by_set_name(self, set_name):
         """
@@ -16,17 +273,13 @@ class PokemonDataCollector:
         Example: set_name = "evolving skies" or "destined rivals"
         """
         try:
-            url = f"{self.base_url}/products"
             params = {
                 "search": set_name,
                 "per_page": 50
             }
             
             print(f"Searching for products: '{set_name}'")
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_page('products', params, PRODUCT_FIELDS, first_page=True)
             products = data.get('data', [])
             
             print(f"Found {len(products)} products for '{set_name}'")
@@ -34,19 +287,17 @@ class PokemonDataCollector:
             # Debug: Show what we found
             if products:
                 product_types = {}
+                labels = {ETB: 'ETB', BOOSTER_BOX: 'Booster Box'}
                 for product in products:
-                    name = product.get('name', '').lower()
-                    if 'elite trainer box' in name or 'etb' in name:
-                        product_types['ETB'] = product_types.get('ETB', 0) + 1
-                    elif 'booster box' in name:
-                        product_types['Booster Box'] = product_types.get('Booster Box', 0) + 1
-                    else:
-                        product_types['Other'] = product_types.get('Other', 0) + 1
+                    label = labels.get(classify_product(product), 'Other')
+                    product_types[label] = product_types.get(label, 0) + 1
                 
                 print(f"   Product breakdown: {dict(product_types)}")
             
             return products
             
+        except ABORT_ERRORS:
+            raise
         except requests.exceptions.RequestException as e:
             print(f"Error fetching products for '{set_name}': {e}")
             return []
@@ -66,13 +317,9 @@ class PokemonDataCollector:
             print("Fetching all episodes from all pages...")
             
             while page <= max_pages:
-                url = f"{self.base_url}/episodes"
                 params = {"page": page, "per_page": 20}
                 
-                response = requests.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                
-                data = response.json()
+                data = self._get_page('episodes', params, EPISODE_FIELDS)
                 episodes = data.get('data', [])
                 
                 if not episodes:
@@ -109,6 +356,84 @@ class PokemonDataCollector:
             print(f"Error fetching episodes: {e}")
             return []
     
+    def get_all_products(self, max_pages=100):
+        """
+        Get every product by going through all pages
+        """
+        print("Fetching all products from all pages...")
+        all_products, complete = self.get_product_pages({}, max_pages)
+        print(f"Total products found: {len(all_products)}")
+        return all_products
+    
+    def get_product_pages(self, params, max_pages=100, first_page_lookup=False, first_page_check=None):
+        """
+        Products of all pages of a /products request.
+        Returns (products, complete): complete is False when the pages were
+        cut short by max_pages or an error, not by the end of the paging.
+        When first_page_check(products) rejects page 1, no more pages are
+        fetched and (None, False) is returned.
+        """
+        all_products = []
+        page = 1
+        
+        while page <= max_pages:
+            try:
+                page_params = dict(params, page=page, per_page=20)
+                
+                data = self._get_page('products', page_params, PRODUCT_FIELDS,
+                                      first_page=first_page_lookup and page == 1)
+                products = data.get('data', [])
+                
+                if not products:
+                    return all_products, True
+                
+                if page == 1 and first_page_check is not None and not first_page_check(products):
+                    return None, False
+                
+                all_products.extend(products)
+                
+                # Check if there are more pages
+                paging = data.get('paging', {})
+                if paging.get('current', page) >= paging.get('total', 1):
+                    return all_products, True
+                
+                page += 1
+                
+            except ABORT_ERRORS:
+                raise
+            except Exception as e:
+                print(f"Error getting products page {page}: {e}")
+                return all_products, False
+        
+        print(f"⚠️ Stopped after {max_pages} pages of products, the list is incomplete")
+        return all_products, False
+    
+    def get_products_by_episode_id(self, episode_id, max_pages=20):
+        """
+        Every product of an episode (all pages), as (products, complete).
+        Returns (None, False) when /products does not filter by episode_id:
+        page 1 then holds other episodes' products, and paging on would walk
+        the whole product list.
+        """
+        if self.episode_filter_ignored:
+            return None, False
+        
+        def of_episode(product):
+            return (product.get('episode') or {}).get('id') == episode_id
+        
+        products, complete = self.get_product_pages(
+            {"episode_id": episode_id}, max_pages, first_page_lookup=True,
+            first_page_check=lambda page: all(of_episode(product) for product in page)
+        )
+        if products is None:
+            print(f"⚠️ /products ignored episode_id={episode_id}, searching products by set name instead")
+            self.episode_filter_ignored = True
+            return None, False
+        # Only the exact episode, whatever later pages matched
+        products = [product for product in products if of_episode(product)]
+        print(f"Found {len(products)} products for episode {episode_id}")
+        return products, complete
+    
     def find_episode_by_name(self, set_name):
         """
         Find episode ID by searching for set name
@@ -136,7 +461,6 @@ class PokemonDataCollector:
         Get cards by episode ID using the correct endpoint
         """
         try:
-            url = f"{self.base_url}/cards"
             params = {
                 "episode": episode_id,
                 "per_page": limit,
@@ -144,10 +468,7 @@ class PokemonDataCollector:
             }
             
             print(f"Getting cards for episode ID {episode_id}...")
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_page('cards', params, CARD_FIELDS, first_page=True)
             cards = data.get('data', [])
             
             print(f"Found {len(cards)} cards for episode {episode_id}")
@@ -166,17 +487,13 @@ class PokemonDataCollector:
             print(f"Getting top {limit} cards for '{set_name}' (optimized method)")
         
             # Try direct search first (1 API call)
-            url = f"{self.base_url}/cards"
             params = {
                 "search": set_name,
                 "per_page": min(limit, 50),
                 "sort": "price_desc"
             }
             
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._get_page('cards', params, CARD_FIELDS, first_page=True)
             cards = data.get('data', [])
             
             print(f"   Found {len(cards)} cards via direct search")
@@ -202,6 +519,8 @@ class PokemonDataCollector:
             print(f"   No valid cards found for '{set_name}'")
             return []
             
+        except ABORT_ERRORS:
+            raise
         except Exception as e:
             print(f"Error getting cards for '{set_name}': {e}")
             return []
@@ -211,28 +530,35 @@ class PokemonDataCollector:
         Get ALL cards from an episode (multiple pages)
         """
         all_cards = []
+        for cards in self.iter_card_pages(episode_id):
+            all_cards.extend(cards)
+        return all_cards
+    
+    def iter_card_pages(self, episode_id, sort=None, max_pages=50):
+        """
+        Cards of an episode one page at a time, so callers can stop
+        early (e.g. with sort="price_desc" once prices get too low)
+        """
         page = 0
-        max_pages = 50
         
         while page < max_pages:
             try:
-                url = f"{self.base_url}/cards"
                 params = {
                     "episode_id": episode_id,
                     "per_page": 20,
                     "page": page
                 }
+                if sort:
+                    params["sort"] = sort
                 
-                response = requests.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                
-                data = response.json()
+                # Card pages start at 0
+                data = self._get_page('cards', params, CARD_FIELDS, first_page=page == 0)
                 cards = data.get('data', [])
                 
                 if not cards:
                     break
                 
-                all_cards.extend(cards)
+                yield cards
                 
                 # Check pagination
                 paging = data.get('paging', {})
@@ -241,11 +567,11 @@ class PokemonDataCollector:
                 
                 page += 1
                 
+            except ABORT_ERRORS:
+                raise
             except Exception as e:
                 print(f"Error getting page {page}: {e}")
                 break
-        
-        return all_cards
     
     def extract_card_price(self, card):
         """
@@ -294,22 +620,51 @@ class PokemonDataCollector:
         """
         Get specific ETB and Booster Box products for a set
         Returns: {'etb': [...], 'booster_boxes': [...]}
+        
+        Products are those of the episode named exactly set_name. They are
+        read from the local product catalog (no API call) while the episode
+        was fetched in full within PRODUCT_CATALOG_MAX_AGE_SECONDS. Otherwise,
+        and when refreshing, they are fetched by episode id and replace the
+        episode's products in the catalog. Only set names that name no known
+        episode fall back to a search.
         """
-        all_products = self.get_products_by_set_name(set_name)
+        scope = getattr(self._local, 'scope', None) or {}
+        episode_id = None
+        if self.catalog is not None:
+            try:
+                episode_id = self.catalog.episode_id(set_name)
+            except Exception as e:
+                print(f"⚠️ Product catalog unavailable ({e})")
+        if episode_id is None:
+            episode_id = episode_id_from_file(set_name)
+        
+        if episode_id is None:
+            print(f"   '{set_name}' names no known episode, searching products")
+            all_products = self.get_products_by_set_name(set_name)
+        elif (self.catalog is not None and not scope.get('refresh')
+                and self.catalog.is_fresh(episode_id, self.config.PRODUCT_CATALOG_MAX_AGE_SECONDS)):
+            all_products = self.catalog.products(episode_id)
+            print(f"📚 {len(all_products)} products of '{set_name}' (episode {episode_id}) from the product catalog")
+        else:
+            all_products, complete = self.get_products_by_episode_id(episode_id)
+            if all_products is None:
+                # Upstream has no episode filter: the search, narrowed to the episode
+                all_products = [product for product in self.get_products_by_set_name(set_name)
+                                if (product.get('episode') or {}).get('id') == episode_id]
+            if self.catalog is not None:
+                if complete:
+                    self.catalog.replace_episode(episode_id, all_products)
+                else:
+                    self.catalog.upsert(all_products)
         
         etbs = []
         booster_boxes = []
         
         for product in all_products:
-            name = product.get('name', '').lower()
-            slug = product.get('slug', '')
-            
-            # Check for Elite Trainer Box
-            if 'elite trainer box' in name or 'etb' in name:
+            product_class = classify_product(product)
+            if product_class == ETB:
                 etbs.append(product)
-            
-            # Check for Booster Box (but not Elite Trainer Box)
-            elif 'booster box' in name and 'elite trainer' not in name:
+            elif product_class == BOOSTER_BOX:
                 booster_boxes.append(product)
         
         print(f"   Found {len(etbs)} ETBs and {len(booster_boxes)} Booster Boxes")
@@ -382,36 +737,54 @@ class PokemonDataCollector:
         
         return found_sets
     
-    def save_data_to_file(self, data, filename):
+    def save_data_to_file(self, data, filename, fmt=None, compress=None):
         """
-        Save data to JSON file with timestamp
+        Save data to a snapshot file with timestamp
+        fmt: 'json' (indented), 'compact' or 'msgpack', defaults to Config.SNAPSHOT_FORMAT
+        Returns the file name, or None if saving failed
         """
+        fmt = fmt or self.config.SNAPSHOT_FORMAT
+        if compress is None:
+            compress = self.config.SNAPSHOT_COMPRESS
+        
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        full_filename = f"{timestamp}_{filename}.json"
+        full_filename = snapshot_filename(f"{timestamp}_{filename}", fmt, compress)
         
         try:
-            with open(full_filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            write_snapshot(data, full_filename, fmt=fmt, compress=compress)
             
             print(f"Data saved to {full_filename}")
+            return full_filename
             
         except Exception as e:
             print(f"Error saving data: {e}")
+            return None
     
     def test_api_connection(self):
         """
         Test if API connection is working
+        Uses the health observed from recent real calls and only sends
+        a probe request when we know nothing about the upstream yet
         """
+        if self.health.is_known_healthy():
+            return True
+        
+        if self.health.is_open():
+            print(f"❌ API unavailable (circuit open, retry in {self.health.retry_after():.0f}s)")
+            return False
+        
         try:
-            url = f"{self.base_url}/products"
             params = {"per_page": 1}
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._get('products', params)
             response.raise_for_status()
             
             print("✅ API connection successful!")
             return True
             
+        except CircuitOpenError as e:
+            print(f"❌ API connection failed: {e}")
+            return False
         except requests.exceptions.RequestException as e:
             print(f"❌ API connection failed: {e}")
             return False
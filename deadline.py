@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# How often a waiting call checks whether its analysis was cancelled
+CANCEL_POLL_SECONDS = 0.2
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when there is not enough time left for another upstream call
+    """
+    pass
+
+
+class Deadline:
+    """
+    Time budget for a single analysis run
+    seconds=None means no deadline
+    """
+    def __init__(self, seconds=None):
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.seconds if self.seconds else None
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def call_timeout(self, default_timeout, min_timeout=0.5):
+        """
+        Timeout for the next upstream call: the default, cut down to the time
+        that is left. Raises DeadlineExceeded if less than min_timeout is left.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return default_timeout
+        if remaining < min_timeout:
+            raise DeadlineExceeded(f"Time budget of {self.seconds}s used up")
+        return min(default_timeout, remaining)
+
+
+class LatencyTracker:
+    """
+    Rolling window of upstream call latencies, used to decide when a call
+    is stuck in the tail and worth hedging
+    """
+    def __init__(self, window=100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * pct / 100))
+        return samples[index]
+
+
+def hedged_call(executor, fn, hedge_delay, timeout, before_hedge=None, cancel_token=None):
+    """
+    Run fn() on the executor and, if it has not finished after hedge_delay
+    seconds, start a duplicate. Returns the first successful result.
+    hedge_delay=None never sends a duplicate.
+
+    before_hedge is called before the duplicate is sent and can return False
+    (e.g. no budget left) to skip it. While waiting, cancel_token is polled
+    so a cancelled analysis stops waiting right away. Losing or abandoned
+    calls are left to finish in the background; their result is discarded.
+    """
+    started = time.monotonic()
+    pending = {executor.submit(fn)}
+    hedged = hedge_delay is None
+    error = None
+
+    while pending:
+        elapsed = time.monotonic() - started
+        if elapsed >= timeout:
+            break
+
+        wait_for = timeout - elapsed
+        if not hedged:
+            wait_for = min(wait_for, max(0.0, hedge_delay - elapsed))
+        if cancel_token is not None:
+            wait_for = min(wait_for, CANCEL_POLL_SECONDS)
+
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            _cancel_all(pending)
+            return result
+
+        if cancel_token is not None and cancel_token.is_cancelled():
+            _cancel_all(pending)
+            cancel_token.check()
+
+        if not hedged and pending and time.monotonic() - started >= hedge_delay:
+            hedged = True
+            if before_hedge is None or before_hedge():
+                pending.add(executor.submit(fn))
+
+    _cancel_all(pending)
+    if error is not None:
+        raise error
+    raise TimeoutError(f"Upstream call did not finish within {timeout:.1f}s")
+
+
+def _cancel_all(futures):
+    # Only drops calls that have not started yet, running ones finish on their own
+    for future in futures:
+        future.cancel()
@@ -0,0 +1,208 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, request
+from werkzeug.http import http_date, parse_date
+
+from serializers import dumps
+
+# Don't bother compressing tiny bodies
+MIN_COMPRESS_BYTES = 1024
+
+# Recently compressed bodies by (body hash, encoding), so repeat requests for
+# the same content (e.g. /api/sets) don't pay for compression again.
+# Keyed by the body itself, not the ETag: an etag_source ETag stays the same
+# while fields it leaves out change
+_compressed_cache = OrderedDict()
+_compressed_cache_size = 32
+_compressed_lock = threading.Lock()
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def parse_fields(fields_arg):
+    """
+    Parse a fields=a,b,c query parameter, None means all fields
+    """
+    if not fields_arg:
+        return None
+    fields = [field.strip() for field in fields_arg.split(',') if field.strip()]
+    return fields or None
+
+
+def project(rows, fields):
+    """
+    Keep only the requested fields of each row
+    """
+    if not fields:
+        return rows
+    return [{field: row[field] for field in fields if field in row} for row in rows]
+
+
+def compute_etag(data):
+    """
+    Strong ETag from a content hash of the body bytes
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        # Ignore weak prefix and our per-encoding suffix
+        candidate = candidate.removeprefix('W/').strip('"')
+        if candidate.split('-')[0] == etag:
+            return True
+    return False
+
+
+def _not_modified(etag, last_modified):
+    """
+    Conditional request check, If-None-Match wins over If-Modified-Since
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return _etag_matches(if_none_match, etag)
+
+    if last_modified is not None:
+        since = parse_date(request.headers.get('If-Modified-Since'))
+        if since is not None:
+            return int(last_modified.timestamp()) <= int(since.timestamp())
+
+    return False
+
+
+def _negotiate_encoding():
+    accepted = ['gzip']
+    if _brotli() is not None:
+        accepted.insert(0, 'br')
+    return request.accept_encodings.best_match(accepted)
+
+
+def _compress(body, body_hash, encoding):
+    key = (body_hash, encoding)
+    with _compressed_lock:
+        if key in _compressed_cache:
+            _compressed_cache.move_to_end(key)
+            return _compressed_cache[key]
+
+    if encoding == 'br':
+        compressed = _brotli().compress(body, quality=5)
+    else:
+        compressed = gzip.compress(body, compresslevel=6)
+
+    with _compressed_lock:
+        _compressed_cache[key] = compressed
+        while len(_compressed_cache) > _compressed_cache_size:
+            _compressed_cache.popitem(last=False)
+    return compressed
+
+
+def cache_control(max_age, private=False):
+    scope = 'private' if private else 'public'
+    if max_age <= 0:
+        return f"{scope}, no-cache"
+    return f"{scope}, max-age={int(max_age)}"
+
+
+def cached_json_response(payload, max_age=0, private=False, last_modified=None, etag_source=None):
+    """
+    JSON response with a content-hash ETag, Cache-Control, Last-Modified,
+    304 handling for conditional requests and gzip/brotli compression.
+
+    etag_source: optional object to hash instead of the whole payload,
+    for payloads with volatile fields (timestamps) that should not change the ETag
+    """
+    body = dumps(payload, sort_keys=True)
+    body_hash = compute_etag(body)
+    if etag_source is None:
+        etag = body_hash
+    else:
+        etag = compute_etag(dumps(etag_source, sort_keys=True))
+
+    if isinstance(last_modified, (int, float)):
+        last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+
+    headers = {
+        'Cache-Control': cache_control(max_age, private),
+        'Vary': 'Accept-Encoding'
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+
+    if _not_modified(etag, last_modified):
+        headers['ETag'] = f'"{etag}"'
+        return Response(status=304, headers=headers)
+
+    encoding = _negotiate_encoding() if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = _compress(body, body_hash, encoding)
+        headers['Content-Encoding'] = encoding
+        # Every encoding is a different representation, so it gets its own ETag
+        headers['ETag'] = f'"{etag}-{encoding}"'
+    else:
+        headers['ETag'] = f'"{etag}"'
+
+    return Response(body, status=200, headers=headers, mimetype='application/json')
+
+
+def _iter_view(view, chunk_size=64 * 1024):
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
+def precomputed_response(get_body, etag, max_age=0, private=False, last_modified=None):
+    """
+    Like cached_json_response, for bodies that are already serialized (and
+    compressed), e.g. slices of a memory-mapped snapshot.
+    get_body(encoding) returns the body for 'identity', 'gzip' or 'br',
+    or None if that encoding is not available.
+    The body is streamed out in chunks and never copied as a whole.
+    """
+    if isinstance(last_modified, (int, float)):
+        last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+
+    headers = {
+        'Cache-Control': cache_control(max_age, private),
+        'Vary': 'Accept-Encoding'
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+
+    if _not_modified(etag, last_modified):
+        headers['ETag'] = f'"{etag}"'
+        return Response(status=304, headers=headers)
+
+    body = None
+    encoding = _negotiate_encoding()
+    if encoding:
+        body = get_body(encoding)
+    if body is None and encoding != 'gzip' and request.accept_encodings['gzip']:
+        encoding = 'gzip'
+        body = get_body(encoding)
+    if body is None:
+        encoding = None
+        body = get_body('identity')
+
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        headers['ETag'] = f'"{etag}-{encoding}"'
+    else:
+        headers['ETag'] = f'"{etag}"'
+    headers['Content-Length'] = str(len(body))
+
+    return Response(_iter_view(body), status=200, headers=headers,
+                    mimetype='application/json', direct_passthrough=True)
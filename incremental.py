@@ -0,0 +1,210 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+# Categories of get_specific_products() lists, in analysis order
+CATEGORIES = (('etb', 'Elite Trainer Box'), ('booster_boxes', 'Booster Box'))
+
+
+def card_key(card):
+    return str(card.get('id') or card.get('slug') or card.get('name', ''))
+
+
+def product_key(product):
+    return str(product.get('id') or product.get('slug') or product.get('name', ''))
+
+
+def product_price(product):
+    return product.get('prices', {}).get('cardmarket', {}).get('lowest')
+
+
+class ROIGraph:
+    """
+    Dependency graph between card prices, set valuations and product ROIs:
+
+      card price -> set valuation -> ROI of every product of the set
+      product price -> ROI of that product
+
+    update_set() takes freshly fetched prices and only marks what they
+    invalidate, recompute() rescores just those products and reports the
+    products whose ROI or rank changed as events (kept in a bounded log
+    that clients read with events_since()).
+    Safe to share between threads.
+    """
+    def __init__(self, calculator, history=1000):
+        self.calculator = calculator
+        self._sets = {}        # set name -> {'cards': {key: card}, 'valuation': ..., 'products': set of keys}
+        self._products = {}    # product key -> {'set': name, 'data': product, 'category': ..., 'result': ...}
+        self._dirty_sets = set()
+        self._dirty_products = set()
+        self._ranks = {}
+        self._events = deque(maxlen=history)
+        self._sequence = itertools.count(1)
+        self.last_sequence = 0
+        self.products_rescored = 0
+        self.products_skipped = 0
+        self._lock = threading.Lock()
+
+    def update_set(self, set_name, products_data, top_cards):
+        """
+        Feed the current products ({'etb': [...], 'booster_boxes': [...]})
+        and top cards of a set. Returns the number of products marked for rescoring.
+        """
+        with self._lock:
+            node = self._sets.setdefault(set_name, {'cards': {}, 'valuation': None, 'products': set()})
+
+            cards = {card_key(card): card for card in top_cards}
+            old_prices = {key: self.calculator.extract_card_price(card) for key, card in node['cards'].items()}
+            new_prices = {key: self.calculator.extract_card_price(card) for key, card in cards.items()}
+            node['cards'] = cards
+            if new_prices != old_prices:
+                self._dirty_sets.add(set_name)
+
+            seen = set()
+            marked = 0
+            for list_key, category in CATEGORIES:
+                for product in products_data.get(list_key, []):
+                    key = product_key(product)
+                    seen.add(key)
+                    entry = self._products.get(key)
+                    if entry is None or entry['set'] != set_name or product_price(product) != product_price(entry['data']):
+                        self._products[key] = {'set': set_name, 'data': product, 'category': category,
+                                               'result': entry['result'] if entry else None}
+                        self._dirty_products.add(key)
+                        marked += 1
+                    else:
+                        entry['data'] = product
+
+            # Products that are no longer listed
+            for key in node['products'] - seen:
+                if self._products.get(key, {}).get('set') == set_name:
+                    self._dirty_products.add(key)
+                    self._products[key]['data'] = None
+                    marked += 1
+            node['products'] = seen
+            return marked
+
+    def recompute(self):
+        """
+        Rescore what update_set() invalidated, returns the new events
+        """
+        with self._lock:
+            for set_name in self._dirty_sets:
+                node = self._sets[set_name]
+                valuation = self._valuation(node['cards'].values())
+                if valuation != node['valuation']:
+                    node['valuation'] = valuation
+                    self._dirty_products.update(node['products'])
+            self._dirty_sets.clear()
+
+            changed = {}
+            self.products_skipped += len(set(self._products) - self._dirty_products)
+            for key in self._dirty_products:
+                entry = self._products.get(key)
+                if entry is None:
+                    continue
+                old = entry['result']
+                if entry['data'] is None:
+                    del self._products[key]
+                    new = None
+                else:
+                    new = self.calculator.analyze_product(entry['data'], list(self._sets[entry['set']]['cards'].values()))
+                    if new is not None:
+                        new['category'] = entry['category']
+                    entry['result'] = new
+                    self.products_rescored += 1
+                if (old or {}).get('roi_percentage') != (new or {}).get('roi_percentage'):
+                    changed[key] = (old, new)
+            self._dirty_products.clear()
+
+            old_ranks = self._ranks
+            self._ranks = {key: rank for rank, key in enumerate(self._ranked_keys(), 1)}
+
+            events = []
+            for key in set(changed) | set(old_ranks) | set(self._ranks):
+                old_rank, new_rank = old_ranks.get(key), self._ranks.get(key)
+                if key not in changed and old_rank == new_rank:
+                    continue
+                if key in changed:
+                    old, new = changed[key]
+                else:
+                    old = new = self._products[key]['result']
+                result = new or old
+                events.append({
+                    'product_key': key,
+                    'product_name': result['product_name'],
+                    'set_name': result['set_name'],
+                    'type': 'added' if old_rank is None else 'removed' if new_rank is None else 'changed',
+                    'old_rank': old_rank,
+                    'rank': new_rank,
+                    'old_roi_percentage': old['roi_percentage'] if old else None,
+                    'roi_percentage': new['roi_percentage'] if new else None
+                })
+
+            # Best ranks first, removed products last
+            events.sort(key=lambda event: (event['rank'] is None, event['rank'] or 0))
+            now = time.time()
+            for event in events:
+                event['sequence'] = next(self._sequence)
+                event['at'] = now
+                self._events.append(event)
+            if events:
+                self.last_sequence = events[-1]['sequence']
+            return events
+
+    def _valuation(self, cards):
+        """
+        What the estimated pull value of the set's products depends on:
+        the average of the valid card prices
+        """
+        prices = [price for price in (self.calculator.extract_card_price(card) for card in cards) if price > 0]
+        return round(sum(prices) / len(prices), 6) if prices else 0
+
+    def _ranked_keys(self):
+        scored = [(entry['result']['roi_percentage'], key) for key, entry in self._products.items() if entry['result']]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [key for _, key in scored]
+
+    def has_set(self, set_name):
+        with self._lock:
+            return set_name in self._sets
+
+    def set_results(self, set_name):
+        """
+        Current analysis of the products of one set
+        """
+        with self._lock:
+            node = self._sets.get(set_name)
+            if node is None:
+                return []
+            return [dict(self._products[key]['result']) for key in node['products']
+                    if key in self._products and self._products[key]['result']]
+
+    def results(self):
+        """
+        Current analysis of every product, highest ROI first
+        """
+        with self._lock:
+            return [dict(self._products[key]['result']) for key in self._ranked_keys()]
+
+    def events_since(self, sequence=0):
+        """
+        Events after the given sequence number, oldest first. Returns
+        (events, complete), complete is False when older events have
+        already been dropped from the log and the client should reload everything.
+        """
+        with self._lock:
+            events = [event for event in self._events if event['sequence'] > sequence]
+            complete = not self._events or self._events[0]['sequence'] <= sequence + 1 or sequence >= self.last_sequence
+            return events, complete
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sets': len(self._sets),
+                'products': len(self._products),
+                'products_rescored': self.products_rescored,
+                'products_skipped': self.products_skipped,
+                'last_event': self.last_sequence
+            }
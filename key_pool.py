@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import date
+
+from upstream_health import CircuitOpenError
+
+# Statuses that mean "this key can't be used right now"
+RATE_LIMITED = 429
+KEY_REJECTED = 403
+
+
+class NoKeyAvailable(CircuitOpenError):
+    """
+    Every API key is rate limited or rejected at the moment
+    """
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.args = (f"All API keys are rate limited, retry in {retry_after:.0f}s",)
+
+
+class ApiKeyPool:
+    """
+    Pool of RapidAPI keys. Each call goes to the key with the most
+    headroom left: the remaining quota RapidAPI reports in its
+    X-RateLimit-Requests-Remaining header, or the configured daily limit
+    minus our own count, with ties going to the least busy key.
+    A key that answers 429 is benched for its Retry-After (or
+    rate_limit_cooldown), one that answers 403 for rejected_cooldown.
+    """
+    def __init__(self, keys, host, daily_limit=0, rate_limit_cooldown=60, rejected_cooldown=3600):
+        self.host = host
+        self.daily_limit = daily_limit if daily_limit and daily_limit > 0 else None
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.rejected_cooldown = rejected_cooldown
+        self._lock = threading.Lock()
+        self._keys = []
+        for key in dict.fromkeys(k for k in keys if k):
+            self._keys.append({
+                'key': key,
+                'label': f"...{key[-4:]}",
+                'calls': 0,
+                'in_flight': 0,
+                'used_today': 0,
+                'day': date.today(),
+                'remaining': None,
+                'limit': None,
+                'benched_until': 0,
+                'rate_limited': 0,
+                'rejected': 0,
+                'last_used': 0
+            })
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _headroom(self, state):
+        if state['remaining'] is not None:
+            return state['remaining']
+        if self.daily_limit is not None:
+            return self.daily_limit - state['used_today']
+        return float('inf')
+
+    def available(self):
+        """
+        Number of keys in rotation right now
+        """
+        now = time.time()
+        with self._lock:
+            return sum(1 for state in self._keys if state['benched_until'] <= now)
+
+    def acquire(self):
+        """
+        Pick the key with the most headroom and count a call on it.
+        Raises NoKeyAvailable when every key is benched.
+        """
+        now = time.time()
+        with self._lock:
+            if not self._keys:
+                return None
+            candidates = [state for state in self._keys if state['benched_until'] <= now]
+            if not candidates:
+                retry_after = min(state['benched_until'] for state in self._keys) - now
+                raise NoKeyAvailable(max(retry_after, 0))
+
+            state = min(candidates, key=lambda s: (-self._headroom(s), s['in_flight'], s['last_used']))
+            if state['day'] != date.today():
+                state['day'] = date.today()
+                state['used_today'] = 0
+            state['calls'] += 1
+            state['used_today'] += 1
+            state['in_flight'] += 1
+            state['last_used'] = now
+            if state['remaining'] is not None:
+                state['remaining'] -= 1
+            return state
+
+    def headers(self, state):
+        if state is None:
+            return {"X-RapidAPI-Key": None, "X-RapidAPI-Host": self.host}
+        return {"X-RapidAPI-Key": state['key'], "X-RapidAPI-Host": self.host}
+
+    def release(self, state, response=None):
+        """
+        Update the key's state from the response (None if the call failed)
+        """
+        if state is None:
+            return
+        with self._lock:
+            state['in_flight'] -= 1
+            if response is None:
+                return
+
+            remaining = response.headers.get('X-RateLimit-Requests-Remaining')
+            if remaining is not None and remaining.isdigit():
+                state['remaining'] = int(remaining)
+            limit = response.headers.get('X-RateLimit-Requests-Limit')
+            if limit is not None and limit.isdigit():
+                state['limit'] = int(limit)
+
+            if response.status_code == RATE_LIMITED:
+                state['rate_limited'] += 1
+                retry_after = response.headers.get('Retry-After', '')
+                cooldown = float(retry_after) if retry_after.isdigit() else self.rate_limit_cooldown
+                state['benched_until'] = time.time() + cooldown
+                print(f"🔑 API key {state['label']} rate limited, out of rotation for {cooldown:.0f}s")
+            elif response.status_code == KEY_REJECTED:
+                state['rejected'] += 1
+                state['benched_until'] = time.time() + self.rejected_cooldown
+                print(f"🔑 API key {state['label']} rejected (403), out of rotation for {self.rejected_cooldown:.0f}s")
+
+    def snapshot(self):
+        """
+        Per-key usage for metrics (keys are shown by their last 4 characters)
+        """
+        now = time.time()
+        with self._lock:
+            return [{
+                'key': state['label'],
+                'in_rotation': state['benched_until'] <= now,
+                'benched_for_seconds': round(max(0, state['benched_until'] - now), 1),
+                'calls': state['calls'],
+                'in_flight': state['in_flight'],
+                'used_today': state['used_today'],
+                'quota_remaining': state['remaining'],
+                'quota_limit': state['limit'],
+                'rate_limited': state['rate_limited'],
+                'rejected': state['rejected']
+            } for state in self._keys]
@@ -0,0 +1,22 @@
+import importlib.util
+import sys
+
+
+def lazy_module(name):
+    """
+    Module object that is only really imported on first attribute access.
+    Lets a worker boot without paying for modules that the first
+    requests may not need (e.g. requests, only used for upstream calls).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,7 +1,24 @@
-from data_collector import PokemonDataCollector
+from data_collector import PokemonDataCollector, ABORT_ERRORS
 from roi_calculator import ROICalculator
+from analysis import analyze_set
+from price_history import PriceHistory
+from quota import CallBudget
+from serializers import dumps, load_snapshot
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import redirect_stdout
+from datetime import datetime
+import argparse
+import csv
+import sys
 import time
 
+# Columns of the batch output (CSV header order)
+BATCH_COLUMNS = [
+    'set_name', 'series', 'product_name', 'product_type', 'category', 'packs_per_box',
+    'current_price', 'estimated_pull_value', 'roi_percentage', 'risk_score',
+    'release_date', 'image_url', 'tcggo_url'
+]
+
 def main():
     print("🎯 Pokemon TCG Investment Analyzer")
     print("=" * 50)
@@ -66,6 +83,8 @@ def main():
         # Small delay to be nice to the API
         time.sleep(1)
     
+    collector.quota.flush()
+    
     if not all_results:
         print("❌ No results found. Check your API key and connection.")
         return
@@ -75,6 +94,7 @@ def main():
     
     # Save results to file
     collector.save_data_to_file(all_results, "pokemon_investment_analysis")
+    price_history(collector).record_products(all_results)
     
     # Display top opportunities
     print("\n" + "=" * 80)
@@ -148,5 +168,194 @@ def main():
         for i, inv in enumerate(safe_investments[:3], 1):
             print(f"   {i}. {inv['product_name']} - ROI: {inv['roi_percentage']}%, Risk: {inv['risk_score']}/5")
 
+def price_history(collector):
+    return PriceHistory(collector.config.PRICE_HISTORY_DIR, collector.config.PRICE_HISTORY_COMPACT_AFTER_DAYS)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze Pokemon TCG sets. Without arguments the built-in list of sets "
+                    "is analyzed and reported; with sets, --file or --all it runs as a batch "
+                    "that streams every product result as it is found."
+    )
+    parser.add_argument('sets', nargs='*', help="set names or episode ids")
+    parser.add_argument('--file', help="file with one set name or episode id per line ('-' for stdin)")
+    parser.add_argument('--all', action='store_true', help="every set in pokemon_episode_ids.json")
+    parser.add_argument('--workers', type=int, default=4, help="sets analyzed at the same time (default 4)")
+    parser.add_argument('--budget', type=int, default=0, help="maximum upstream API calls for the run (0 = unlimited)")
+    parser.add_argument('--format', choices=['ndjson', 'csv'], help="output format (default: from --output, else ndjson)")
+    parser.add_argument('--output', help="output file, '-' for stdout (default: timestamped file)")
+    return parser.parse_args(argv)
+
+def load_catalog():
+    """
+    Episode id -> name from the saved catalog
+    """
+    try:
+        return {str(episode['id']): episode['name'] for episode in load_snapshot("pokemon_episode_ids.json")}
+    except (FileNotFoundError, ValueError) as e:
+        print(f"⚠️ Could not load pokemon_episode_ids.json: {e}", file=sys.stderr)
+        return {}
+
+def iter_set_names(args, catalog):
+    """
+    Set names to analyze, one at a time (files are read lazily)
+    """
+    def resolve(entry):
+        entry = entry.strip()
+        if not entry or entry.startswith('#'):
+            return None
+        if entry.isdigit():
+            name = catalog.get(entry)
+            if name is None:
+                print(f"⚠️ Unknown episode id {entry}, skipped", file=sys.stderr)
+            return name.lower() if name else None
+        return entry.lower()
+    
+    for entry in args.sets:
+        name = resolve(entry)
+        if name:
+            yield name
+    
+    if args.file:
+        f = sys.stdin if args.file == '-' else open(args.file, 'r', encoding='utf-8')
+        try:
+            for line in f:
+                name = resolve(line)
+                if name:
+                    yield name
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    
+    if args.all:
+        for name in catalog.values():
+            yield name.lower()
+
+class ResultWriter:
+    """
+    Writes product results as NDJSON or CSV as soon as they are known
+    """
+    def __init__(self, output, fmt, stdout=None):
+        self.fmt = fmt
+        self.count = 0
+        if output == '-':
+            stdout = stdout or sys.stdout
+            self.stream = stdout.buffer if fmt == 'ndjson' else stdout
+            self.owned = False
+        else:
+            self.stream = open(output, 'wb') if fmt == 'ndjson' else open(output, 'w', newline='', encoding='utf-8')
+            self.owned = True
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(self.stream, fieldnames=BATCH_COLUMNS, extrasaction='ignore')
+            self.csv.writeheader()
+    
+    def write(self, results):
+        for result in results:
+            if self.fmt == 'ndjson':
+                self.stream.write(dumps(result) + b'\n')
+            else:
+                self.csv.writerow(result)
+        self.count += len(results)
+        self.stream.flush()
+    
+    def close(self):
+        if self.owned:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+def run_batch(args):
+    """
+    Analyze many sets concurrently and stream the results.
+    At most 2 x workers sets are in flight, results are written and
+    dropped as each set finishes, so memory stays flat for any run size.
+    """
+    fmt = args.format or ('csv' if args.output and args.output.endswith('.csv') else 'ndjson')
+    output = args.output or f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_pokemon_investment_analysis.{fmt}"
+    real_stdout = sys.stdout
+    
+    # Progress messages go to stderr, stdout may be carrying the results
+    with redirect_stdout(sys.stderr):
+        collector = PokemonDataCollector()
+        calculator = ROICalculator()
+        budget = CallBudget(args.budget)
+        started = time.time()
+        
+        if not collector.test_api_connection():
+            print("❌ Cannot connect to API. Please check your .env file and API key.")
+            return 1
+        
+        writer = ResultWriter(output, fmt, stdout=real_stdout)
+        # Recorded per finished set, so results are not held until the run ends
+        history = price_history(collector)
+        
+        def analyze(set_name):
+            with collector.analysis_scope(budget=budget):
+                return analyze_set(collector, calculator, set_name)
+        
+        sets = iter_set_names(args, load_catalog())
+        workers = max(1, args.workers)
+        failed_sets = []
+        skipped_sets = []
+        stop_reason = None
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+                pending = {}
+                for set_name in sets:
+                    if stop_reason is not None:
+                        skipped_sets.append(set_name)
+                        continue
+                    pending[executor.submit(analyze, set_name)] = set_name
+                    
+                    # Keep a bounded number of sets in flight
+                    while len(pending) >= workers * 2:
+                        stop_reason = collect(wait(pending, return_when=FIRST_COMPLETED)[0], pending, writer,
+                                              failed_sets, skipped_sets, history) or stop_reason
+                
+                while pending:
+                    stop_reason = collect(wait(pending, return_when=FIRST_COMPLETED)[0], pending, writer,
+                                          failed_sets, skipped_sets, history) or stop_reason
+        finally:
+            writer.close()
+            collector.quota.flush()
+        
+        print(f"\n🏁 Batch finished in {time.time() - started:.1f}s: {writer.count} products written to {output}")
+        print(f"   API calls: {budget.used}" + (f" of {budget.limit}" if budget.limit else ""))
+        if failed_sets:
+            print(f"   ❌ Failed sets: {', '.join(failed_sets)}")
+        if skipped_sets:
+            print(f"   ⏭️ Skipped ({stop_reason}): {len(skipped_sets)} sets")
+    return 0
+
+def collect(finished, pending, writer, failed_sets, skipped_sets, history=None):
+    """
+    Write the results of finished sets and record them in the price history.
+    Returns a stop reason when the run has to stop (budget used up,
+    upstream down), otherwise None.
+    """
+    stop_reason = None
+    for future in finished:
+        set_name = pending.pop(future)
+        try:
+            results = future.result()
+        except ABORT_ERRORS as e:
+            print(f"🛑 {set_name}: {e}")
+            skipped_sets.append(set_name)
+            stop_reason = type(e).__name__
+            continue
+        except Exception as e:
+            print(f"❌ Error analyzing '{set_name}': {e}")
+            failed_sets.append(set_name)
+            continue
+        writer.write(results)
+        if history is not None:
+            history.record_products(results)
+        print(f"✅ {set_name}: {len(results)} products")
+    return stop_reason
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.sets or args.file or args.all:
+        sys.exit(run_batch(args))
     main()
\ No newline at end of file
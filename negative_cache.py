@@ -0,0 +1,51 @@
+import hashlib
+import os
+import threading
+
+# The episode catalog, when it changes every remembered empty result is forgotten
+CATALOG_FILE = "pokemon_episode_ids.json"
+
+# Request parameters that name what is looked up (a search term or an episode)
+LOOKUP_PARAMS = ('search', 'episode', 'episode_id')
+
+_generation = {'signature': None, 'value': 'none'}
+_generation_lock = threading.Lock()
+
+
+def catalog_generation(path=CATALOG_FILE):
+    """
+    Content hash of the episode catalog (recomputed only when the file changes)
+    """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        signature = None
+
+    with _generation_lock:
+        if signature != _generation['signature']:
+            value = 'none'
+            if signature is not None:
+                try:
+                    with open(path, 'rb') as f:
+                        value = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+                except OSError:
+                    pass
+            _generation.update(signature=signature, value=value)
+        return _generation['value']
+
+
+def negative_key(endpoint, params):
+    """
+    Cache key for "this lookup has no results", or None for requests that
+    are not a lookup. Only meant for a lookup's first page (an empty later
+    page just means the end), the caller knows which page that is.
+    Independent of page size and sort order, so every variant of the same
+    search shares one entry. Keys include the catalog generation.
+    """
+    for name in LOOKUP_PARAMS:
+        value = params.get(name)
+        if value is not None and str(value).strip():
+            term = ' '.join(str(value).lower().split())
+            return f"negative:{catalog_generation()}:{endpoint}:{name}={term}"
+    return None
@@ -0,0 +1,511 @@
+import argparse
+import bisect
+import glob
+import heapq
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from serializers import load_snapshot, write_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: compactions are not locked against each other
+    fcntl = None
+
+MAGIC = b'PTCGHST1'
+_PREFIX = struct.Struct('<8sQ')  # magic, header length
+
+# One row per observed price: when, what (dictionary code of the key) and the values
+COLUMNS = (('at', 'd'), ('key', 'I'), ('price', 'd'), ('roi', 'd'), ('risk', 'd'))
+
+DUMP_PATTERN = "*_pokemon_investment_analysis.json*"
+IMPORTED_FILE = "imported.json"
+
+_NAN = float('nan')
+
+# A partition compacted while it is read is listed again, this many times at most
+LISTING_ATTEMPTS = 5
+
+
+def _number(value):
+    return _NAN if value is None else float(value)
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _slug(url):
+    """
+    'https://www.tcggo.com/pokemon/destined-rivals/destined-rivals-etb' -> 'destined-rivals/destined-rivals-etb'
+    """
+    parts = [part for part in (url or '').split('/') if part]
+    return '/'.join(parts[-2:]) if len(parts) >= 2 else None
+
+
+def product_key(row):
+    """
+    Stable key of an analyzed product, also for dumps written before
+    results carried a product id: the product's page on tcggo
+    """
+    slug = _slug(row.get('tcggo_url')) or row.get('slug') or row.get('product_id')
+    if not slug:
+        slug = f"{row.get('set_name', '')}/{row.get('product_name', '')}".lower()
+    return f"product:{slug}"
+
+
+def card_key(card):
+    return f"card:{_slug(card.get('tcggo_url')) or card.get('slug') or card.get('id')}"
+
+
+def _day(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def write_columns(path, rows, labels, sources=(), sort=False):
+    """
+    Write rows [(at, key, price, roi, risk)] as one columnar file:
+
+      magic | header length | header JSON | one typed array per column
+
+    Keys are dictionary coded (codes follow the sorted key list in the
+    header). With sort=True the rows are ordered by (key, time), so the
+    rows of one key can be found by binary search.
+    """
+    keys = sorted({row[1] for row in rows})
+    codes = {key: i for i, key in enumerate(keys)}
+    rows = [(row[0], codes[row[1]], row[2], row[3], row[4]) for row in rows]
+    if sort:
+        rows.sort(key=lambda row: (row[1], row[0]))
+
+    sections = []
+    for i, (name, typecode) in enumerate(COLUMNS):
+        sections.append(array(typecode, (row[i] for row in rows)).tobytes())
+
+    layout = {}
+    position = 0
+    for (name, typecode), data in zip(COLUMNS, sections):
+        position = _align(position)
+        layout[name] = [position, len(data), typecode]
+        position += len(data)
+
+    header = json.dumps({
+        'count': len(rows),
+        'sorted': sort,
+        'keys': keys,
+        'labels': {key: labels.get(key) for key in keys},
+        'columns': layout,
+        'sources': list(sources)
+    }, separators=(',', ':')).encode('utf-8')
+
+    data_start = _align(_PREFIX.size + len(header))
+    out = bytearray(data_start + position)
+    _PREFIX.pack_into(out, 0, MAGIC, len(header))
+    out[_PREFIX.size:_PREFIX.size + len(header)] = header
+    for name, data in zip((name for name, typecode in COLUMNS), sections):
+        offset = data_start + layout[name][0]
+        out[offset:offset + len(data)] = data
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(out)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ColumnFile:
+    """
+    A columnar file read into memory, columns are typed memoryviews
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        view = memoryview(data)
+        magic, header_length = _PREFIX.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a price history file")
+        self.header = json.loads(bytes(view[_PREFIX.size:_PREFIX.size + header_length]))
+        data_start = _align(_PREFIX.size + header_length)
+        self.count = self.header['count']
+        self.keys = self.header['keys']
+        self.labels = self.header['labels']
+        self.columns = {}
+        for name, (offset, length, typecode) in self.header['columns'].items():
+            start = data_start + offset
+            self.columns[name] = view[start:start + length].cast(typecode)
+
+    def rows_of(self, key):
+        """
+        Row numbers of one key
+        """
+        code = bisect.bisect_left(self.keys, key)
+        if code >= len(self.keys) or self.keys[code] != key:
+            return range(0)
+        codes = self.columns['key']
+        if self.header['sorted']:
+            return range(bisect.bisect_left(codes, code), bisect.bisect_right(codes, code))
+        return [i for i in range(self.count) if codes[i] == code]
+
+
+class PriceHistory:
+    """
+    Append-only time series of card and product prices.
+
+    price_history/<YYYY-MM-DD>/ holds the rows observed on that day (UTC).
+    Every append writes a new segment file, so appends from several
+    processes never touch the same file. Once a day is over its segments
+    are compacted into one part file sorted by key; queries only open the
+    partitions of the requested time range.
+    """
+    def __init__(self, directory, compact_after_days=1):
+        self.directory = directory
+        self.compact_after_days = compact_after_days
+        self._compacted_day = None
+        os.makedirs(directory, exist_ok=True)
+
+    # Writing -----------------------------------------------------------
+
+    def append(self, rows, labels):
+        """
+        Add rows [(at, key, price, roi, risk)], labels: key -> [name, set name]
+        Returns the number of rows written.
+        """
+        by_day = {}
+        for row in rows:
+            if row[2] and row[2] > 0:
+                by_day.setdefault(_day(row[0]), []).append(row)
+
+        for day, day_rows in by_day.items():
+            partition = os.path.join(self.directory, day)
+            os.makedirs(partition, exist_ok=True)
+            name = f"seg-{time.time_ns()}-{os.getpid()}.col"
+            write_columns(os.path.join(partition, name), day_rows, labels)
+
+        # Old partitions are compacted once a day, by the first append of the day
+        today = _day(time.time())
+        if self._compacted_day != today:
+            self.compact_old()
+            self._compacted_day = today
+        return sum(len(day_rows) for day_rows in by_day.values())
+
+    def record_products(self, results, at=None):
+        """
+        Prices, ROI and risk of analyzed products
+        (a product found by several set searches is recorded once)
+        """
+        at = at or time.time()
+        rows = {}
+        labels = {}
+        for result in results:
+            key = product_key(result)
+            rows[key] = (at, key, float(result.get('current_price') or 0),
+                         _number(result.get('roi_percentage')), _number(result.get('risk_score')))
+            labels[key] = [result.get('product_name'), result.get('set_name')]
+        return self.append(list(rows.values()), labels)
+
+    def record_cards(self, priced_cards, at=None):
+        """
+        Card prices, priced_cards: [(price, card)]
+        """
+        at = at or time.time()
+        rows = {}
+        labels = {}
+        for price, card in priced_cards:
+            key = card_key(card)
+            rows[key] = (at, key, float(price), _NAN, _NAN)
+            labels[key] = [card.get('name'), (card.get('episode') or {}).get('name')]
+        return self.append(list(rows.values()), labels)
+
+    # Compaction --------------------------------------------------------
+
+    def compact_old(self):
+        """
+        Compact every partition that is at least compact_after_days old
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.compact_after_days)).strftime('%Y-%m-%d')
+        compacted = 0
+        for day in self._days():
+            if day < cutoff and any(name.startswith('seg-') for name in os.listdir(os.path.join(self.directory, day))):
+                compacted += self.compact(day)
+        return compacted
+
+    def compact(self, day):
+        """
+        Merge a partition's segments (and its part file) into a new part file.
+        Readers switch to the new part atomically, merged files are removed after.
+        """
+        partition = os.path.join(self.directory, day)
+        with open(os.path.join(partition, '.lock'), 'a') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return 0  # someone else is compacting it
+
+            part, segments = self._listing(partition)
+            if not segments:
+                return 0
+            sources = ([part] if part else []) + segments
+
+            rows = []
+            labels = {}
+            for name in sources:
+                column_file = ColumnFile(os.path.join(partition, name))
+                columns = [column_file.columns[column] for column, typecode in COLUMNS]
+                for i in range(column_file.count):
+                    key = column_file.keys[columns[1][i]]
+                    rows.append((columns[0][i], key, columns[2][i], columns[3][i], columns[4][i]))
+                for key, label in column_file.labels.items():
+                    if label:
+                        labels[key] = label
+
+            generation = int(part.split('-')[1].split('.')[0]) + 1 if part else 1
+            write_columns(os.path.join(partition, f"part-{generation:06d}.col"), rows, labels,
+                          sources=sources, sort=True)
+            for name in sources:
+                try:
+                    os.remove(os.path.join(partition, name))
+                except FileNotFoundError:
+                    pass
+            print(f"🗜️ Compacted price history {day}: {len(sources)} files, {len(rows)} rows")
+            return 1
+
+    # Reading -----------------------------------------------------------
+
+    def _days(self, start=None, end=None):
+        days = sorted(name for name in os.listdir(self.directory)
+                      if len(name) == 10 and os.path.isdir(os.path.join(self.directory, name)))
+        return [day for day in days if (start is None or day >= start) and (end is None or day <= end)]
+
+    def _listing(self, partition):
+        """
+        (newest part file or None, segments not merged into it)
+        """
+        names = os.listdir(partition)
+        parts = sorted(name for name in names if name.startswith('part-') and name.endswith('.col'))
+        segments = sorted(name for name in names if name.startswith('seg-') and name.endswith('.col'))
+        part = parts[-1] if parts else None
+        if part:
+            merged = set(ColumnFile(os.path.join(partition, part)).header['sources'])
+            segments = [name for name in segments if name not in merged]
+        return part, segments
+
+    def _files(self, start=None, end=None):
+        """
+        Column files of the partitions between two timestamps
+        """
+        start_day = _day(start) if start is not None else None
+        end_day = _day(end) if end is not None else None
+        for day in self._days(start_day, end_day):
+            partition = os.path.join(self.directory, day)
+            for attempt in range(LISTING_ATTEMPTS):
+                try:
+                    part, segments = self._listing(partition)
+                    files = [ColumnFile(os.path.join(partition, name)) for name in ([part] if part else []) + segments]
+                    break
+                except FileNotFoundError as e:
+                    # Compacted while we were listing it, the new part has everything
+                    if attempt == LISTING_ATTEMPTS - 1:
+                        raise RuntimeError(f"Price history partition {day} kept changing while it was read") from e
+            yield from files
+
+    def history(self, key, start=None, end=None):
+        """
+        Observations of one product or card key, oldest first
+        """
+        if ':' not in key:
+            key = f"product:{key}"
+        points = []
+        for column_file in self._files(start, end):
+            at, price, roi, risk = (column_file.columns[name] for name in ('at', 'price', 'roi', 'risk'))
+            for i in column_file.rows_of(key):
+                if (start is None or at[i] >= start) and (end is None or at[i] <= end):
+                    points.append({
+                        'at': at[i],
+                        'price': price[i],
+                        'roi_percentage': None if roi[i] != roi[i] else roi[i],
+                        'risk_score': None if risk[i] != risk[i] else risk[i]
+                    })
+        points.sort(key=lambda point: point['at'])
+        return points
+
+    def movers(self, days=7, top=10, kind='product', now=None):
+        """
+        The keys whose price changed the most (in percent, either way)
+        between their first and last observation of the last days
+        """
+        now = now or time.time()
+        start = now - days * 86400
+        first = {}
+        last = {}
+        labels = {}
+        prefix = f"{kind}:"
+        for column_file in self._files(start, now):
+            at, codes, price = (column_file.columns[name] for name in ('at', 'key', 'price'))
+            keys = column_file.keys
+            wanted = [key.startswith(prefix) for key in keys]
+            for i in range(column_file.count):
+                code = codes[i]
+                if not wanted[code] or not start <= at[i] <= now:
+                    continue
+                key = keys[code]
+                if key not in first or at[i] < first[key][0]:
+                    first[key] = (at[i], price[i])
+                if key not in last or at[i] > last[key][0]:
+                    last[key] = (at[i], price[i])
+            labels.update(column_file.labels)
+
+        moves = []
+        for key, (first_at, first_price) in first.items():
+            last_price = last[key][1]
+            if first_price > 0 and last[key][0] > first_at:
+                change = (last_price - first_price) / first_price * 100
+                moves.append((abs(change), key, first_price, last_price, change))
+
+        return [{
+            'key': key,
+            'name': (labels.get(key) or [None, None])[0],
+            'set_name': (labels.get(key) or [None, None])[1],
+            'from_price': first_price,
+            'to_price': last_price,
+            'change': round(last_price - first_price, 2),
+            'change_percent': round(change, 2)
+        } for _, key, first_price, last_price, change in heapq.nlargest(top, moves)]
+
+    def roi_over_time(self, key=None, start=None, end=None):
+        """
+        ROI per day: of one product (its last observation of the day),
+        or the average over all products
+        """
+        if key is not None and ':' not in key:
+            key = f"product:{key}"
+        daily = {}
+        for column_file in self._files(start, end):
+            at, codes, roi = (column_file.columns[name] for name in ('at', 'key', 'roi'))
+            rows = column_file.rows_of(key) if key is not None else range(column_file.count)
+            for i in rows:
+                if roi[i] != roi[i] or (start is not None and at[i] < start) or (end is not None and at[i] > end):
+                    continue
+                # Last observation of each product per day
+                observed = daily.setdefault(_day(at[i]), {})
+                product = column_file.keys[codes[i]]
+                if product not in observed or at[i] > observed[product][0]:
+                    observed[product] = (at[i], roi[i])
+
+        return [{
+            'date': day,
+            'roi_percentage': round(sum(value for _, value in observed.values()) / len(observed), 2),
+            'products': len(observed)
+        } for day, observed in sorted(daily.items())]
+
+    # Import ------------------------------------------------------------
+
+    def import_dumps(self, paths=None):
+        """
+        One-time import of the timestamped analysis dumps
+        (<YYYYmmdd_HHMMSS>_pokemon_investment_analysis.json).
+        Files that have been imported before are skipped.
+        """
+        paths = sorted(paths or glob.glob(DUMP_PATTERN))
+        imported_path = os.path.join(self.directory, IMPORTED_FILE)
+        try:
+            imported = set(load_snapshot(imported_path))
+        except FileNotFoundError:
+            imported = set()
+
+        rows_total = 0
+        for path in paths:
+            name = os.path.basename(path)
+            if name in imported:
+                print(f"⏭️ {name} was imported before")
+                continue
+            try:
+                at = datetime.strptime(name[:15], '%Y%m%d_%H%M%S').timestamp()
+                results = load_snapshot(path)
+            except (ValueError, OSError) as e:
+                print(f"⚠️ Cannot import {name}: {e}")
+                continue
+            rows = self.record_products(results, at=at)
+            rows_total += rows
+            imported.add(name)
+            write_snapshot(sorted(imported), imported_path, fmt='compact')
+            print(f"📥 {name}: {rows} prices")
+        return rows_total
+
+
+def _parse_time(value, end_of_day=False):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').timestamp() + (86399 if end_of_day else 0)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Price history of cards and products")
+    parser.add_argument('--dir', help="price history directory (default: Config.PRICE_HISTORY_DIR)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help="import the timestamped analysis dumps (once)")
+    importer.add_argument('files', nargs='*', help=f"dump files (default: {DUMP_PATTERN})")
+
+    history = commands.add_parser('history', help="price history of a product or card")
+    history.add_argument('key', help="product:<set>/<product> or card:<set>/<card> (tcggo URL path)")
+    history.add_argument('--since', help="YYYY-MM-DD")
+    history.add_argument('--until', help="YYYY-MM-DD")
+
+    movers = commands.add_parser('movers', help="biggest price changes")
+    movers.add_argument('--days', type=int, default=7, help="time window (default 7)")
+    movers.add_argument('--top', type=int, default=10, help="number of movers (default 10)")
+    movers.add_argument('--kind', choices=['product', 'card'], default='product')
+
+    roi = commands.add_parser('roi', help="ROI per day, of one product or the average of all")
+    roi.add_argument('key', nargs='?')
+    roi.add_argument('--since', help="YYYY-MM-DD")
+    roi.add_argument('--until', help="YYYY-MM-DD")
+
+    commands.add_parser('compact', help="compact every finished day now")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.dir:
+        store = PriceHistory(args.dir)
+    else:
+        from config import Config
+        store = PriceHistory(Config.PRICE_HISTORY_DIR, Config.PRICE_HISTORY_COMPACT_AFTER_DAYS)
+
+    if args.command == 'import':
+        print(f"📥 Imported {store.import_dumps(args.files)} prices")
+
+    elif args.command == 'history':
+        points = store.history(args.key, _parse_time(args.since), _parse_time(args.until, end_of_day=True))
+        if not points:
+            print(f"❌ No history for {args.key}")
+            return 1
+        for point in points:
+            roi = f"{point['roi_percentage']:>8.1f}%" if point['roi_percentage'] is not None else ''
+            print(f"{datetime.fromtimestamp(point['at']):%Y-%m-%d %H:%M}  €{point['price']:>9.2f} {roi}")
+
+    elif args.command == 'movers':
+        for i, move in enumerate(store.movers(args.days, args.top, args.kind), 1):
+            print(f"{i:>3}. {(move['name'] or move['key'])[:45]:<47} €{move['from_price']:>8.2f} -> "
+                  f"€{move['to_price']:>8.2f}  {move['change_percent']:+.1f}%")
+
+    elif args.command == 'roi':
+        for day in store.roi_over_time(args.key, _parse_time(args.since), _parse_time(args.until, end_of_day=True)):
+            print(f"{day['date']}  {day['roi_percentage']:>8.1f}%  ({day['products']} products)")
+
+    elif args.command == 'compact':
+        print(f"🗜️ Compacted {store.compact_old()} partitions")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
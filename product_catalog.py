@@ -0,0 +1,229 @@
+import os
+import sqlite3
+import threading
+import time
+
+from serializers import dumps, load_snapshot, loads
+
+# Saved episode list, names the sets the catalog has no products of yet
+EPISODES_FILE = "pokemon_episode_ids.json"
+
+# Product classes, in the order get_specific_products() lists them
+ETB = 'etb'
+BOOSTER_BOX = 'booster_box'
+OTHER = 'other'
+
+
+def classify_product(product):
+    """
+    Product class from its name: Elite Trainer Box, Booster Box or other
+    """
+    name = (product.get('name') or '').lower()
+    if 'elite trainer box' in name or 'etb' in name:
+        return ETB
+    if 'booster box' in name and 'elite trainer' not in name:
+        return BOOSTER_BOX
+    return OTHER
+
+
+def _name_key(name):
+    return ' '.join((name or '').lower().split())
+
+
+# Episode ids of the saved episode list by name and slug, reloaded only when the file changes
+_episode_ids = {'path': None, 'mtime': None, 'names': {}, 'slugs': {}}
+_episode_ids_lock = threading.Lock()
+
+
+def _load_episode_ids(path):
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}, {}
+    with _episode_ids_lock:
+        if _episode_ids['path'] == path and _episode_ids['mtime'] == mtime:
+            return _episode_ids['names'], _episode_ids['slugs']
+        try:
+            episodes = load_snapshot(path)
+        except (OSError, ValueError):
+            return {}, {}
+        names, slugs = {}, {}
+        for episode in episodes:
+            names.setdefault(_name_key(episode.get('name')), episode.get('id'))
+            slugs.setdefault((episode.get('slug') or '').lower(), episode.get('id'))
+        _episode_ids.update(path=path, mtime=mtime, names=names, slugs=slugs)
+        return names, slugs
+
+
+def episode_id_from_file(set_name, path=EPISODES_FILE):
+    """
+    Id of the saved episode whose name or slug is exactly set_name, or None
+    """
+    key = _name_key(set_name)
+    names, slugs = _load_episode_ids(path)
+    if key in names:
+        return names[key]
+    return slugs.get(key.replace(' ', '-'))
+
+
+class ProductCatalog:
+    """
+    Local copy of the product list in SQLite, indexed by episode id and
+    product class. Every episode remembers when its products were last
+    fetched in full (a complete sync of all products, or a refresh of the
+    episode), so the products of a set are one index read, exactly the
+    products of its episode and not whatever a search for its name returns.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            " id INTEGER PRIMARY KEY, episode_id INTEGER, class TEXT NOT NULL,"
+            " data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS products_episode ON products (episode_id, class)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS episodes ("
+            " id INTEGER PRIMARY KEY, name_key TEXT NOT NULL, slug TEXT, synced_at REAL)"
+        )
+        if 'synced_at' not in [row[1] for row in conn.execute("PRAGMA table_info(episodes)")]:
+            conn.execute("ALTER TABLE episodes ADD COLUMN synced_at REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS episodes_name ON episodes (name_key)")
+        conn.execute("CREATE INDEX IF NOT EXISTS episodes_slug ON episodes (slug)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, transactions are opened explicitly
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # Writing -----------------------------------------------------------
+
+    def _write(self, products, delete=None, synced=None):
+        """
+        In one transaction: run the delete statement (sql, args), store the
+        products and their episodes, and mark episodes as synced
+        (synced=True for every episode of the products, or a list of ids).
+        Returns the number of products stored.
+        """
+        now = time.time()
+        rows, episodes = {}, {}
+        for product in products:
+            if product.get('id') is None:
+                continue
+            episode = product.get('episode') or {}
+            if episode.get('id') is not None:
+                episodes[episode['id']] = (episode['id'], _name_key(episode.get('name')), (episode.get('slug') or '').lower())
+            rows[product['id']] = (product['id'], episode.get('id'), classify_product(product), dumps(product), now)
+        if synced is True:
+            synced = list(episodes)
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if delete is not None:
+                conn.execute(*delete)
+            conn.executemany("INSERT OR REPLACE INTO products (id, episode_id, class, data, updated_at) "
+                             "VALUES (?, ?, ?, ?, ?)", list(rows.values()))
+            conn.executemany("INSERT INTO episodes (id, name_key, slug) VALUES (?, ?, ?) "
+                             "ON CONFLICT(id) DO UPDATE SET name_key = excluded.name_key, slug = excluded.slug",
+                             list(episodes.values()))
+            conn.executemany("UPDATE episodes SET synced_at = ? WHERE id = ?",
+                             [(now, episode_id) for episode_id in synced or ()])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def upsert(self, products):
+        """
+        Add or update products (and their episodes), without marking anything synced
+        """
+        return self._write(products)
+
+    def replace_episode(self, episode_id, products):
+        """
+        All products of an episode, fetched in full: products that are gone
+        upstream are removed and the episode counts as synced
+        """
+        products = [product for product in products if (product.get('episode') or {}).get('id') == episode_id]
+        return self._write(products, delete=("DELETE FROM products WHERE episode_id = ?", (episode_id,)),
+                           synced=[episode_id])
+
+    def sync(self, products, complete=True):
+        """
+        Store the full product list. Only a complete list (paging ran to the
+        end) replaces the catalog and marks it synced, a cut-short one is
+        merged in without removing or marking anything.
+        """
+        if not complete:
+            return self.upsert(products)
+        count = self._write(products, delete=("DELETE FROM products", ()), synced=True)
+        self._conn().execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_at', ?)", (time.time(),))
+        return count
+
+    # Reading -----------------------------------------------------------
+
+    def synced_at(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'synced_at'").fetchone()
+        return row[0] if row else None
+
+    def episode_id(self, set_name):
+        """
+        Id of the episode whose name or slug is exactly set_name (any case), or None
+        """
+        key = _name_key(set_name)
+        row = self._conn().execute(
+            "SELECT id FROM episodes WHERE name_key = ? OR slug = ? LIMIT 1", (key, key.replace(' ', '-'))
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, episode_id, max_age):
+        """
+        True if the episode's products were fetched in full within max_age seconds
+        """
+        row = self._conn().execute("SELECT synced_at FROM episodes WHERE id = ?", (episode_id,)).fetchone()
+        return row is not None and row[0] is not None and time.time() - row[0] <= max_age
+
+    def products(self, episode_id, product_class=None):
+        """
+        Products of an episode, optionally only those of one class
+        """
+        if product_class is None:
+            rows = self._conn().execute(
+                "SELECT data FROM products WHERE episode_id = ? ORDER BY id", (episode_id,)
+            )
+        else:
+            rows = self._conn().execute(
+                "SELECT data FROM products WHERE episode_id = ? AND class = ? ORDER BY id", (episode_id, product_class)
+            )
+        return [loads(row[0]) for row in rows]
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            'products': conn.execute("SELECT COUNT(*) FROM products").fetchone()[0],
+            'episodes': conn.execute("SELECT COUNT(*) FROM episodes").fetchone()[0],
+            'episodes_synced': conn.execute("SELECT COUNT(*) FROM episodes WHERE synced_at IS NOT NULL").fetchone()[0],
+            'synced_at': self.synced_at()
+        }
+
+
+def make_product_catalog(config):
+    """
+    Product catalog from Config, None if its database can't be opened
+    """
+    try:
+        return ProductCatalog(config.PRODUCT_CATALOG_DB)
+    except sqlite3.Error as e:
+        print(f"⚠️ Cannot open product catalog {config.PRODUCT_CATALOG_DB} ({e}), products are fetched upstream")
+        return None
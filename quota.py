@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import time
+from datetime import date
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised when an analysis has used up its upstream call budget
+    """
+    pass
+
+
+class CallBudget:
+    """
+    Upstream call budget for a single analysis run
+    limit=None means unlimited (we still count the calls)
+    """
+    def __init__(self, limit=None):
+        self.limit = limit if limit and limit > 0 else None
+        self.used = 0
+        self.by_endpoint = {}
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        if self.limit is None:
+            return None
+        return max(0, self.limit - self.used)
+
+    def charge(self, endpoint):
+        """
+        Take one call out of the budget, raise BudgetExceeded if there is none left
+        """
+        with self._lock:
+            if self.limit is not None and self.used >= self.limit:
+                self.exhausted = True
+                raise BudgetExceeded(f"Call budget of {self.limit} exhausted")
+            self.used += 1
+            self.by_endpoint[endpoint] = self.by_endpoint.get(endpoint, 0) + 1
+
+    def to_dict(self):
+        return {
+            'limit': self.limit,
+            'used': self.used,
+            'remaining': self.remaining(),
+            'exhausted': self.exhausted,
+            'by_endpoint': dict(self.by_endpoint)
+        }
+
+
+class QuotaTracker:
+    """
+    Counts upstream calls per endpoint for this process and keeps
+    a persistent per-day counter on disk (shared by all processes)
+    """
+    def __init__(self, usage_file, keep_days=30, flush_interval=10):
+        self.usage_file = usage_file
+        self.keep_days = keep_days
+        self.flush_interval = flush_interval
+        self.started_at = time.time()
+        self.totals = {}
+        self._pending = {}
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint):
+        """
+        Count one upstream call
+        """
+        with self._lock:
+            self.totals[endpoint] = self.totals.get(endpoint, 0) + 1
+            self._pending[endpoint] = self._pending.get(endpoint, 0) + 1
+            due = time.time() - self._last_flush >= self.flush_interval
+
+        if due:
+            self.flush()
+
+    def load_daily(self):
+        """
+        Load the persistent daily usage counters
+        """
+        try:
+            with open(self.usage_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def flush(self):
+        """
+        Merge the calls counted since the last flush into the daily usage file
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._last_flush = time.time()
+
+        if not pending:
+            return
+
+        try:
+            daily = self.load_daily()
+            today = date.today().isoformat()
+            day = daily.setdefault(today, {'total': 0, 'endpoints': {}})
+
+            for endpoint, count in pending.items():
+                day['total'] += count
+                day['endpoints'][endpoint] = day['endpoints'].get(endpoint, 0) + count
+
+            # Only keep the most recent days
+            for old_day in sorted(daily)[:-self.keep_days]:
+                del daily[old_day]
+
+            tmp_file = f"{self.usage_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(daily, f, indent=2)
+            os.replace(tmp_file, self.usage_file)
+
+        except Exception as e:
+            print(f"Error saving API usage: {e}")
+            # Put the counts back so they are written next time
+            with self._lock:
+                for endpoint, count in pending.items():
+                    self._pending[endpoint] = self._pending.get(endpoint, 0) + count
+
+    def snapshot(self):
+        """
+        Usage numbers for API responses and metrics
+        """
+        with self._lock:
+            process_totals = dict(self.totals)
+            pending = dict(self._pending)
+
+        today = self.load_daily().get(date.today().isoformat(), {'total': 0, 'endpoints': {}})
+        today_endpoints = dict(today['endpoints'])
+        for endpoint, count in pending.items():
+            today_endpoints[endpoint] = today_endpoints.get(endpoint, 0) + count
+
+        return {
+            'process_calls_total': sum(process_totals.values()),
+            'process_calls_by_endpoint': process_totals,
+            'process_uptime_seconds': round(time.time() - self.started_at, 1),
+            'today_calls_total': today['total'] + sum(pending.values()),
+            'today_calls_by_endpoint': today_endpoints
+        }
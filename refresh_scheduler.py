@@ -0,0 +1,337 @@
+import argparse
+import math
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from analysis import score_set
+from quota import BudgetExceeded, CallBudget
+from serializers import load_snapshot
+from upstream_health import CircuitOpenError
+
+EPISODES_FILE = "pokemon_episode_ids.json"
+
+# Interval multipliers by the age of a set: new sets move, old ones hardly do
+AGE_FACTORS = ((90, 1), (365, 3), (3 * 365, 8), (None, 24))
+
+# Demand counts from the last days
+DEMAND_DAYS = 7
+
+
+def _age_days(released_at, now):
+    try:
+        return (datetime.fromtimestamp(now) - datetime.strptime(released_at[:10], '%Y-%m-%d')).days
+    except (TypeError, ValueError):
+        return None
+
+
+def price_volatility(items):
+    """
+    Mean relative gap between the 7-day and the 30-day cardmarket average
+    of products or cards: 0 when prices are flat, 0.1 when they moved ~10%
+    """
+    gaps = []
+    for item in items:
+        cardmarket = (item.get('prices') or {}).get('cardmarket') or {}
+        week, month = cardmarket.get('7d_average'), cardmarket.get('30d_average')
+        try:
+            week, month = float(week), float(month)
+        except (TypeError, ValueError):
+            continue
+        if month > 0:
+            gaps.append(abs(week - month) / month)
+    return sum(gaps) / len(gaps) if gaps else None
+
+
+class RefreshScheduler:
+    """
+    Decides how often each set's prices are refreshed:
+
+      interval = base x age factor / (1 + 10 x volatility) / (1 + log2(1 + demand))
+
+    clamped to [min_interval, max_interval]. Age comes from the episode's
+    released_at, volatility from the 7d vs 30d averages seen at the last
+    refresh, demand from how often the set was asked for in /api/analyze
+    in the last days. The state lives in SQLite, so every worker records
+    demand into the same place; requests are counted in memory and written
+    every demand_flush_interval seconds, not once per request.
+    """
+    def __init__(self, path, base_interval=3600, min_interval=900, max_interval=7 * 86400,
+                 demand_flush_interval=10):
+        self.path = path
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.demand_flush_interval = demand_flush_interval
+        self._local = threading.local()
+        self._pruned_day = None
+        # (set name, day) -> requests not written yet
+        self._pending_demand = {}
+        self._demand_flushed_at = time.time()
+        self._demand_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS demand ("
+            " set_name TEXT NOT NULL, day TEXT NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (set_name, day))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS refreshes ("
+            " set_name TEXT PRIMARY KEY, refreshed_at REAL NOT NULL, volatility REAL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # Demand ------------------------------------------------------------
+
+    def record_demand(self, set_names):
+        """
+        Count one request for each set
+        """
+        day = datetime.now().strftime('%Y-%m-%d')
+        with self._demand_lock:
+            for name in set(set_names):
+                self._pending_demand[(name, day)] = self._pending_demand.get((name, day), 0) + 1
+            due = time.time() - self._demand_flushed_at >= self.demand_flush_interval
+
+        if due:
+            self.flush_demand()
+
+    def flush_demand(self):
+        """
+        Add the requests counted since the last flush to the database
+        """
+        with self._demand_lock:
+            pending = self._pending_demand
+            self._pending_demand = {}
+            self._demand_flushed_at = time.time()
+
+        if not pending:
+            return
+
+        day = datetime.now().strftime('%Y-%m-%d')
+        conn = self._conn()
+        conn.executemany(
+            "INSERT INTO demand (set_name, day, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(set_name, day) DO UPDATE SET count = count + excluded.count",
+            [(name, count_day, count) for (name, count_day), count in pending.items()]
+        )
+        # Counts older than DEMAND_DAYS are dropped once a day, by whoever flushes first
+        if self._pruned_day != day:
+            since = (datetime.now() - timedelta(days=DEMAND_DAYS)).strftime('%Y-%m-%d')
+            conn.execute("DELETE FROM demand WHERE day < ?", (since,))
+            self._pruned_day = day
+
+    def demand(self):
+        """
+        set name -> requests in the last DEMAND_DAYS days
+        (including those of this process that are not written yet)
+        """
+        since = (datetime.now() - timedelta(days=DEMAND_DAYS)).strftime('%Y-%m-%d')
+        rows = self._conn().execute(
+            "SELECT set_name, SUM(count) FROM demand WHERE day >= ? GROUP BY set_name", (since,)
+        ).fetchall()
+        demand = dict(rows)
+        with self._demand_lock:
+            for (name, day), count in self._pending_demand.items():
+                if day >= since:
+                    demand[name] = demand.get(name, 0) + count
+        return demand
+
+    # Schedule ----------------------------------------------------------
+
+    def interval(self, released_at, volatility, demand, now=None):
+        now = now or time.time()
+        age = _age_days(released_at, now)
+        age_factor = AGE_FACTORS[-1][1]
+        if age is not None:
+            for max_age, factor in AGE_FACTORS:
+                if max_age is None or age < max_age:
+                    age_factor = factor
+                    break
+
+        interval = self.base_interval * age_factor
+        interval /= 1 + 10 * (volatility or 0)
+        interval /= 1 + math.log2(1 + (demand or 0))
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def plan(self, episodes, now=None):
+        """
+        Every episode with its interval and when it is due, most overdue first
+        """
+        now = now or time.time()
+        demand = self.demand()
+        refreshes = {row[0]: (row[1], row[2]) for row in self._conn().execute(
+            "SELECT set_name, refreshed_at, volatility FROM refreshes"
+        )}
+
+        plan = []
+        for episode in episodes:
+            set_name = episode['name'].lower()
+            refreshed_at, volatility = refreshes.get(set_name, (None, None))
+            interval = self.interval(episode.get('released_at'), volatility, demand.get(set_name), now)
+            due_at = (refreshed_at or 0) + interval
+            plan.append({
+                'set_name': set_name,
+                'name': episode['name'],
+                'released_at': episode.get('released_at'),
+                'volatility': volatility,
+                'demand': demand.get(set_name, 0),
+                'interval': interval,
+                'refreshed_at': refreshed_at,
+                'due_at': due_at,
+                # How far past its due time, relative to its interval (never refreshed = most overdue)
+                'overdue': (now - refreshed_at) / interval if refreshed_at else math.inf
+            })
+        # Among sets never refreshed, the ones that should be refreshed most often go first
+        plan.sort(key=lambda entry: (-entry['overdue'], entry['interval']))
+        return plan
+
+    # Refreshing --------------------------------------------------------
+
+    def refresh(self, collector, calculator, set_name, budget, history=None):
+        """
+        Fetch a set's products and cards from the API (bypassing the
+        cache, the new pages go into it), re-analyze it and note its volatility
+        """
+        with collector.analysis_scope(budget=budget, refresh=True):
+            products_data = collector.get_specific_products(set_name)
+            top_cards = collector.get_cards_by_set_name(set_name, limit=50)
+        results = score_set(calculator, set_name, products_data, top_cards)
+
+        products = products_data['etb'] + products_data['booster_boxes']
+        volatility = price_volatility(products)
+        if volatility is None:
+            volatility = price_volatility(top_cards)
+
+        self._conn().execute(
+            "INSERT OR REPLACE INTO refreshes (set_name, refreshed_at, volatility) VALUES (?, ?, ?)",
+            (set_name, time.time(), volatility)
+        )
+        if history is not None and results:
+            history.record_products(results)
+        return results, volatility
+
+    def run_due(self, collector, calculator, episodes, budget, history=None):
+        """
+        Refresh the due sets, most overdue first, until none is due or
+        the call budget is used up. Returns the names of the refreshed sets.
+        """
+        now = time.time()
+        refreshed = []
+        for entry in self.plan(episodes, now):
+            if entry['due_at'] > now:
+                break
+            if budget.remaining() is not None and budget.remaining() < 2:
+                print(f"💸 Call budget used up, {entry['name']} and later sets wait for the next run")
+                break
+            try:
+                results, volatility = self.refresh(collector, calculator, entry['set_name'], budget, history)
+            except (BudgetExceeded, CircuitOpenError) as e:
+                print(f"🛑 {e}, stopping")
+                break
+            except Exception as e:
+                print(f"❌ Error refreshing '{entry['set_name']}': {e}")
+                continue
+            refreshed.append(entry['set_name'])
+            vol = f"{volatility:.1%}" if volatility is not None else "n/a"
+            print(f"🔄 {entry['name']}: {len(results)} products, volatility {vol}, "
+                  f"every {entry['interval'] / 3600:.1f}h")
+        return refreshed
+
+
+def load_episodes():
+    """
+    Released episodes with cards from the saved catalog
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    return [episode for episode in load_snapshot(EPISODES_FILE)
+            if episode.get('cards_total', 0) > 0 and (episode.get('released_at') or '') <= today]
+
+
+def make_scheduler(config):
+    """
+    Scheduler from Config, None if its database can't be opened
+    """
+    try:
+        return RefreshScheduler(config.SCHEDULER_DB, config.REFRESH_BASE_INTERVAL_SECONDS,
+                                config.REFRESH_MIN_INTERVAL_SECONDS, config.REFRESH_MAX_INTERVAL_SECONDS)
+    except sqlite3.Error as e:
+        print(f"⚠️ Cannot open scheduler database {config.SCHEDULER_DB} ({e}), refresh scheduling is off")
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh set prices by age, volatility and demand")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('plan', help="show each set's refresh interval and when it is due")
+
+    run = commands.add_parser('run', help="refresh the sets that are due")
+    run.add_argument('--budget', type=int, help="API calls per hour (default: Config.REFRESH_CALL_BUDGET)")
+    run.add_argument('--loop', action='store_true', help="keep running, checking for due sets every --tick seconds")
+    run.add_argument('--tick', type=float, default=300, help="seconds between checks with --loop (default 300)")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from config import Config
+    from data_collector import PokemonDataCollector
+    from price_history import PriceHistory
+    from roi_calculator import ROICalculator
+
+    args = parse_args(argv)
+    scheduler = make_scheduler(Config)
+    if scheduler is None:
+        return 1
+    episodes = load_episodes()
+
+    if args.command == 'plan':
+        now = time.time()
+        for entry in scheduler.plan(episodes, now):
+            due = 'now' if entry['due_at'] <= now else f"in {(entry['due_at'] - now) / 3600:.1f}h"
+            vol = f"{entry['volatility']:.1%}" if entry['volatility'] is not None else "n/a"
+            print(f"{entry['name'][:30]:<32} {entry['released_at'] or '':<12} vol {vol:>6}  "
+                  f"demand {entry['demand']:>4}  every {entry['interval'] / 3600:>6.1f}h  due {due}")
+        return 0
+
+    collector = PokemonDataCollector()
+    calculator = ROICalculator()
+    history = PriceHistory(Config.PRICE_HISTORY_DIR, Config.PRICE_HISTORY_COMPACT_AFTER_DAYS)
+    limit = args.budget if args.budget is not None else Config.REFRESH_CALL_BUDGET
+
+    if not collector.test_api_connection():
+        print("❌ Cannot connect to API. Please check your .env file and API key.")
+        return 1
+
+    try:
+        # The call budget is per hour, shared by all the runs within it
+        hour, budget = None, None
+        while True:
+            if hour != int(time.time() // 3600):
+                hour, budget = int(time.time() // 3600), CallBudget(limit)
+            refreshed = scheduler.run_due(collector, calculator, episodes, budget, history)
+            print(f"✅ Refreshed {len(refreshed)} sets with {budget.used} API calls this hour")
+            if not args.loop:
+                break
+            time.sleep(args.tick)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.quota.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import base64
+import hashlib
+import json
+from bisect import bisect_left, bisect_right
+
+from snapshot_store import NUMERIC_COLUMNS, STRING_COLUMNS
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Filters matching fewer than 1 in SPARSE_FACTOR rows sort their matches
+# directly instead of walking the sorted index
+SPARSE_FACTOR = 8
+
+# Query parameter -> (column, bound)
+RANGE_FILTERS = {
+    'min_price': ('current_price', 'low'),
+    'max_price': ('current_price', 'high'),
+    'min_roi': ('roi_percentage', 'low'),
+    'max_risk': ('risk_score', 'high')
+}
+
+# Query parameter -> string column, values are comma-separated
+VALUE_FILTERS = {
+    'category': 'category',
+    'set': 'set_name',
+    'series': 'series',
+    'product_type': 'product_type'
+}
+
+QUERY_PARAMS = set(RANGE_FILTERS) | set(VALUE_FILTERS) | {'year', 'sort', 'order', 'page_size', 'cursor'}
+
+SORT_COLUMNS = NUMERIC_COLUMNS + STRING_COLUMNS
+
+
+class QueryError(ValueError):
+    """
+    Invalid filter, sort or cursor parameter
+    """
+    pass
+
+
+def wants_query(args):
+    """
+    True if the request uses any filter, sort or paging parameter
+    """
+    return any(name in args for name in QUERY_PARAMS)
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def parse_query(args):
+    """
+    Parse filter/sort/paging query parameters:
+
+      category, set, series, product_type   comma-separated values (case-insensitive)
+      year                                  comma-separated release years
+      min_price, max_price, min_roi, max_risk
+      sort=<column>&order=asc|desc          default: ROI order of the analysis
+      page_size, cursor                     cursor comes from paging.next_cursor
+    """
+    query = {
+        'ranges': {},
+        'values': {},
+        'years': None,
+        'sort': None,
+        'descending': False,
+        'page_size': DEFAULT_PAGE_SIZE,
+        'cursor': args.get('cursor') or None
+    }
+
+    for param, (column, bound) in RANGE_FILTERS.items():
+        if args.get(param):
+            try:
+                value = float(args[param])
+            except ValueError:
+                raise QueryError(f"{param} must be a number")
+            low, high = query['ranges'].get(column, (None, None))
+            query['ranges'][column] = (value, high) if bound == 'low' else (low, value)
+
+    for param, column in VALUE_FILTERS.items():
+        if args.get(param):
+            query['values'][column] = {value.lower() for value in _split(args[param])}
+
+    if args.get('year'):
+        query['years'] = set(_split(args['year']))
+
+    sort = args.get('sort')
+    if sort:
+        if sort not in SORT_COLUMNS:
+            raise QueryError(f"Cannot sort on '{sort}', use one of: {', '.join(SORT_COLUMNS)}")
+        query['sort'] = sort
+        # Numbers default to highest first, text to A-Z
+        default_order = 'desc' if sort in NUMERIC_COLUMNS else 'asc'
+        order = args.get('order', default_order).lower()
+        if order not in ('asc', 'desc'):
+            raise QueryError("order must be 'asc' or 'desc'")
+        query['descending'] = order == 'desc'
+
+    if args.get('page_size'):
+        try:
+            page_size = int(args['page_size'])
+        except ValueError:
+            raise QueryError("page_size must be a whole number")
+        query['page_size'] = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    return query
+
+
+def _rows_between(snapshot, column, low, high):
+    """
+    Rows with low <= value <= high, found by binary search in the
+    column's sorted index (values are floats or dictionary codes)
+    """
+    index = snapshot.sorted_index(column)
+    values = snapshot.column(column)
+    start = 0 if low is None else bisect_left(index, low, key=values.__getitem__)
+    end = len(index) if high is None else bisect_right(index, high, key=values.__getitem__)
+    return index[start:end]
+
+
+def _rows_with_codes(snapshot, column, codes):
+    rows = set()
+    for code in codes:
+        rows.update(_rows_between(snapshot, column, code, code))
+    return rows
+
+
+def matching_rows(snapshot, query):
+    """
+    Set of row numbers that pass all filters, None when nothing is filtered
+    """
+    candidates = []
+
+    for column, (low, high) in query['ranges'].items():
+        candidates.append(set(_rows_between(snapshot, column, low, high)))
+
+    for column, wanted in query['values'].items():
+        codes = [code for code, value in enumerate(snapshot.column_values(column)) if value.lower() in wanted]
+        candidates.append(_rows_with_codes(snapshot, column, codes))
+
+    if query['years']:
+        codes = [code for code, value in enumerate(snapshot.column_values('release_date'))
+                 if value[:4] in query['years']]
+        candidates.append(_rows_with_codes(snapshot, 'release_date', codes))
+
+    if not candidates:
+        return None
+
+    # Intersect starting with the smallest set
+    candidates.sort(key=len)
+    matched = candidates[0]
+    for rows in candidates[1:]:
+        matched = matched & rows
+    return matched
+
+
+def _query_signature(snapshot, query):
+    """
+    Ties a cursor to the snapshot and the filters/sort it was made for
+    """
+    key = json.dumps([
+        snapshot.etags['full'],
+        sorted((column, list(bounds)) for column, bounds in query['ranges'].items()),
+        sorted((column, sorted(values)) for column, values in query['values'].items()),
+        sorted(query['years'] or []),
+        query['sort'],
+        query['descending']
+    ])
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=6).hexdigest()
+
+
+def _encode_cursor(signature, position, returned):
+    raw = json.dumps({'q': signature, 'p': position, 'n': returned}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor, signature):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        position, returned = int(data['p']), int(data['n'])
+    except (ValueError, KeyError, TypeError):
+        raise QueryError("Invalid cursor")
+    if data.get('q') != signature:
+        raise QueryError("Cursor is from another query or an older analysis, start again without cursor")
+    return position, returned
+
+
+def _ordered(snapshot, query, rows):
+    """
+    Sort a set of row numbers the same way the sorted index would
+    """
+    if query['sort'] is None:
+        return sorted(rows)
+    values = snapshot.column(query['sort'])
+    return sorted(rows, key=lambda row: (values[row], row), reverse=query['descending'])
+
+
+def run_query(snapshot, query):
+    """
+    One page of rows for the query.
+    Returns {'rows': [row numbers], 'total': matches, 'next_cursor': str or None}
+
+    Rows are walked in sort order (the sorted index, or the stored ROI
+    order) from the cursor position, keeping those that match, until the
+    page is full - so a page costs about page_size steps, not a full sort.
+    Very selective filters just sort their few matching rows instead.
+    """
+    count = snapshot.count
+    matched = matching_rows(snapshot, query)
+    total = count if matched is None else len(matched)
+    signature = _query_signature(snapshot, query)
+
+    position, returned = 0, 0
+    if query['cursor']:
+        position, returned = _decode_cursor(query['cursor'], signature)
+
+    if matched is not None and total * SPARSE_FACTOR < count:
+        page = _ordered(snapshot, query, matched)[returned:returned + query['page_size']]
+    else:
+        order = snapshot.sorted_index(query['sort']) if query['sort'] else None
+        page = []
+        while position < count and len(page) < query['page_size'] and returned + len(page) < total:
+            if order is None:
+                row = position
+            elif query['descending']:
+                row = order[count - 1 - position]
+            else:
+                row = order[position]
+            position += 1
+            if matched is None or row in matched:
+                page.append(row)
+
+    returned += len(page)
+    next_cursor = _encode_cursor(signature, position, returned) if returned < total else None
+    return {'rows': page, 'total': total, 'next_cursor': next_cursor}
@@ -1,6 +1,10 @@
 from datetime import datetime
 
 class ROICalculator:
+    # Bump whenever the scoring or risk model changes, memoized
+    # analyses (see analysis.py) are keyed on it
+    MODEL_VERSION = 1
+    
     def __init__(self):
         # Pull rate multipliers (account for duplicates, condition, etc.)
         self.pull_multipliers = {
@@ -10,6 +14,17 @@ class ROICalculator:
             'single_booster': 0.80       # Single pack
         }
     
+    def model_fingerprint(self):
+        """
+        Everything besides the input prices that the results depend on.
+        Risk scores depend on the age of a set, so the date is part of it.
+        """
+        return {
+            'model_version': self.MODEL_VERSION,
+            'pull_multipliers': self.pull_multipliers,
+            'as_of': datetime.now().strftime('%Y-%m-%d')
+        }
+    
     def identify_product_type(self, product_name):
         """
         Determine product type and pack count from product name
@@ -190,9 +205,15 @@ class ROICalculator:
         # Calculate risk score
         risk_score = self.calculate_simple_risk_score(product_data)
         
+        # Series comes as an object or a plain name depending on the endpoint
+        series = product_data.get('episode', {}).get('series') or ''
+        if isinstance(series, dict):
+            series = series.get('name', '')
+        
         # Return analysis results
         return {
             'set_name': product_data.get('episode', {}).get('name', 'Unknown Set'),
+            'series': series,
             'product_name': product_name,
             'product_type': product_type,
             'packs_per_box': packs_per_box,
@@ -0,0 +1,220 @@
+import gzip
+import importlib
+import json
+import os
+import zlib
+
+# Optional fast encoders (orjson, msgpack), imported on first use
+_modules = {}
+
+# Containers with more items than this are written piece by piece
+STREAM_THRESHOLD = 1000
+
+SNAPSHOT_MARKER = '__snapshot__'
+
+
+def _optional(name):
+    if name not in _modules:
+        try:
+            _modules[name] = importlib.import_module(name)
+        except ImportError:
+            _modules[name] = None
+    return _modules[name]
+
+
+def backend():
+    """
+    Name of the JSON encoder in use: 'orjson' when installed (and not
+    disabled with JSON_BACKEND=json), otherwise the standard library
+    """
+    if os.getenv('JSON_BACKEND', 'auto') != 'json' and _optional('orjson') is not None:
+        return 'orjson'
+    return 'json'
+
+
+def dumps(obj, sort_keys=False, default=None):
+    """
+    Compact JSON as UTF-8 bytes using the fastest encoder available
+    """
+    if backend() == 'orjson':
+        orjson = _optional('orjson')
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            # e.g. integers too big for orjson, let the standard library handle it
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'),
+                      sort_keys=sort_keys, default=default).encode('utf-8')
+
+
+def loads(data):
+    """
+    Parse JSON from bytes or str using the fastest decoder available
+    """
+    if backend() == 'orjson':
+        return _optional('orjson').loads(data)
+    return json.loads(data)
+
+
+def iter_json_chunks(obj, default=None, depth=2):
+    """
+    Encode obj as compact JSON in pieces, so large lists and dicts
+    never have to exist as one big string in memory
+    """
+    if depth > 0 and isinstance(obj, list):
+        yield b'['
+        for i, item in enumerate(obj):
+            if i:
+                yield b','
+            yield from iter_json_chunks(item, default, depth - 1)
+        yield b']'
+    elif depth > 0 and isinstance(obj, dict):
+        yield b'{'
+        for i, (key, value) in enumerate(obj.items()):
+            yield (b',' if i else b'') + dumps(str(key)) + b':'
+            yield from iter_json_chunks(value, default, depth - 1)
+        yield b'}'
+    else:
+        yield dumps(obj, default=default)
+
+
+def _is_large(obj):
+    if isinstance(obj, (list, dict)):
+        if len(obj) > STREAM_THRESHOLD:
+            return True
+        values = obj.values() if isinstance(obj, dict) else obj
+        return any(isinstance(v, (list, dict)) and len(v) > STREAM_THRESHOLD for v in values)
+    return False
+
+
+def dedupe_episodes(data):
+    """
+    Replace repeated 'episode' objects by {"$episode": id} references
+    and return (data, episode table). Episodes that differ from the
+    first copy with the same id are left inline.
+    """
+    episodes = {}
+
+    def walk(value):
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        if isinstance(value, dict):
+            out = {}
+            for key, item in value.items():
+                if key == 'episode' and isinstance(item, dict) and item.get('id') is not None:
+                    episode_key = str(item['id'])
+                    if episodes.setdefault(episode_key, item) == item:
+                        out[key] = {'$episode': episode_key}
+                        continue
+                out[key] = walk(item)
+            return out
+        return value
+
+    return walk(data), episodes
+
+
+def restore_episodes(data, episodes):
+    """
+    Undo dedupe_episodes()
+    """
+    def walk(value):
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        if isinstance(value, dict):
+            if len(value) == 1 and '$episode' in value:
+                return episodes[value['$episode']]
+            return {key: walk(item) for key, item in value.items()}
+        return value
+
+    return walk(data)
+
+
+def snapshot_filename(name, fmt='json', compress=False):
+    """
+    File name (with extension) for a snapshot in the given format
+    """
+    extension = '.msgpack' if fmt == 'msgpack' else '.json'
+    return f"{name}{extension}{'.gz' if compress else ''}"
+
+
+def write_snapshot(data, path, fmt='json', compress=None, dedupe=False, default=None):
+    """
+    Write a snapshot file.
+
+    fmt:      'json'    - indented, human readable
+              'compact' - no whitespace, fast encoder, streamed for large data
+              'msgpack' - binary (needs the msgpack package)
+    compress: gzip the file, defaults to True when path ends with .gz
+    dedupe:   store repeated episode objects only once (see dedupe_episodes)
+
+    The file is written next to its final name and renamed into place,
+    so readers never see half a file.
+    """
+    if compress is None:
+        compress = path.endswith('.gz')
+
+    if dedupe:
+        data, episodes = dedupe_episodes(data)
+        data = {SNAPSHOT_MARKER: 1, 'episodes': episodes, 'data': data}
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    opener = gzip.open if compress else open
+
+    with opener(tmp_path, 'wb') as f:
+        if fmt == 'msgpack':
+            msgpack = _optional('msgpack')
+            if msgpack is None:
+                raise RuntimeError("msgpack snapshots need the msgpack package (pip install msgpack)")
+            f.write(msgpack.packb(data, use_bin_type=True, default=default))
+        elif fmt == 'json':
+            f.write(json.dumps(data, indent=2, ensure_ascii=False, default=default).encode('utf-8'))
+        elif _is_large(data):
+            for chunk in iter_json_chunks(data, default):
+                f.write(chunk)
+        else:
+            f.write(dumps(data, default=default))
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot written by write_snapshot (or any plain JSON file).
+    Format and compression are detected from the file contents.
+    Raises ValueError naming the file when it is empty, truncated or corrupt.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    try:
+        if raw[:2] == b'\x1f\x8b':
+            raw = gzip.decompress(raw)
+    except (EOFError, OSError, zlib.error) as e:
+        raise ValueError(f"{path} is truncated or corrupt ({e})") from e
+
+    if not raw.strip():
+        raise ValueError(f"{path} is empty")
+
+    first = raw.lstrip()[:1]
+    if first in (b'{', b'[', b'"'):
+        unpack = loads
+    else:
+        msgpack = _optional('msgpack')
+        if msgpack is None:
+            raise RuntimeError(f"{path} is a msgpack snapshot, install msgpack to read it")
+
+        def unpack(raw):
+            return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+    try:
+        data = unpack(raw)
+    except ValueError as e:
+        raise ValueError(f"{path} is truncated or corrupt ({e})") from e
+
+    if isinstance(data, dict) and data.get(SNAPSHOT_MARKER):
+        return restore_episodes(data['data'], data['episodes'])
+    return data
@@ -0,0 +1,313 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from serializers import dumps, loads
+
+
+class RefreshInProgress(Exception):
+    """
+    Raised to a waiter when another caller is still refreshing the key
+    and there is no stale value to serve
+    """
+    def __init__(self, key, retry_after):
+        self.key = key
+        self.retry_after = retry_after
+        super().__init__(f"{key} is still being refreshed, retry in {retry_after}s")
+
+
+class CacheBackend:
+    """
+    Cache shared by all worker processes. Subclasses store the values;
+    get_or_refresh() adds single-writer refresh on top:
+
+    - a fresh value is returned straight away
+    - otherwise one caller (thread or process) wins the refresh lease
+      for the key and produces the value, the others serve the stale
+      value if there is one, or wait for the winner to publish it
+    """
+    # Expired values are kept this long to serve while someone refreshes them
+    STALE_GRACE_SECONDS = 24 * 3600
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.lease_waits = 0
+
+    # Storage interface -------------------------------------------------
+
+    def get_entry(self, key):
+        """
+        Returns (value, expires_at) or None
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def acquire_lease(self, key, ttl, owner):
+        """
+        Try to become the only refresher of key for ttl seconds
+        """
+        raise NotImplementedError
+
+    def release_lease(self, key, owner):
+        raise NotImplementedError
+
+    def count_fresh(self, prefix=''):
+        """
+        Number of unexpired values whose key starts with prefix
+        """
+        raise NotImplementedError
+
+    # Shared logic ------------------------------------------------------
+
+    def get(self, key):
+        """
+        Fresh value or None
+        """
+        entry = self.get_entry(key)
+        if entry is not None and entry[1] > time.time():
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def get_or_refresh(self, key, ttl, producer, lease_ttl=60, wait_timeout=10, cacheable=None):
+        """
+        Cached value for key, produced by producer() when missing or expired.
+        Only one caller refreshes a key at a time, the lease belongs to this
+        call (not to the process), so threads of one worker don't share it.
+        cacheable(value) can reject values that must not be stored (e.g.
+        partial results). Raises RefreshInProgress when the value is still
+        missing after wait_timeout and the refresher's lease is still live.
+        """
+        entry = self.get_entry(key)
+        if entry is not None and entry[1] > time.time():
+            self.hits += 1
+            return entry[0]
+
+        owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        if self.acquire_lease(key, lease_ttl, owner):
+            return self._refresh(key, ttl, producer, owner, cacheable)
+
+        # Someone else is refreshing this key
+        if entry is not None:
+            self.stale_hits += 1
+            return entry[0]
+
+        self.lease_waits += 1
+        waited_until = time.time() + wait_timeout
+        while time.time() < waited_until:
+            time.sleep(0.1)
+            entry = self.get_entry(key)
+            if entry is not None and entry[1] > time.time():
+                self.hits += 1
+                return entry[0]
+
+        # Take over only if the refresher died (its lease expired), a slow one keeps it
+        if self.acquire_lease(key, lease_ttl, owner):
+            return self._refresh(key, ttl, producer, owner, cacheable)
+        raise RefreshInProgress(key, max(1, int(lease_ttl)))
+
+    def _refresh(self, key, ttl, producer, owner, cacheable):
+        try:
+            self.misses += 1
+            self.refreshes += 1
+            value = producer()
+            if cacheable is None or cacheable(value):
+                self.set(key, value, ttl)
+            return value
+        finally:
+            self.release_lease(key, owner)
+
+    def stats(self):
+        return {
+            'backend': type(self).__name__,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'lease_waits': self.lease_waits
+        }
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process stand-in for an external store (Redis, memcached).
+    Only shared between threads, use it for development and single-worker runs.
+    """
+    def __init__(self):
+        super().__init__()
+        self._values = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def get_entry(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+        if entry is None or entry[1] + self.STALE_GRACE_SECONDS < time.time():
+            return None
+        return entry
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def acquire_lease(self, key, ttl, owner):
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease[1] > now and lease[0] != owner:
+                return False
+            self._leases[key] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, key, owner):
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease[0] == owner:
+                del self._leases[key]
+
+    def count_fresh(self, prefix=''):
+        now = time.time()
+        with self._lock:
+            return sum(1 for key, entry in self._values.items() if key.startswith(prefix) and entry[1] > now)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in a SQLite database in WAL mode, shared by all worker processes
+    on one host. Readers never block the writer and every write is a
+    single transaction, so a refresh replaces a value atomically.
+    """
+    PURGE_EVERY = 200
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, transactions are opened explicitly
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_entry(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?",
+            (key, time.time() - self.STALE_GRACE_SECONDS)
+        ).fetchone()
+        if row is None:
+            return None
+        return loads(row[0]), row[1]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+            (key, dumps(value), now + ttl, now)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def acquire_lease(self, key, ttl, owner):
+        now = time.time()
+        conn = self._conn()
+        # The upsert only takes over an expired (or our own) lease
+        cursor = conn.execute(
+            "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+            (key, owner, now + ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, key, owner):
+        self._conn().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def count_fresh(self, prefix=''):
+        # Also pulls the table's pages into the OS cache
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM cache WHERE key LIKE ? ESCAPE '\\' AND expires_at > ?",
+            (escaped + '%', time.time())
+        ).fetchone()
+        return row[0]
+
+    def purge_expired(self):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (now - self.STALE_GRACE_SECONDS,))
+        conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+
+
+class NullCache(CacheBackend):
+    """
+    Caching switched off (CACHE_BACKEND=none)
+    """
+    def get_entry(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def acquire_lease(self, key, ttl, owner):
+        return True
+
+    def release_lease(self, key, owner):
+        pass
+
+    def count_fresh(self, prefix=''):
+        return 0
+
+
+def make_cache(config):
+    """
+    Cache backend selected by Config.CACHE_BACKEND
+    """
+    backend = config.CACHE_BACKEND
+    if backend == 'sqlite':
+        try:
+            return SQLiteCache(config.CACHE_DB)
+        except sqlite3.Error as e:
+            print(f"⚠️ Cannot open cache database {config.CACHE_DB} ({e}), using in-process cache")
+            return MemoryCache()
+    if backend == 'memory':
+        return MemoryCache()
+    return NullCache()
@@ -0,0 +1,209 @@
+import argparse
+import glob
+import os
+import re
+import sys
+
+from price_history import product_key
+from serializers import dumps, load_snapshot, loads
+from snapshot_store import AnalysisSnapshot
+
+DUMP_SUFFIX = "_pokemon_investment_analysis"
+
+# A run is named by the timestamp prefix of its dump, e.g. 20250625_153918
+RUN_PATTERN = re.compile(r'^\d{8}_\d{6}$')
+
+# Values compared between two runs
+DIFF_FIELDS = ('current_price', 'estimated_pull_value', 'roi_percentage', 'risk_score')
+
+
+class DiffError(ValueError):
+    pass
+
+
+def list_runs(directory='.'):
+    """
+    Timestamps of the analysis dumps in directory, oldest first
+    """
+    runs = set()
+    for path in glob.glob(os.path.join(directory, f"*{DUMP_SUFFIX}.*")):
+        name = os.path.basename(path)[:15]
+        if RUN_PATTERN.match(name):
+            runs.add(name)
+    return sorted(runs)
+
+
+def resolve_run(ref, directory='.'):
+    """
+    Path of a run given as its timestamp (20250625_153918) or a file path
+    """
+    if RUN_PATTERN.match(ref):
+        matches = sorted(glob.glob(os.path.join(directory, f"{ref}{DUMP_SUFFIX}.*")))
+        if not matches:
+            raise DiffError(f"No analysis dump for run {ref}")
+        return matches[0]
+    if not os.path.exists(ref):
+        raise DiffError(f"{ref} is neither a run timestamp nor a file")
+    return ref
+
+
+def load_rows(path):
+    """
+    Result rows of a JSON/msgpack dump or of a binary analysis snapshot
+    """
+    if path.endswith('.snap'):
+        snapshot = AnalysisSnapshot(path)
+        return [loads(snapshot.row(i)) for i in range(snapshot.count)]
+    rows = load_snapshot(path)
+    if isinstance(rows, dict):
+        rows = rows.get('data', [])
+    return rows
+
+
+def _index(rows):
+    """
+    key -> (rank, row), rows are ranked in file order (highest ROI first).
+    A product found by several set searches keeps its first, best rank.
+    """
+    index = {}
+    for row in rows:
+        key = product_key(row)
+        if key not in index:
+            index[key] = (len(index) + 1, row)
+    return index
+
+
+def _delta(old, new):
+    if old is None or new is None:
+        return {'from': old, 'to': new, 'delta': None}
+    return {'from': old, 'to': new, 'delta': round(new - old, 2)}
+
+
+def diff_rows(old_rows, new_rows):
+    """
+    Yield the differences between two runs, one dict per product:
+    added, removed, or changed (a value changed or the rank moved).
+    One pass over each side, O(n) overall.
+    """
+    old_index = _index(old_rows)
+    seen = set()
+    rank = 0
+
+    for row in new_rows:
+        key = product_key(row)
+        if key in seen:
+            continue
+        seen.add(key)
+        rank += 1
+
+        old = old_index.get(key)
+        if old is None:
+            yield _change('added', key, row, None, rank, None, row)
+            continue
+
+        old_rank, old_row = old
+        if old_rank != rank or any(old_row.get(field) != row.get(field) for field in DIFF_FIELDS):
+            yield _change('changed', key, row, old_rank, rank, old_row, row)
+
+    for key, (old_rank, old_row) in old_index.items():
+        if key not in seen:
+            yield _change('removed', key, old_row, old_rank, None, old_row, None)
+
+
+def _change(change_type, key, row, old_rank, rank, old_row, new_row):
+    change = {
+        'type': change_type,
+        'key': key,
+        'product_name': row.get('product_name'),
+        'set_name': row.get('set_name'),
+        'old_rank': old_rank,
+        'rank': rank,
+        # Positive when the product moved up
+        'rank_change': old_rank - rank if old_rank and rank else None
+    }
+    for field in DIFF_FIELDS:
+        old_value = old_row.get(field) if old_row else None
+        new_value = new_row.get(field) if new_row else None
+        change[field] = _delta(old_value, new_value)
+    return change
+
+
+def diff_runs(old_ref, new_ref, directory='.'):
+    """
+    (changes, summary) between two runs
+    """
+    changes = list(diff_rows(load_rows(resolve_run(old_ref, directory)), load_rows(resolve_run(new_ref, directory))))
+    return changes, summarize(changes)
+
+
+def summarize(changes):
+    summary = {'added': 0, 'removed': 0, 'changed': 0, 'price_changed': 0, 'rank_changed': 0}
+    for change in changes:
+        summary[change['type']] += 1
+        if change['type'] == 'changed':
+            if change['current_price']['delta']:
+                summary['price_changed'] += 1
+            if change['rank_change']:
+                summary['rank_changed'] += 1
+    return summary
+
+
+def _format(change):
+    name = f"{(change['product_name'] or change['key'])[:50]:<52}"
+    if change['type'] == 'added':
+        return f"+ {name} #{change['rank']:<4} €{change['current_price']['to']}  ROI {change['roi_percentage']['to']}%"
+    if change['type'] == 'removed':
+        return f"- {name} #{change['old_rank']:<4} €{change['current_price']['from']}  ROI {change['roi_percentage']['from']}%"
+
+    parts = []
+    if change['rank_change']:
+        parts.append(f"rank {change['old_rank']} -> {change['rank']} ({change['rank_change']:+d})")
+    for field, label, unit in (('current_price', 'price', '€'), ('roi_percentage', 'ROI', '%'), ('risk_score', 'risk', '')):
+        if change[field]['delta']:
+            parts.append(f"{label} {change[field]['from']} -> {change[field]['to']}{unit} ({change[field]['delta']:+})")
+    return f"~ {name} {', '.join(parts)}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Differences between two analysis runs")
+    parser.add_argument('old', nargs='?', help="run timestamp (e.g. 20250625_153918) or file")
+    parser.add_argument('new', nargs='?', help="run timestamp or file")
+    parser.add_argument('--list', action='store_true', help="list the available runs")
+    parser.add_argument('--ndjson', action='store_true', help="one JSON object per change")
+    parser.add_argument('--only', help="comma-separated change types (added,removed,changed)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list or not (args.old and args.new):
+        for run in list_runs():
+            print(run)
+        return 0 if args.list else 1
+
+    try:
+        old_rows = load_rows(resolve_run(args.old))
+        new_rows = load_rows(resolve_run(args.new))
+    except DiffError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+
+    only = set(args.only.split(',')) if args.only else None
+    summary = {'added': 0, 'removed': 0, 'changed': 0}
+    out = sys.stdout
+    for change in diff_rows(old_rows, new_rows):
+        summary[change['type']] += 1
+        if only and change['type'] not in only:
+            continue
+        if args.ndjson:
+            out.buffer.write(dumps(change) + b'\n')
+        else:
+            out.write(_format(change) + '\n')
+
+    print(f"\n📊 {summary['added']} added, {summary['removed']} removed, {summary['changed']} changed",
+          file=sys.stderr if args.ndjson else sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+from serializers import dumps
+
+MAGIC = b'PTCGSNP1'
+VERSION = 2
+_PREFIX = struct.Struct('<8sQ')  # magic, header length
+
+# Columns the results table renders, the snapshot keeps a ready-made
+# response with only these fields (templates/index.html asks for them)
+TABLE_FIELDS = (
+    'product_name', 'product_type', 'category', 'set_name', 'current_price', 'estimated_pull_value',
+    'roi_percentage', 'risk_score', 'packs_per_box', 'release_date', 'image_url'
+)
+
+# Column index: numbers are stored as float64 arrays, strings as
+# dictionary codes (uint32) into a sorted value list kept in the header.
+# Every column also gets a sorted index: the row numbers ordered by value.
+NUMERIC_COLUMNS = ('current_price', 'estimated_pull_value', 'roi_percentage', 'risk_score', 'packs_per_box')
+STRING_COLUMNS = ('category', 'set_name', 'series', 'product_type', 'product_name', 'release_date')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def _etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def build_snapshot(results, summary, bodies=True):
+    """
+    Serialize an immutable binary analysis snapshot:
+
+      magic | header length | header JSON | sections...
+
+    Sections hold the serialized responses (full and table projection,
+    each also gzip/brotli compressed, left out with bodies=False), every
+    row as compact JSON with an offset table, one array per indexed
+    column and one sorted index per column.
+    """
+    sections = {}
+
+    def add(name, data):
+        sections[name] = bytes(data)
+
+    variants = {
+        'full': results,
+        'table': [{field: row[field] for field in TABLE_FIELDS if field in row} for row in results]
+    }
+    etags = {}
+    brotli = _brotli()
+    for variant, rows in variants.items():
+        body = dumps({'success': True, 'partial': False, 'data': rows, 'summary': summary}, sort_keys=True)
+        etags[variant] = _etag(body)
+        if not bodies:
+            continue
+        add(f'body:{variant}:identity', body)
+        add(f'body:{variant}:gzip', gzip.compress(body, compresslevel=9))
+        if brotli is not None:
+            add(f'body:{variant}:br', brotli.compress(body, quality=11))
+
+    # Rows and their offsets
+    row_bytes = [dumps(row, sort_keys=True) for row in results]
+    offsets = array('Q', [0])
+    for data in row_bytes:
+        offsets.append(offsets[-1] + len(data))
+    add('rows', b''.join(row_bytes))
+    add('row_offsets', offsets.tobytes())
+
+    columns = {}
+    for name in NUMERIC_COLUMNS:
+        values = array('d', (float(row.get(name) or 0) for row in results))
+        add(f'col:{name}', values.tobytes())
+        add(f'idx:{name}', _sorted_index(values).tobytes())
+        columns[name] = {'type': 'd'}
+    for name in STRING_COLUMNS:
+        dictionary = sorted({str(row.get(name) or '') for row in results})
+        codes_by_value = {value: i for i, value in enumerate(dictionary)}
+        codes = array('I', (codes_by_value[str(row.get(name) or '')] for row in results))
+        add(f'col:{name}', codes.tobytes())
+        add(f'idx:{name}', _sorted_index(codes).tobytes())
+        columns[name] = {'type': 'I', 'values': dictionary}
+
+    # Section offsets are relative to the start of the data area
+    layout = {}
+    position = 0
+    for name, data in sections.items():
+        position = _align(position)
+        layout[name] = [position, len(data)]
+        position += len(data)
+
+    header = json.dumps({
+        'version': VERSION,
+        'created_at': time.time(),
+        'count': len(results),
+        'summary': summary,
+        'etags': etags,
+        'columns': columns,
+        'sections': layout
+    }, separators=(',', ':')).encode('utf-8')
+
+    data_start = _align(_PREFIX.size + len(header))
+    out = bytearray(data_start + position)
+    _PREFIX.pack_into(out, 0, MAGIC, len(header))
+    out[_PREFIX.size:_PREFIX.size + len(header)] = header
+    for name, data in sections.items():
+        offset = data_start + layout[name][0]
+        out[offset:offset + len(data)] = data
+    return out
+
+
+def _sorted_index(values):
+    """
+    Row numbers ordered by value (stable, so ties keep the row order)
+    """
+    return array('I', sorted(range(len(values)), key=values.__getitem__))
+
+
+def write_snapshot_file(path, results, summary):
+    """
+    Write a snapshot to path. The file is written to a temp name and
+    renamed into place, so readers switch atomically.
+    """
+    data = build_snapshot(results, summary)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+class AnalysisSnapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file. Responses and rows
+    are served as slices of the mapping, so they live in the page cache
+    shared by all worker processes instead of in each worker's heap.
+    """
+    def __init__(self, path=None, data=None):
+        self.path = path
+        self._mm = None
+        if data is None:
+            with open(path, 'rb') as f:
+                data = self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(data)
+
+        magic, header_length = _PREFIX.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an analysis snapshot")
+        self.header = json.loads(bytes(self._view[_PREFIX.size:_PREFIX.size + header_length]))
+        if self.header.get('version') != VERSION:
+            raise ValueError(f"{path} is a version {self.header.get('version')} snapshot, expected {VERSION}")
+        self._data_start = _align(_PREFIX.size + header_length)
+
+        self.count = self.header['count']
+        self.summary = self.header['summary']
+        self.created_at = self.header['created_at']
+        self.etags = self.header['etags']
+        self._offsets = self.section('row_offsets').cast('Q')
+
+    @classmethod
+    def from_results(cls, results, summary):
+        """
+        In-memory snapshot without the prebuilt responses, to query
+        results that are not stored (e.g. partial ones)
+        """
+        return cls(data=build_snapshot(results, summary, bodies=False))
+
+    def prefetch(self):
+        """
+        Ask the OS to read the whole file into the page cache now
+        """
+        if self._mm is not None and hasattr(mmap, 'MADV_WILLNEED'):
+            self._mm.madvise(mmap.MADV_WILLNEED)
+
+    def age(self):
+        return time.time() - self.created_at
+
+    def has_section(self, name):
+        return name in self.header['sections']
+
+    def section(self, name):
+        offset, length = self.header['sections'][name]
+        start = self._data_start + offset
+        return self._view[start:start + length]
+
+    def body(self, variant, encoding='identity'):
+        """
+        Pre-serialized response bytes, or None if not stored in that encoding
+        """
+        name = f'body:{variant}:{encoding}'
+        return self.section(name) if self.has_section(name) else None
+
+    def row(self, index):
+        """
+        Compact JSON bytes of one result row
+        """
+        return self.section('rows')[self._offsets[index]:self._offsets[index + 1]]
+
+    def column(self, name):
+        """
+        Column values as a typed memoryview (float64, or uint32 dictionary codes)
+        """
+        return self.section(f'col:{name}').cast(self.header['columns'][name]['type'])
+
+    def column_values(self, name):
+        """
+        Dictionary of a string column (code -> value)
+        """
+        return self.header['columns'][name]['values']
+
+    def sorted_index(self, name):
+        """
+        Row numbers ordered by the column's value, ascending
+        """
+        return self.section(f'idx:{name}').cast('I')
+
+
+class SnapshotStore:
+    """
+    Directory of analysis snapshots, one file per analysis key.
+    Each worker keeps at most one mapping per file and remaps when the
+    file has been replaced by a newer version.
+    """
+    STAT_INTERVAL = 1.0
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._mapped = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        name = hashlib.blake2b(key.encode('utf-8'), digest_size=10).hexdigest()
+        return os.path.join(self.directory, f"analysis-{name}.snap")
+
+    def write(self, key, results, summary):
+        path = write_snapshot_file(self.path_for(key), results, summary)
+        print(f"💾 Analysis snapshot written: {path} ({len(results)} products)")
+        return path
+
+    def get(self, key, max_age=None):
+        """
+        Current snapshot for key, or None if there is none (or it is older than max_age)
+        """
+        path = self.path_for(key)
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._mapped.get(path)
+            if cached is not None and now - cached['checked_at'] < self.STAT_INTERVAL:
+                snapshot = cached['snapshot']
+            else:
+                snapshot = self._refresh(path, cached, now)
+
+        if snapshot is None or (max_age is not None and snapshot.age() > max_age):
+            return None
+        return snapshot
+
+    def preload(self):
+        """
+        Map every snapshot in the directory and prefetch its pages, so the
+        first requests after a restart are served without touching the disk.
+        Returns the number of snapshots mapped.
+        """
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith('analysis-') and name.endswith('.snap')
+        ]
+        mapped = 0
+        now = time.monotonic()
+        with self._lock:
+            for path in paths:
+                snapshot = self._refresh(path, self._mapped.get(path), now)
+                if snapshot is not None:
+                    snapshot.prefetch()
+                    mapped += 1
+        return mapped
+
+    def _refresh(self, path, cached, now):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._mapped.pop(path, None)
+            return None
+
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if cached is not None and cached['signature'] == signature:
+            cached['checked_at'] = now
+            return cached['snapshot']
+
+        try:
+            snapshot = AnalysisSnapshot(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️ Cannot map snapshot {path}: {e}")
+            return None
+
+        # The old mapping is released once no response is using it any more
+        self._mapped[path] = {'snapshot': snapshot, 'signature': signature, 'checked_at': now}
+        return snapshot
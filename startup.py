@@ -0,0 +1,45 @@
+import time
+
+
+class Startup:
+    """
+    Warm-up steps a worker runs before it serves requests, with their
+    timings. time_to_ready is measured from when the app module started
+    importing, so it includes imports and building the components.
+    """
+    def __init__(self, started_at=None):
+        self.started_at = started_at or time.time()
+        self.ready_at = None
+        self.steps = {}
+
+    def step(self, name, fn):
+        """
+        Run one warm-up step. A failing step is logged and skipped,
+        the worker then does that work on the first request instead.
+        """
+        started = time.perf_counter()
+        try:
+            detail = fn()
+            self.steps[name] = {'ok': True, 'detail': detail}
+        except Exception as e:
+            print(f"⚠️ Warm-up step '{name}' failed: {e}")
+            detail = None
+            self.steps[name] = {'ok': False, 'error': str(e)}
+        self.steps[name]['ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return detail
+
+    def mark_ready(self):
+        self.ready_at = time.time()
+        print(f"🔥 Warm start finished in {self.time_to_ready():.2f}s")
+
+    def time_to_ready(self):
+        if self.ready_at is None:
+            return None
+        return round(self.ready_at - self.started_at, 3)
+
+    def snapshot(self):
+        return {
+            'ready': self.ready_at is not None,
+            'time_to_ready_seconds': self.time_to_ready(),
+            'steps': self.steps
+        }
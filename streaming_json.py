@@ -0,0 +1,172 @@
+import codecs
+import json
+
+# Fields the scoring pipeline needs. A dotted path keeps just that key,
+# a plain key keeps the whole value (e.g. all of 'prices', because
+# extract_card_price falls back to any numeric price it can find).
+CARD_FIELDS = (
+    'id', 'name', 'slug', 'card_number', 'rarity', 'prices', 'tcggo_url',
+    'episode.id', 'episode.name', 'episode.slug', 'episode.released_at'
+)
+
+PRODUCT_FIELDS = (
+    'id', 'name', 'slug', 'prices', 'image', 'tcggo_url',
+    'episode.id', 'episode.name', 'episode.slug', 'episode.released_at', 'episode.series'
+)
+
+EPISODE_FIELDS = (
+    'id', 'name', 'slug', 'code', 'released_at', 'cards_total', 'cards_printed_total'
+)
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def compile_fields(fields):
+    """
+    Turn ('a', 'b.c', 'b.d') into {'a': True, 'b': {'c': True, 'd': True}}
+    """
+    tree = {}
+    for path in fields:
+        node = tree
+        parts = path.split('.')
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is True:
+                break
+            node = child
+        else:
+            node[parts[-1]] = True
+    return tree
+
+
+def project(value, tree):
+    """
+    Copy only the fields in the compiled field tree out of value
+    """
+    if not isinstance(value, dict):
+        return value
+    out = {}
+    for key, sub_tree in tree.items():
+        if key in value:
+            out[key] = value[key] if sub_tree is True else project(value[key], sub_tree)
+    return out
+
+
+class _Buffer:
+    """
+    Text buffer over a chunked byte stream, refilled on demand
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self):
+        """
+        Read the next chunk, returns False at the end of the stream
+        """
+        if self.exhausted:
+            return False
+        # Drop what has been consumed so the buffer stays small
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        for chunk in self.chunks:
+            if chunk:
+                self.text += self.decoder.decode(chunk)
+                return True
+        self.text += self.decoder.decode(b'', final=True)
+        self.exhausted = True
+        return False
+
+    def peek(self):
+        """
+        Next non-whitespace character (without consuming it), '' at the end
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of JSON stream")
+        self.pos += 1
+
+    def value(self):
+        """
+        Decode the next complete JSON value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # A value that ends right at the end of the buffer may be cut
+                # short (e.g. a number split across two chunks)
+                if end < len(self.text) or self.exhausted:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            if not self.fill():
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                self.pos = end
+                return value
+
+
+def parse_page(chunks, fields, list_key='data'):
+    """
+    Parse an API page ({"data": [...], "paging": {...}, ...}) from a stream
+    of byte chunks. Items of the list_key array are decoded one at a time
+    and reduced to the given fields straight away, so a full page of
+    card objects never exists in memory. Other top-level keys are kept as is.
+    """
+    tree = compile_fields(fields)
+    buf = _Buffer(chunks)
+    page = {list_key: []}
+
+    buf.expect('{')
+    if buf.peek() == '}':
+        return page
+
+    while True:
+        key = buf.value()
+        buf.expect(':')
+
+        if key == list_key and buf.peek() == '[':
+            buf.expect('[')
+            items = page[list_key]
+            if buf.peek() != ']':
+                while True:
+                    items.append(project(buf.value(), tree))
+                    if buf.peek() == ',':
+                        buf.pos += 1
+                        continue
+                    break
+            buf.expect(']')
+        else:
+            page[key] = buf.value()
+
+        if buf.peek() == ',':
+            buf.pos += 1
+            continue
+        buf.expect('}')
+        return page
+
+
+def parse_response(response, fields, list_key='data'):
+    """
+    parse_page() over a requests response opened with stream=True
+    """
+    try:
+        return parse_page(response.iter_content(chunk_size=CHUNK_SIZE), fields, list_key)
+    finally:
+        response.close()
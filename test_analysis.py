@@ -0,0 +1,60 @@
+import pytest
+
+from analysis import analysis_fingerprint, analyze_set
+from incremental import ROIGraph
+from roi_calculator import ROICalculator
+
+
+class CountingCalculator(ROICalculator):
+    def __init__(self):
+        super().__init__()
+        self.scored = 0
+
+    def analyze_product(self, product_data, top_cards):
+        self.scored += 1
+        return super().analyze_product(product_data, top_cards)
+
+
+def test_unchanged_inputs_reuse_the_analysis(fake_collector):
+    calculator = CountingCalculator()
+    first = analyze_set(fake_collector, calculator, 'test set')
+    assert calculator.scored == 2
+    assert analyze_set(fake_collector, calculator, 'test set') == first
+    assert calculator.scored == 2
+
+
+@pytest.mark.parametrize('change', ['product price', 'card price', 'model version', 'pull multipliers'])
+def test_changed_inputs_are_rescored(fake_collector, make_products, make_card, monkeypatch, change):
+    calculator = CountingCalculator()
+    analyze_set(fake_collector, calculator, 'test set')
+
+    if change == 'product price':
+        fake_collector.products['test set'] = make_products(etb_price=45)
+    elif change == 'card price':
+        fake_collector.cards = [make_card(1, 41), make_card(2, 20)]
+    elif change == 'model version':
+        monkeypatch.setattr(ROICalculator, 'MODEL_VERSION', ROICalculator.MODEL_VERSION + 1)
+    else:
+        calculator.pull_multipliers['elite_trainer_box'] = 0.5
+
+    analyze_set(fake_collector, calculator, 'test set')
+    assert calculator.scored == 4
+
+
+def test_fingerprint_ignores_card_order(make_products, cards):
+    calculator = ROICalculator()
+    assert (analysis_fingerprint(calculator, make_products(), cards)
+            == analysis_fingerprint(calculator, make_products(), list(reversed(cards))))
+
+
+def test_graph_tracked_set_skips_the_memo(fake_collector, make_products):
+    calculator = CountingCalculator()
+    graph = ROIGraph(calculator)
+    analyze_set(fake_collector, calculator, 'test set', graph=graph)
+    fake_collector.products['test set'] = make_products(etb_price=45)
+    analyze_set(fake_collector, calculator, 'test set', graph=graph)
+    fake_collector.products['test set'] = make_products()
+    # Memoized inputs, but the graph still has to learn the price went back
+    results = analyze_set(fake_collector, calculator, 'test set', graph=graph)
+    assert {result['current_price'] for result in results} == {50, 150}
+    assert {result['current_price'] for result in graph.results()} == {50, 150}
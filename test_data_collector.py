@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from cancellation import AnalysisCancelled
+
+
+class FakeResponse:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+def half_open(collector):
+    collector.health.state = 'open'
+    collector.health.opened_at = time.time() - collector.health.cooldown - 1
+
+
+@pytest.mark.parametrize('error', [AnalysisCancelled('client went away'), ValueError('bad params')])
+def test_failed_trial_call_releases_half_open_slot(collector, error):
+    half_open(collector)
+
+    def send(url, params, timeout, stream=False):
+        raise error
+    collector._send = send
+
+    with pytest.raises(type(error)):
+        collector._get('cards', {})
+    assert collector.health.state == 'half_open'
+    assert not collector.health._trial_in_flight
+
+    # The next call is the trial and closes the circuit
+    collector._send = lambda url, params, timeout, stream=False: FakeResponse()
+    assert collector._get('cards', {}).status_code == 200
+    assert collector.health.state == 'closed'
+
+
+def test_calls_without_hedging_skip_the_call_pool(collector, monkeypatch):
+    from cancellation import CancellationToken
+    import data_collector
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("call pool used without hedging")
+    monkeypatch.setattr(data_collector, 'hedged_call', no_pool)
+    collector._send = lambda url, params, timeout, stream=False: FakeResponse()
+
+    with collector.analysis_scope(cancel_token=CancellationToken()):
+        assert collector._get('cards', {}).status_code == 200
+
+
+def test_cancelled_analysis_stops_between_pages(collector):
+    from cancellation import CancellationToken
+    pages = []
+    collector._fetch_page = lambda endpoint, params, fields: pages.append(params) or {'data': [{'id': 1}]}
+
+    token = CancellationToken()
+    with collector.analysis_scope(cancel_token=token):
+        collector._get_page('cards', {'episode_id': 1, 'page': 0}, ('id',))
+        token.cancel('client went away')
+        with pytest.raises(AnalysisCancelled):
+            collector._get_page('cards', {'episode_id': 1, 'page': 1}, ('id',))
+    assert len(pages) == 1
+
+
+def test_empty_second_card_page_is_not_a_negative_result(collector):
+    # 20 cards on page 0, no paging block, so the loop asks for page 1 which is empty
+    pages = {0: [{'id': i} for i in range(20)], 1: []}
+    collector._fetch_page = lambda endpoint, params, fields: {'data': pages[params['page']]}
+    assert sum(len(cards) for cards in collector.iter_card_pages(7)) == 20
+
+    # Once the cached pages expire, page 0 is asked upstream again
+    for key in [key for key in collector.cache._values if key.startswith('upstream:')]:
+        collector.cache.delete(key)
+    cards = [card for page in collector.iter_card_pages(7) for card in page]
+    assert len(cards) == 20
+    assert collector.negative_hits == 0
+
+
+def test_empty_search_is_remembered(collector):
+    calls = []
+    collector._fetch_page = lambda endpoint, params, fields: calls.append(params) or {'data': []}
+    for search in ('Nonexistent Set', 'nonexistent   SET'):
+        assert collector.get_specific_products(search)['all_products'] == []
+    assert len(calls) == 1
+    assert collector.negative_hits == 1
+
+    # Refreshing asks again
+    with collector.analysis_scope(refresh=True):
+        collector.get_specific_products('nonexistent set')
+    assert len(calls) == 2
@@ -0,0 +1,25 @@
+import gzip
+import json
+
+from flask import Flask
+
+from http_cache import cached_json_response
+
+app = Flask(__name__)
+
+
+def get(payload, etag_source):
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = cached_json_response(payload, etag_source=etag_source)
+        return response.headers, json.loads(gzip.decompress(response.get_data()))
+
+
+def test_compressed_body_follows_fields_outside_the_etag_source():
+    results = [{'product_name': f"Product {i}", 'roi_percentage': i} for i in range(100)]
+    first_headers, first = get({'results': results, 'summary': {'count': 1}}, results)
+    second_headers, second = get({'results': results, 'summary': {'count': 2}}, results)
+
+    assert first_headers['Content-Encoding'] == 'gzip'
+    assert first_headers['ETag'] == second_headers['ETag']
+    assert first['summary'] == {'count': 1}
+    assert second['summary'] == {'count': 2}
@@ -0,0 +1,74 @@
+import pytest
+
+from incremental import ROIGraph
+from roi_calculator import ROICalculator
+
+
+@pytest.fixture
+def graph(make_products, cards):
+    """
+    Graph that has scored 'test set' once
+    """
+    graph = ROIGraph(ROICalculator())
+    graph.update_set('test set', make_products(), cards)
+    graph.recompute()
+    return graph
+
+
+def test_first_run_adds_every_product_in_rank_order(make_products, cards):
+    graph = ROIGraph(ROICalculator())
+    graph.update_set('test set', make_products(), cards)
+    events = graph.recompute()
+    assert [event['type'] for event in events] == ['added', 'added']
+    assert [event['rank'] for event in events] == [1, 2]
+    assert [event['sequence'] for event in events] == [1, 2]
+    rois = [result['roi_percentage'] for result in graph.results()]
+    assert rois == sorted(rois, reverse=True)
+
+
+def test_unchanged_prices_rescore_nothing(graph, make_products, cards):
+    rescored = graph.products_rescored
+    assert graph.update_set('test set', make_products(), cards) == 0
+    assert graph.recompute() == []
+    assert graph.products_rescored == rescored
+
+
+def test_product_price_change_rescores_only_that_product(graph, make_products, cards):
+    rescored = graph.products_rescored
+    assert graph.update_set('test set', make_products(etb_price=40), cards) == 1
+    events = graph.recompute()
+    assert graph.products_rescored == rescored + 1
+    changed = {event['product_key']: event for event in events}
+    assert changed['1']['roi_percentage'] > changed['1']['old_roi_percentage']
+
+
+def test_card_price_change_rescores_the_whole_set(graph, make_products, make_card, cards):
+    graph.update_set('other set', make_products(set_name='Other Set', base_id=10), cards)
+    graph.recompute()
+    rescored = graph.products_rescored
+
+    graph.update_set('test set', make_products(), [make_card(1, 80), make_card(2, 20)])
+    graph.recompute()
+    # Both products of the set, none of the other set
+    assert graph.products_rescored == rescored + 2
+
+
+def test_delisted_product_is_removed(graph, make_products, cards):
+    graph.update_set('test set', {'etb': make_products()['etb'], 'booster_boxes': []}, cards)
+    events = graph.recompute()
+    assert ('2', 'removed') in [(event['product_key'], event['type']) for event in events]
+    assert len(graph.set_results('test set')) == 1
+
+
+def test_events_since_reports_a_gap_in_the_log(make_products, cards):
+    graph = ROIGraph(ROICalculator(), history=2)
+    graph.update_set('test set', make_products(), cards)
+    graph.recompute()
+    graph.update_set('test set', make_products(etb_price=20, box_price=400), cards)
+    graph.recompute()
+
+    events, complete = graph.events_since(0)
+    assert not complete
+    events, complete = graph.events_since(graph.last_sequence - 2)
+    assert complete and len(events) == 2
+    assert graph.events_since(graph.last_sequence) == ([], True)
@@ -0,0 +1,32 @@
+import os
+
+from negative_cache import CATALOG_FILE, catalog_generation, negative_key
+
+
+def test_lookup_keys_ignore_case_spacing_paging_and_sort():
+    a = negative_key('products', {'search': 'Evolving Skies', 'per_page': 50})
+    b = negative_key('products', {'search': '  evolving   SKIES ', 'per_page': 20, 'sort': 'price_desc'})
+    assert a == b
+    assert a != negative_key('cards', {'search': 'Evolving Skies'})
+    assert negative_key('cards', {'episode_id': 7, 'page': 0}) != negative_key('cards', {'episode_id': 8, 'page': 0})
+
+
+def test_requests_that_are_not_lookups_have_no_key():
+    assert negative_key('products', {'page': 1, 'per_page': 20}) is None
+    assert negative_key('products', {'search': '   '}) is None
+
+
+def test_catalog_change_invalidates_every_key(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    before = negative_key('products', {'search': 'x'})
+    with open(CATALOG_FILE, 'w') as f:
+        f.write('[{"id": 1}]')
+    after = negative_key('products', {'search': 'x'})
+    assert after != before
+
+    # Same content, no new generation; other content, a new one
+    os.utime(CATALOG_FILE, ns=(1, 1))
+    assert catalog_generation() == after.split(':')[1]
+    with open(CATALOG_FILE, 'w') as f:
+        f.write('[{"id": 2}]')
+    assert negative_key('products', {'search': 'x'}) != after
@@ -0,0 +1,111 @@
+import os
+import time
+
+import pytest
+
+import price_history
+from price_history import PriceHistory, product_key
+
+DAY = 86400
+
+
+def result(name, price, roi, url=None):
+    return {'product_name': name, 'set_name': 'Test Set', 'current_price': price, 'roi_percentage': roi,
+            'risk_score': 3.0, 'tcggo_url': url or f"https://www.tcggo.com/pokemon/test-set/{name.lower()}"}
+
+
+@pytest.fixture
+def history(tmp_path):
+    # No automatic compaction, the tests compact explicitly
+    return PriceHistory(str(tmp_path / 'history'), compact_after_days=365)
+
+
+def test_product_key_uses_the_tcggo_path():
+    assert product_key(result('ETB', 50, 1)) == 'product:test-set/etb'
+    assert product_key({'set_name': 'Test Set', 'product_name': 'ETB'}) == 'product:test set/etb'
+
+
+def test_history_within_a_time_range(history):
+    now = time.time()
+    for days_ago, price in ((3, 40), (2, 45), (1, 50)):
+        history.record_products([result('ETB', price, price - 40.0), result('Box', 100, 5.0)], at=now - days_ago * DAY)
+
+    points = history.history('test-set/etb')
+    assert [point['price'] for point in points] == [40, 45, 50]
+    assert points[0]['roi_percentage'] == 0.0
+
+    points = history.history('product:test-set/etb', start=now - 2.5 * DAY, end=now - 1.5 * DAY)
+    assert [point['price'] for point in points] == [45]
+
+
+def test_compaction_keeps_every_row(history, monkeypatch):
+    # Noon (UTC) three days ago, all rows land in one partition
+    at = (int(time.time() // DAY) - 3) * DAY + DAY / 2
+    for i in range(3):
+        history.record_products([result('ETB', 40 + i, 1.0)], at=at + i)
+    day = price_history._day(at)
+    before = history.history('test-set/etb')
+
+    assert history.compact(day) == 1
+    names = os.listdir(os.path.join(history.directory, day))
+    assert not [name for name in names if name.startswith('seg-')]
+    assert history.history('test-set/etb') == before
+
+    # More rows after compaction go into new segments, then into the next part
+    history.record_products([result('ETB', 60, 1.0)], at=at + 10)
+    monkeypatch.setattr(price_history, 'fcntl', None)  # Windows: no lock
+    assert history.compact(day) == 1
+    assert [point['price'] for point in history.history('test-set/etb')] == [40, 41, 42, 60]
+    assert history.compact(day) == 0
+
+
+def test_old_days_are_compacted_on_append(tmp_path):
+    history = PriceHistory(str(tmp_path / 'history'), compact_after_days=1)
+    history.record_products([result('ETB', 40, 1.0)], at=time.time() - 3 * DAY)
+    history.record_products([result('ETB', 50, 1.0)])
+    old_day = price_history._day(time.time() - 3 * DAY)
+    assert not [name for name in os.listdir(os.path.join(history.directory, old_day)) if name.startswith('seg-')]
+    assert len(history.history('test-set/etb')) == 2
+
+
+def test_movers_and_roi_over_time(history):
+    now = time.time()
+    history.record_products([result('ETB', 40, 10.0), result('Box', 100, 20.0)], at=now - 2 * DAY)
+    history.record_products([result('ETB', 60, 30.0), result('Box', 99, 20.0)], at=now - DAY)
+
+    movers = history.movers(days=7, top=1, now=now)
+    assert [(mover['key'], mover['change_percent']) for mover in movers] == [('product:test-set/etb', 50.0)]
+
+    daily = history.roi_over_time()
+    assert [day['roi_percentage'] for day in daily] == [15.0, 25.0]
+    assert [day['roi_percentage'] for day in history.roi_over_time('test-set/etb')] == [10.0, 30.0]
+
+
+def test_old_days_are_compacted_once_a_day(tmp_path, monkeypatch):
+    history = PriceHistory(str(tmp_path / 'history'), compact_after_days=1)
+    history.record_products([result('ETB', 40, 1.0)])
+    runs = []
+    monkeypatch.setattr(history, 'compact_old', lambda: runs.append(1))
+    history.record_products([result('ETB', 50, 1.0)])
+    assert runs == []
+
+    history._compacted_day = '2000-01-01'
+    history.record_products([result('ETB', 60, 1.0)])
+    assert runs == [1]
+
+
+def test_partition_compacted_while_read_is_listed_again(history, monkeypatch):
+    history.record_products([result('ETB', 40, 1.0)])
+    listing = history._listing
+    failures = [FileNotFoundError('compacted')]
+
+    def flaky_listing(partition):
+        if failures:
+            raise failures.pop()
+        return listing(partition)
+    monkeypatch.setattr(history, '_listing', flaky_listing)
+    assert [point['price'] for point in history.history('test-set/etb')] == [40]
+
+    failures.extend([FileNotFoundError('compacted')] * price_history.LISTING_ATTEMPTS)
+    with pytest.raises(RuntimeError):
+        history.history('test-set/etb')
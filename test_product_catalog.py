@@ -0,0 +1,163 @@
+import json
+import os
+
+import pytest
+
+from product_catalog import BOOSTER_BOX, ETB, OTHER, ProductCatalog, classify_product, episode_id_from_file
+
+EPISODE = {'id': 11, 'name': 'Shrouded Fable', 'slug': 'shrouded-fable'}
+OTHER_EPISODE = {'id': 12, 'name': 'Shrouded Fable Promos', 'slug': 'shrouded-fable-promos'}
+
+
+def product(product_id, name, episode=EPISODE, price=50):
+    return {'id': product_id, 'name': name, 'episode': dict(episode),
+            'prices': {'cardmarket': {'lowest': price}}}
+
+
+class FakeProducts:
+    """
+    /products pages of 20, filtered by episode_id or search like the API
+    """
+    def __init__(self, products, filters_episode=True):
+        self.products = products
+        self.filters_episode = filters_episode
+        self.calls = []
+
+    def __call__(self, endpoint, params, fields):
+        self.calls.append(dict(params))
+        products = self.products
+        if 'episode_id' in params and self.filters_episode:
+            products = [p for p in products if p['episode']['id'] == params['episode_id']]
+        if 'search' in params:
+            products = [p for p in products if params['search'].lower() in p['name'].lower()]
+            return {'data': products[:params['per_page']]}
+        page, per_page = params['page'], params['per_page']
+        total = max(1, -(-len(products) // per_page))
+        return {'data': products[(page - 1) * per_page:page * per_page], 'paging': {'current': page, 'total': total}}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return ProductCatalog(str(tmp_path / 'catalog.sqlite3'))
+
+
+def test_classify_product():
+    assert classify_product({'name': 'Shrouded Fable Elite Trainer Box'}) == ETB
+    assert classify_product({'name': 'Shrouded Fable Booster Box'}) == BOOSTER_BOX
+    assert classify_product({'name': 'Shrouded Fable Booster Bundle'}) == OTHER
+
+
+def test_incomplete_sync_merges_without_marking_synced(catalog):
+    catalog.sync([product(1, 'Shrouded Fable Elite Trainer Box')], complete=False)
+    assert catalog.synced_at() is None
+    assert not catalog.is_fresh(11, 3600)
+    assert len(catalog.products(11)) == 1
+
+
+def test_complete_sync_replaces_the_catalog(catalog):
+    catalog.sync([product(1, 'Old Elite Trainer Box'), product(2, 'Shrouded Fable Booster Box')])
+    catalog.sync([product(2, 'Shrouded Fable Booster Box')])
+    assert [p['id'] for p in catalog.products(11)] == [2]
+    assert [p['id'] for p in catalog.products(11, BOOSTER_BOX)] == [2]
+    assert catalog.is_fresh(11, 3600)
+
+
+def test_episode_lookup_is_exact(catalog):
+    catalog.sync([product(1, 'A Booster Box'), product(2, 'B Booster Box', OTHER_EPISODE)])
+    assert catalog.episode_id('shrouded  FABLE') == 11
+    assert catalog.episode_id('shrouded-fable') == 11
+    assert catalog.episode_id('shrouded') is None
+
+
+def test_fresh_episode_is_read_from_the_catalog(collector):
+    fake = FakeProducts([product(1, 'Shrouded Fable Elite Trainer Box'), product(2, 'Shrouded Fable Booster Box')])
+    collector._fetch_page = fake
+    collector.catalog.sync(fake.products)
+
+    products = collector.get_specific_products('shrouded fable')
+    assert [p['id'] for p in products['etb']] == [1]
+    assert [p['id'] for p in products['booster_boxes']] == [2]
+    assert fake.calls == []
+
+
+def test_refresh_fetches_the_episode_and_replaces_its_products(collector):
+    fake = FakeProducts([product(i, f"Shrouded Fable Booster Box {i}") for i in range(1, 46)]
+                        + [product(99, 'Shrouded Fable Promos Booster Box', OTHER_EPISODE)])
+    collector._fetch_page = fake
+    collector.catalog.sync(fake.products + [product(500, 'Delisted Elite Trainer Box')])
+
+    with collector.analysis_scope(refresh=True):
+        products = collector.get_specific_products('Shrouded Fable')
+
+    # All 45 products of the episode over three pages, none of the other episode
+    assert len(products['booster_boxes']) == 45
+    assert [call['page'] for call in fake.calls] == [1, 2, 3]
+    assert all(call['episode_id'] == 11 for call in fake.calls)
+    assert 500 not in [p['id'] for p in collector.catalog.products(11)]
+    assert [p['id'] for p in collector.catalog.products(12)] == [99]
+
+
+def test_stale_episode_is_fetched_by_episode_id(collector, monkeypatch):
+    fake = FakeProducts([product(1, 'Shrouded Fable Elite Trainer Box')])
+    collector._fetch_page = fake
+    collector.catalog.sync(fake.products)
+    monkeypatch.setattr(collector.config, 'PRODUCT_CATALOG_MAX_AGE_SECONDS', -1)
+
+    collector.get_specific_products('shrouded fable')
+    assert fake.calls and all('episode_id' in call for call in fake.calls)
+
+
+def test_page_cap_is_an_incomplete_list(collector):
+    collector._fetch_page = FakeProducts([product(i, f"Product {i}") for i in range(1, 101)])
+    products, complete = collector.get_product_pages({}, max_pages=2)
+    assert len(products) == 40 and not complete
+    products, complete = collector.get_product_pages({}, max_pages=10)
+    assert len(products) == 100 and complete
+
+
+def test_unknown_set_falls_back_to_search(collector):
+    fake = FakeProducts([product(1, 'Mystery Elite Trainer Box')])
+    collector._fetch_page = fake
+    products = collector.get_specific_products('mystery')
+    assert [p['id'] for p in products['etb']] == [1]
+    assert 'search' in fake.calls[0]
+
+
+def test_saved_episode_list_names_sets_the_catalog_lacks(collector, tmp_path):
+    (tmp_path / 'pokemon_episode_ids.json').write_text(json.dumps([EPISODE]))
+    fake = FakeProducts([product(1, 'Shrouded Fable Elite Trainer Box')])
+    collector._fetch_page = fake
+    assert len(collector.get_specific_products('shrouded fable')['etb']) == 1
+    assert fake.calls[0]['episode_id'] == 11
+    assert collector.catalog.is_fresh(11, 3600)
+
+
+def test_ignored_episode_filter_falls_back_to_search(collector, tmp_path):
+    (tmp_path / 'pokemon_episode_ids.json').write_text(json.dumps([EPISODE, OTHER_EPISODE]))
+    fake = FakeProducts([product(i, f"Other Booster Box {i}", OTHER_EPISODE) for i in range(100, 160)]
+                        + [product(1, 'Shrouded Fable Elite Trainer Box'),
+                           product(2, 'Shrouded Fable Promos Elite Trainer Box', OTHER_EPISODE)],
+                        filters_episode=False)
+    collector._fetch_page = fake
+
+    products = collector.get_specific_products('Shrouded Fable')
+    # One page to notice, then the search, narrowed to the episode
+    assert [p['id'] for p in products['etb']] == [1]
+    assert [('episode_id' in call, 'search' in call) for call in fake.calls] == [(True, False), (False, True)]
+
+    # Later sets search right away
+    fake.calls.clear()
+    collector.get_specific_products('Shrouded Fable Promos')
+    assert ['search' in call for call in fake.calls] == [True]
+
+
+def test_episode_list_is_reread_only_when_it_changes(tmp_path):
+    path = tmp_path / 'episodes.json'
+    path.write_text(json.dumps([EPISODE]))
+    assert episode_id_from_file('shrouded-fable', str(path)) == 11
+
+    path.write_text(json.dumps([dict(EPISODE, id=21)]))
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+    assert episode_id_from_file('Shrouded Fable', str(path)) == 21
+    assert episode_id_from_file('Unknown', str(path)) is None
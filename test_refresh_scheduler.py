@@ -0,0 +1,115 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from quota import CallBudget
+from refresh_scheduler import RefreshScheduler, price_volatility
+from roi_calculator import ROICalculator
+
+NOW = time.time()
+
+
+def released(days_ago):
+    return (datetime.fromtimestamp(NOW) - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+
+
+@pytest.fixture
+def collector(fake_collector, make_products):
+    fake_collector.products = {'set a': make_products(set_name='Set A'),
+                               'set b': make_products(set_name='Set B', base_id=10)}
+    return fake_collector
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return RefreshScheduler(str(tmp_path / 'schedule.sqlite3'), base_interval=3600, min_interval=900,
+                            max_interval=7 * 86400)
+
+
+def test_interval_by_age_volatility_and_demand(scheduler):
+    assert scheduler.interval(released(30), None, 0, NOW) == 3600
+    assert scheduler.interval(released(200), None, 0, NOW) == 3 * 3600
+    assert scheduler.interval(released(200), 0.1, 0, NOW) == 3 * 3600 / 2
+    assert scheduler.interval(released(200), None, 3, NOW) == 3 * 3600 / 3
+    # Clamped to [min, max]
+    assert scheduler.interval(released(30), 1.0, 1000, NOW) == 900
+    assert scheduler.interval(None, None, 0, NOW) == 24 * 3600
+
+
+def test_price_volatility():
+    flat = {'prices': {'cardmarket': {'7d_average': 10, '30d_average': 10}}}
+    moved = {'prices': {'cardmarket': {'7d_average': 12, '30d_average': 10}}}
+    assert price_volatility([flat, moved]) == pytest.approx(0.1)
+    assert price_volatility([{'prices': {}}]) is None
+
+
+def test_plan_orders_by_overdue_then_interval(scheduler):
+    episodes = [{'name': 'Old', 'released_at': released(2000)},
+                {'name': 'New', 'released_at': released(10)},
+                {'name': 'Mid', 'released_at': released(200)}]
+    # Never refreshed: most often refreshed first
+    assert [entry['name'] for entry in scheduler.plan(episodes, NOW)] == ['New', 'Mid', 'Old']
+
+    conn = scheduler._conn()
+    conn.execute("INSERT INTO refreshes VALUES ('new', ?, NULL)", (NOW - 1800,))
+    conn.execute("INSERT INTO refreshes VALUES ('mid', ?, NULL)", (NOW - 4 * 3 * 3600,))
+    plan = scheduler.plan(episodes, NOW)
+    assert [entry['name'] for entry in plan] == ['Old', 'Mid', 'New']
+    assert plan[1]['overdue'] == pytest.approx(4)
+    assert plan[2]['due_at'] > NOW
+
+
+def test_demand_is_read_only_and_pruned_when_recording(scheduler):
+    scheduler.record_demand(['new', 'new', 'old'])
+    scheduler.record_demand(['new'])
+    old_day = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    scheduler._conn().execute("INSERT INTO demand VALUES ('ancient', ?, 5)", (old_day,))
+
+    assert scheduler.demand() == {'new': 2, 'old': 1}
+    assert scheduler._conn().execute("SELECT COUNT(*) FROM demand WHERE set_name = 'ancient'").fetchone()[0] == 1
+
+    # A scheduler started later prunes on its first flush
+    later = RefreshScheduler(scheduler.path)
+    later.record_demand(['new'])
+    later.flush_demand()
+    assert later._conn().execute("SELECT COUNT(*) FROM demand WHERE set_name = 'ancient'").fetchone()[0] == 0
+
+
+def test_demand_reads_while_another_connection_writes(scheduler):
+    writer = sqlite3.connect(scheduler.path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        assert scheduler.demand() == {}
+    finally:
+        writer.execute("ROLLBACK")
+
+
+def test_run_due_refreshes_due_sets_within_budget(scheduler, collector):
+    episodes = [{'name': 'Set A', 'released_at': released(10)}, {'name': 'Set B', 'released_at': released(10)}]
+    refreshed = scheduler.run_due(collector, ROICalculator(), episodes, CallBudget(0))
+    assert sorted(refreshed) == ['set a', 'set b']
+    assert all(scope['refresh'] for scope in collector.scopes)
+
+    # Nothing is due right after
+    assert scheduler.run_due(collector, ROICalculator(), episodes, CallBudget(0)) == []
+
+    # A budget of less than two calls refreshes nothing
+    scheduler._conn().execute("DELETE FROM refreshes")
+    assert scheduler.run_due(collector, ROICalculator(), episodes, CallBudget(1)) == []
+
+
+def test_demand_is_written_in_batches(scheduler):
+    for _ in range(3):
+        scheduler.record_demand(['new', 'old'])
+    rows = scheduler._conn().execute("SELECT COUNT(*) FROM demand").fetchone()[0]
+    assert rows == 0
+    assert scheduler.demand() == {'new': 3, 'old': 3}
+
+    scheduler.flush_demand()
+    scheduler.record_demand(['new'])
+    other = RefreshScheduler(scheduler.path)
+    assert other.demand() == {'new': 3, 'old': 3}
+    scheduler.flush_demand()
+    assert other.demand() == {'new': 4, 'old': 3}
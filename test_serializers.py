@@ -0,0 +1,25 @@
+import gzip
+
+import pytest
+
+from serializers import load_snapshot, write_snapshot
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = write_snapshot([{'id': 1, 'name': 'ETB'}], str(tmp_path / 'snapshot.json.gz'))
+    assert load_snapshot(path) == [{'id': 1, 'name': 'ETB'}]
+
+
+@pytest.mark.parametrize('content, message', [
+    (b'', 'is empty'),
+    (b'  \n', 'is empty'),
+    (gzip.compress(b''), 'is empty'),
+    (b'[{"id": 1, "na', 'is truncated'),
+    (gzip.compress(b'[{"id": 1}]')[:12], 'is truncated')
+])
+def test_unreadable_snapshot_names_the_file(tmp_path, content, message):
+    path = tmp_path / 'snapshot.json'
+    path.write_bytes(content)
+    with pytest.raises(ValueError, match=message) as error:
+        load_snapshot(str(path))
+    assert str(path) in str(error.value)
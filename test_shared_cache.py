@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from shared_cache import MemoryCache, RefreshInProgress, SQLiteCache
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache()
+    return SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+
+
+def test_waiter_does_not_refresh_while_refresher_is_alive(cache):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_producer():
+        calls.append('slow')
+        started.set()
+        release.wait(5)
+        return 'fresh'
+
+    refresher = threading.Thread(target=lambda: cache.get_or_refresh('key', 60, slow_producer))
+    refresher.start()
+    started.wait(5)
+    try:
+        # A thread of the same process has to wait too, and gives up instead of calling upstream
+        with pytest.raises(RefreshInProgress):
+            cache.get_or_refresh('key', 60, lambda: calls.append('waiter'), wait_timeout=0.3)
+    finally:
+        release.set()
+        refresher.join()
+    assert calls == ['slow']
+    assert cache.get('key') == 'fresh'
+
+
+def test_lease_is_per_call(cache):
+    assert cache.acquire_lease('key', 60, 'first')
+    assert not cache.acquire_lease('key', 60, 'second')
+    # Releasing someone else's lease does nothing
+    cache.release_lease('key', 'second')
+    assert not cache.acquire_lease('key', 60, 'second')
+    cache.release_lease('key', 'first')
+    assert cache.acquire_lease('key', 60, 'second')
+
+
+def test_waiter_takes_over_an_expired_lease(cache):
+    cache.acquire_lease('key', 0.1, 'dead worker')
+    value = cache.get_or_refresh('key', 60, lambda: 'fresh', wait_timeout=0.3)
+    assert value == 'fresh'
+
+
+def test_stale_value_served_during_refresh(cache):
+    cache.set('key', 'old', -1)
+    cache.acquire_lease('key', 60, 'refresher')
+    start = time.time()
+    assert cache.get_or_refresh('key', 60, lambda: 'new') == 'old'
+    assert time.time() - start < 1
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from snapshot_diff import DiffError, diff_rows, diff_runs, list_runs, resolve_run, summarize
+
+
+def row(name, price, roi):
+    return {'product_name': name, 'set_name': 'Test Set', 'current_price': price, 'roi_percentage': roi,
+            'estimated_pull_value': 100, 'risk_score': 3,
+            'tcggo_url': f"https://www.tcggo.com/pokemon/test-set/{name.lower()}"}
+
+
+def test_added_removed_and_changed():
+    old = [row('A', 10, 50), row('B', 20, 40), row('C', 30, 30)]
+    new = [row('B', 20, 60), row('A', 10, 50), row('D', 5, 10)]
+    changes = {change['key']: change for change in diff_rows(old, new)}
+
+    assert changes['product:test-set/d']['type'] == 'added'
+    assert changes['product:test-set/c']['type'] == 'removed'
+    b = changes['product:test-set/b']
+    assert (b['type'], b['old_rank'], b['rank'], b['rank_change']) == ('changed', 2, 1, 1)
+    assert b['roi_percentage'] == {'from': 40, 'to': 60, 'delta': 20}
+    # A only moved down a rank
+    a = changes['product:test-set/a']
+    assert a['rank_change'] == -1 and a['current_price']['delta'] == 0
+
+    assert summarize(changes.values()) == {'added': 1, 'removed': 1, 'changed': 2,
+                                           'price_changed': 0, 'rank_changed': 2}
+
+
+def test_identical_runs_have_no_changes():
+    rows = [row(f"P{i}", i, i) for i in range(100)]
+    assert list(diff_rows(rows, [dict(r) for r in rows])) == []
+
+
+def test_duplicate_products_keep_their_best_rank():
+    old = [row('A', 10, 50), row('A', 10, 50), row('B', 20, 40)]
+    new = [row('A', 10, 50), row('B', 20, 40)]
+    assert list(diff_rows(old, new)) == []
+
+
+def test_runs_by_timestamp(tmp_path):
+    for stamp, rows in (('20250101_120000', [row('A', 10, 50)]), ('20250102_120000', [row('A', 12, 40)])):
+        (tmp_path / f"{stamp}_pokemon_investment_analysis.json").write_text(json.dumps(rows))
+
+    assert list_runs(str(tmp_path)) == ['20250101_120000', '20250102_120000']
+    changes, summary = diff_runs('20250101_120000', '20250102_120000', str(tmp_path))
+    assert summary['changed'] == 1 and summary['price_changed'] == 1
+
+    with pytest.raises(DiffError):
+        resolve_run('20990101_000000', str(tmp_path))
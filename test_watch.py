@@ -0,0 +1,85 @@
+import pytest
+
+from roi_calculator import ROICalculator
+from shared_cache import NullCache
+from watch import AlertSink, Rules, Watcher
+
+
+class ListSink:
+    def __init__(self):
+        self.alerts = []
+
+    def send(self, alert):
+        self.alerts.append(alert)
+
+
+@pytest.fixture
+def watched(fake_collector, make_products):
+    # Like watch.main: no cached pages
+    fake_collector.cache = NullCache()
+    fake_collector.products = {'set a': make_products(set_name='Set A'),
+                               'set b': make_products(set_name='Set B', base_id=10)}
+    return fake_collector
+
+
+def state(price, roi, rank):
+    return {'price': price, 'roi': roi, 'rank': rank}
+
+
+def test_rules_fire_on_crossing_only():
+    rules = Rules(roi_above=[50], roi_below=[0], price_change=10, rank_top=3)
+    assert rules.check(state(10, 40, 5), state(10, 60, 5)) == [('roi_above', 'roi_percentage', 50)]
+    assert rules.check(state(10, 60, 5), state(10, 70, 5)) == []
+    assert rules.check(state(10, 5, 5), state(10, -5, 5)) == [('roi_below', 'roi_percentage', 0)]
+    assert rules.check(state(10, 5, 5), state(11, 5, 5)) == [('price_change', 'current_price', 10)]
+    assert rules.check(state(10, 5, 4), state(10, 5, 3)) == [('entered_top', 'rank', 3)]
+    assert rules.check(state(10, 5, 3), state(10, 5, None)) == [('left_top', 'rank', 3)]
+
+
+def test_alert_sink_targets(tmp_path):
+    path = str(tmp_path / 'alerts.ndjson')
+    assert AlertSink(f"file:{path}").location == path
+    with pytest.raises(ValueError):
+        AlertSink('email:someone')
+
+
+def test_no_alerts_before_every_set_has_a_baseline(watched, make_products):
+    sink = ListSink()
+    watcher = Watcher(watched, ROICalculator(), ['set a', 'set b'], Rules(rank_top=1, price_change=5), [sink],
+                      min_interval=0, max_interval=0)
+    assert watcher.poll('set a') is None
+    assert watcher.poll('set b') is None
+    assert sink.alerts == []
+    # Every poll asks for current prices
+    assert all(scope.get('refresh') for scope in watched.scopes)
+
+    watched.products['set b'] = make_products(set_name='Set B', base_id=10, etb_price=25)
+    assert watcher.poll('set b') is True
+    rules = {(alert['rule'], alert['product_name']) for alert in sink.alerts}
+    assert ('price_change', 'Set B Elite Trainer Box') in rules
+    assert ('entered_top', 'Set B Elite Trainer Box') in rules
+    assert watcher.poll('set a') is False
+
+
+def test_interval_adapts_to_price_moves(watched, make_products):
+    watcher = Watcher(watched, ROICalculator(), ['set a'], Rules(), [ListSink()],
+                      min_interval=0.001, max_interval=0.01)
+    watcher.intervals['set a'] = 0.004
+    watcher.run(max_polls=2)   # baseline, then quiet: backs off
+    assert watcher.intervals['set a'] == pytest.approx(0.006)
+
+    watched.products['set a'] = make_products(set_name='Set A', etb_price=80)
+    watcher.run(max_polls=3)   # prices moved: speeds up
+    assert watcher.intervals['set a'] == pytest.approx(0.003)
+
+
+def test_set_without_products_backs_off(watched):
+    watched.products['set a'] = {'etb': [], 'booster_boxes': []}
+    watcher = Watcher(watched, ROICalculator(), ['set a'], Rules(), [ListSink()],
+                      min_interval=0.001, max_interval=0.01)
+    watcher.intervals['set a'] = 0.004
+    assert watcher.poll('set a') is None
+    assert watcher.poll('set a') is False
+
+    watcher.run(max_polls=3)
+    assert watcher.intervals['set a'] == pytest.approx(0.006)
@@ -0,0 +1,109 @@
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TopK:
+    """
+    The k highest-scoring items seen so far, kept in a bounded min-heap:
+    O(log k) per item and never more than k items in memory.
+    Safe to share between threads.
+    """
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+        self._keys = set()
+        self._counter = itertools.count()  # tie breaker, items are never compared
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def full(self):
+        return len(self._heap) >= self.k
+
+    def threshold(self):
+        """
+        Score an item must beat to get in, None while the heap is not full
+        """
+        with self._lock:
+            return self._heap[0][0] if self.full() else None
+
+    def push(self, score, item, key=None):
+        """
+        Offer an item, returns True if it is (for now) in the top k.
+        Items with the key of an item already in the top k are ignored
+        (the same card seen on two pages or in two episode streams).
+        """
+        with self._lock:
+            if key is not None and key in self._keys:
+                return False
+            entry = (score, next(self._counter), item, key)
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+            elif score > self._heap[0][0]:
+                evicted = heapq.heapreplace(self._heap, entry)
+                self._keys.discard(evicted[3])
+            else:
+                return False
+            if key is not None:
+                self._keys.add(key)
+            return True
+
+    def items(self):
+        """
+        [(score, item)] highest first
+        """
+        with self._lock:
+            ordered = sorted(self._heap, key=lambda entry: (-entry[0], entry[1]))
+            return [(entry[0], entry[2]) for entry in ordered]
+
+
+def consume_pages(pages, top, score, key=None, sorted_desc=False):
+    """
+    Push every item of a page stream into top. With sorted_desc=True
+    (pages come highest score first) paging stops at the first page
+    where nothing got into the top k - later pages can only be lower.
+    Returns the number of pages read.
+    """
+    pages_read = 0
+    for page in pages:
+        pages_read += 1
+        entered = False
+        for item in page:
+            value = score(item)
+            if value > 0 and top.push(value, item, key(item) if key else None):
+                entered = True
+
+        if sorted_desc and top.full() and not entered:
+            break
+    return pages_read
+
+
+def top_cards(collector, episode_ids, k=50, workers=1):
+    """
+    Leaderboard of the k most expensive cards across all given episodes.
+    Each episode is read as a price_desc page stream (several at once
+    with workers > 1) feeding one shared heap, and stops as soon as its
+    pages drop below the current top k.
+    Returns ([(price, card)] highest first, {episode_id: pages read})
+    """
+    top = TopK(k)
+
+    def run(episode_id):
+        return consume_pages(
+            collector.iter_card_pages(episode_id, sort='price_desc'),
+            top,
+            collector.extract_card_price,
+            key=lambda card: card.get('id'),
+            sorted_desc=True
+        )
+
+    if workers <= 1:
+        pages_read = {episode_id: run(episode_id) for episode_id in episode_ids}
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='topk') as executor:
+            pages_read = dict(zip(episode_ids, executor.map(run, episode_ids)))
+
+    return top.items(), pages_read
@@ -0,0 +1,134 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling the API while the circuit breaker is open
+    """
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Upstream API unavailable, retry in {retry_after:.0f}s")
+
+
+class UpstreamHealth:
+    """
+    Shared view of the upstream API health, kept up to date by the
+    outcome of the real calls the collector makes.
+
+    Circuit breaker states:
+      closed    - calls go through
+      open      - calls fail fast until the cool-down has passed
+      half_open - one trial call is let through; success closes the
+                  circuit, failure opens it again
+    """
+    def __init__(self, failure_threshold=5, cooldown=30, healthy_ttl=300):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.healthy_ttl = healthy_ttl
+
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_success_at = None
+        self.last_failure_at = None
+        self.last_error = None
+        self.last_latency = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Check the breaker before an upstream call, raise CircuitOpenError to fail fast
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return
+
+            if self.state == 'open':
+                waited = time.time() - self.opened_at
+                if waited < self.cooldown:
+                    raise CircuitOpenError(self.cooldown - waited)
+                self.state = 'half_open'
+
+            # Half open: only a single trial call at a time
+            if self._trial_in_flight:
+                raise CircuitOpenError(1)
+            self._trial_in_flight = True
+
+    def record_response(self, status_code, latency):
+        """
+        Record an upstream response. 5xx and 429 count as failures,
+        anything else means the upstream is up.
+        """
+        if status_code >= 500 or status_code == 429:
+            self.record_failure(f"HTTP {status_code}")
+            return
+
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            self.last_latency = latency
+            if status_code < 400:
+                self.last_success_at = time.time()
+            else:
+                self.last_error = f"HTTP {status_code}"
+
+    def record_failure(self, error):
+        """
+        Record a failed upstream call (network error, timeout, 5xx, 429)
+        """
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_failure_at = time.time()
+            self.last_error = str(error)
+
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                    print(f"⚡ Circuit breaker opened after {self.consecutive_failures} failures ({error})")
+                self.state = 'open'
+                self.opened_at = time.time()
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        Give back the half-open trial slot when the call never happened
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == 'open' and time.time() - self.opened_at < self.cooldown
+
+    def retry_after(self):
+        with self._lock:
+            if self.state != 'open':
+                return 0
+            return max(0, self.cooldown - (time.time() - self.opened_at))
+
+    def is_known_healthy(self):
+        """
+        True if a real call succeeded recently and nothing has failed since
+        """
+        with self._lock:
+            return (self.state == 'closed' and
+                    self.consecutive_failures == 0 and
+                    self.last_success_at is not None and
+                    time.time() - self.last_success_at < self.healthy_ttl)
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'seconds_since_success': round(now - self.last_success_at, 1) if self.last_success_at else None,
+                'seconds_since_failure': round(now - self.last_failure_at, 1) if self.last_failure_at else None,
+                'last_error': self.last_error,
+                'last_latency_ms': round(self.last_latency * 1000, 1) if self.last_latency is not None else None
+            }
@@ -0,0 +1,283 @@
+import argparse
+import heapq
+import json
+import sys
+import time
+from datetime import datetime
+
+from analysis import analyze_set
+from data_collector import PokemonDataCollector
+from incremental import ROIGraph
+from lazy_import import lazy_module
+from price_history import product_key
+from quota import BudgetExceeded, CallBudget
+from roi_calculator import ROICalculator
+from serializers import dumps
+from shared_cache import NullCache
+from upstream_health import CircuitOpenError
+
+requests = lazy_module('requests')
+
+# Polling interval of a set: shortened when its prices move, lengthened while they don't
+SPEED_UP = 0.5
+BACK_OFF = 1.5
+
+
+class AlertSink:
+    """
+    Where alerts go: 'stdout', 'file:<path>' (NDJSON) or 'webhook:<url>' (POSTed as JSON)
+    """
+    def __init__(self, target):
+        self.target = target
+        self.kind, _, self.location = target.partition(':')
+        if self.kind not in ('stdout', 'file', 'webhook') or (self.kind != 'stdout' and not self.location):
+            raise ValueError(f"Unknown alert target '{target}', use stdout, file:<path> or webhook:<url>")
+
+    def send(self, alert):
+        try:
+            if self.kind == 'stdout':
+                print(f"🔔 {alert['message']}")
+            elif self.kind == 'file':
+                with open(self.location, 'ab') as f:
+                    f.write(dumps(alert) + b'\n')
+            else:
+                requests.post(self.location, json=alert, timeout=5)
+        except Exception as e:
+            print(f"⚠️ Could not send alert to {self.target}: {e}")
+
+
+class Rules:
+    """
+    Alert thresholds. An alert fires when a value crosses a threshold
+    between two polls (the first poll of a product only sets the baseline).
+    """
+    def __init__(self, roi_above=(), roi_below=(), price_change=None, rank_top=None):
+        self.roi_above = list(roi_above)
+        self.roi_below = list(roi_below)
+        self.price_change = price_change
+        self.rank_top = rank_top
+
+    def check(self, old, new):
+        """
+        Crossed thresholds between two states {'price', 'roi', 'rank'}
+        as [(rule, metric, threshold)]
+        """
+        crossed = []
+        for threshold in self.roi_above:
+            if old['roi'] < threshold <= new['roi']:
+                crossed.append(('roi_above', 'roi_percentage', threshold))
+        for threshold in self.roi_below:
+            if old['roi'] > threshold >= new['roi']:
+                crossed.append(('roi_below', 'roi_percentage', threshold))
+        if self.price_change and old['price'] > 0:
+            if abs(new['price'] - old['price']) / old['price'] * 100 >= self.price_change:
+                crossed.append(('price_change', 'current_price', self.price_change))
+        if self.rank_top:
+            if (old['rank'] or sys.maxsize) > self.rank_top >= (new['rank'] or sys.maxsize):
+                crossed.append(('entered_top', 'rank', self.rank_top))
+            elif (new['rank'] or sys.maxsize) > self.rank_top >= (old['rank'] or sys.maxsize):
+                crossed.append(('left_top', 'rank', self.rank_top))
+        return crossed
+
+
+class Watcher:
+    """
+    Polls the prices of a watchlist of sets, each set on its own interval,
+    rescores only what changed (ROIGraph) and sends alerts when ROI,
+    price or rank cross a threshold.
+    """
+    def __init__(self, collector, calculator, sets, rules, sinks, products=None,
+                 min_interval=300, max_interval=21600, budget=None):
+        self.collector = collector
+        self.graph = ROIGraph(calculator)
+        self.calculator = calculator
+        self.rules = rules
+        self.sinks = sinks
+        self.products = {f"product:{key}" if ':' not in key else key for key in products or ()}
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget or CallBudget()
+        self.intervals = {set_name: min_interval for set_name in sets}
+        self.state = {}
+        # Ranks only mean something once every set has been polled
+        self._unpolled = set(sets)
+        self.polls = 0
+        self.alerts_sent = 0
+        # (due time, set name), every set is polled once at the start
+        self._due = [(0, set_name) for set_name in sets]
+        heapq.heapify(self._due)
+
+    def run(self, max_polls=None):
+        """
+        Poll until interrupted, the call budget is used up or max_polls is reached
+        """
+        while self._due and (max_polls is None or self.polls < max_polls):
+            due, set_name = heapq.heappop(self._due)
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+
+            try:
+                moved = self.poll(set_name)
+            except BudgetExceeded as e:
+                print(f"🛑 {e}, stopping")
+                return
+            except CircuitOpenError as e:
+                print(f"⏸️ {e}, retrying {set_name} later")
+                moved = False
+            except Exception as e:
+                print(f"❌ Error polling '{set_name}': {e}")
+                moved = False
+
+            # Quota goes where the prices move
+            if moved is None:
+                interval = self.intervals[set_name]
+            else:
+                factor = SPEED_UP if moved else BACK_OFF
+                interval = min(self.max_interval, max(self.min_interval, self.intervals[set_name] * factor))
+            self.intervals[set_name] = interval
+            heapq.heappush(self._due, (time.time() + interval, set_name))
+            status = 'baseline' if moved is None else 'prices moved' if moved else 'quiet'
+            print(f"⏱️ {set_name}: {status}, next poll in {interval / 60:.0f} min")
+
+    def poll(self, set_name):
+        """
+        Fetch the set's current prices and alert on crossed thresholds.
+        Returns True if any price or ROI of the set changed, None on the first poll.
+        """
+        self.polls += 1
+        before = {product_key(result): (result['current_price'], result['roi_percentage'])
+                  for result in self.graph.set_results(set_name)}
+
+        # Current prices from the API, not from the product catalog
+        with self.collector.analysis_scope(budget=self.budget, refresh=True):
+            results = analyze_set(self.collector, self.calculator, set_name, graph=self.graph)
+
+        after = {product_key(result): (result['current_price'], result['roi_percentage']) for result in results}
+        first_poll = set_name in self._unpolled
+        baseline = bool(self._unpolled)
+        self._unpolled.discard(set_name)
+        self.check_alerts(send=not baseline)
+        if first_poll:
+            return None
+        # A set without products is quiet too, so it backs off like any other
+        return before != after
+
+    def check_alerts(self, send=True):
+        """
+        Compare every watched product with its state at the last poll
+        """
+        ranked = self.graph.results()
+        for rank, result in enumerate(ranked, 1):
+            key = product_key(result)
+            if self.products and key not in self.products:
+                continue
+            new = {'price': result['current_price'], 'roi': result['roi_percentage'], 'rank': rank}
+            old = self.state.get(key)
+            self.state[key] = new
+            if old is None or not send:
+                continue
+            for rule, metric, threshold in self.rules.check(old, new):
+                self.alert(rule, metric, threshold, result, old, new)
+
+    def alert(self, rule, metric, threshold, result, old, new):
+        field = {'roi_percentage': 'roi', 'current_price': 'price', 'rank': 'rank'}[metric]
+        alert = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'rule': rule,
+            'metric': metric,
+            'threshold': threshold,
+            'from': old[field],
+            'to': new[field],
+            'product_key': product_key(result),
+            'product_name': result['product_name'],
+            'set_name': result['set_name'],
+            'current_price': new['price'],
+            'roi_percentage': new['roi'],
+            'rank': new['rank'],
+            'tcggo_url': result.get('tcggo_url', '')
+        }
+        alert['message'] = (f"{result['product_name']}: {metric} {old[field]} -> {new[field]} "
+                            f"({rule.replace('_', ' ')} {threshold})")
+        self.alerts_sent += 1
+        for sink in self.sinks:
+            sink.send(alert)
+
+
+def load_watchlist(path):
+    """
+    {"sets": [...], "products": [...]} from a JSON file
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        watchlist = json.load(f)
+    return [name.lower() for name in watchlist.get('sets', [])], watchlist.get('products', [])
+
+
+def parse_args(argv=None):
+    from config import Config
+    parser = argparse.ArgumentParser(
+        description="Watch the prices of sets and alert when ROI, price or rank cross a threshold"
+    )
+    parser.add_argument('sets', nargs='*', help="set names to watch")
+    parser.add_argument('--watchlist', help='JSON file with {"sets": [...], "products": [...]}')
+    parser.add_argument('--product', action='append', default=[],
+                        help="only alert for this product (<set>/<product> path of its tcggo URL), repeatable")
+    parser.add_argument('--roi-above', type=float, action='append', default=[], help="alert when ROI rises to this %%")
+    parser.add_argument('--roi-below', type=float, action='append', default=[], help="alert when ROI falls to this %%")
+    parser.add_argument('--price-change', type=float, help="alert when a price moves by this %% between polls")
+    parser.add_argument('--rank-top', type=int, help="alert when a product enters or leaves the top N by ROI")
+    parser.add_argument('--alert', action='append', default=[],
+                        help="stdout, file:<path> or webhook:<url>, repeatable (default stdout)")
+    parser.add_argument('--min-interval', type=float, default=Config.WATCH_MIN_INTERVAL_SECONDS,
+                        help="shortest polling interval of a set in seconds")
+    parser.add_argument('--max-interval', type=float, default=Config.WATCH_MAX_INTERVAL_SECONDS,
+                        help="longest polling interval of a set in seconds")
+    parser.add_argument('--budget', type=int, default=0, help="maximum upstream API calls (0 = unlimited)")
+    parser.add_argument('--polls', type=int, help="stop after this many polls (default: run until interrupted)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sets = [name.lower() for name in args.sets]
+    products = list(args.product)
+    if args.watchlist:
+        watched_sets, watched_products = load_watchlist(args.watchlist)
+        sets += watched_sets
+        products += watched_products
+    sets = list(dict.fromkeys(sets))
+    if not sets:
+        print("❌ Give set names or a --watchlist")
+        return 1
+
+    try:
+        sinks = [AlertSink(target) for target in args.alert or ['stdout']]
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    rules = Rules(args.roi_above, args.roi_below, args.price_change, args.rank_top)
+    collector = PokemonDataCollector()
+    # Every poll has to see current prices, not cached pages
+    collector.cache = NullCache()
+
+    if not collector.test_api_connection():
+        print("❌ Cannot connect to API. Please check your .env file and API key.")
+        return 1
+
+    watcher = Watcher(collector, ROICalculator(), sets, rules, sinks, products,
+                      min_interval=args.min_interval, max_interval=args.max_interval,
+                      budget=CallBudget(args.budget))
+    print(f"👀 Watching {len(sets)} sets (polling every {args.min_interval / 60:.0f}-{args.max_interval / 60:.0f} min)")
+    try:
+        watcher.run(args.polls)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.quota.flush()
+    print(f"\n🏁 {watcher.polls} polls, {watcher.alerts_sent} alerts, {watcher.budget.used} API calls")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())